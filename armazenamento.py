@@ -0,0 +1,544 @@
+import json
+import os
+
+from arquivo_frio import PASTA_ARQUIVO, ArquivoFrio, dias_para_arquivar, quantos_arquivar
+from calendario import CALENDARIO_PADRAO
+from historico import IndiceHistorico
+from instrumentacao import medido
+from motor_sorteio import SEM_MEMBRO, mascara_restricoes
+
+ARQUIVO_DADOS = "dados.json"
+ARQUIVO_JOURNAL = "dados.journal"
+LIMITE_COMPACTACAO = 500
+# Formato 2: "sorteios" é a última chave do dados.json, o que permite ler o
+# cadastro sem decodificar o histórico. Formato 3: restrições gravadas como
+# máscara de 24 bits em vez da lista de "HH:00" (listas antigas ainda são lidas).
+# Formato 4: membros identificados por id inteiro; grupos, restrições e
+# sorteios guardam ids. Arquivos anteriores são migrados na primeira leitura.
+# "arquivados" diz quantos sorteios do arquivo frio já saíram deste snapshot.
+# "preferencias_horarios" (id -> máscara das horas preferidas) só existe em
+# arquivos gravados depois que ela surgiu; sem ela ninguém tem preferência.
+FORMATO = 4
+TIPOS_SORTEIO = ("sorteio_registrado", "sorteios_registrados", "sorteio_reparado")
+
+def dados_vazios():
+    # membros e excluidos: id -> nome. Excluídos continuam com nome porque
+    # sorteios antigos ainda apontam para eles. Grupos são dicts id -> None,
+    # que mantêm a ordem e removem em O(1). Preferências só de quem tem.
+    return {"membros": {}, "excluidos": {}, "proximo_id": 1, "grupos": {}, "sorteios": [],
+            "restricoes_horarios": {}, "preferencias_horarios": {}}
+
+def localizar_reparo(sorteios, mutacao):
+    # Posição do sorteio de um "sorteio_reparado": o mais recente com a mesma
+    # data e com os membros de antes nos turnos alterados. Vale com qualquer
+    # quantidade de sorteios já arquivados; None se não está mais na lista.
+    for posicao in range(len(sorteios) - 1, -1, -1):
+        sorteio = sorteios[posicao]
+        if sorteio["data"] == mutacao["data"] and all(
+                slot < len(sorteio["turnos"]) and sorteio["turnos"][slot] == antes
+                for slot, antes, _ in mutacao["alteracoes"]):
+            return posicao
+    return None
+
+def nome_membro(dados, membro):
+    if membro is None:
+        return SEM_MEMBRO
+    nome = dados["membros"].get(membro)
+    if nome is None:
+        nome = dados["excluidos"].get(membro, f"#{membro}")
+    return nome
+
+def tamanhos_dados(dados):
+    # Para o diagnóstico: quanto há de cada coisa
+    return {"membros": len(dados["membros"]), "excluidos": len(dados["excluidos"]),
+            "grupos": len(dados["grupos"]), "sorteios": len(dados["sorteios"])}
+
+# ==================================================
+# MUTAÇÕES
+# ==================================================
+# Toda alteração dos dados é descrita por um dicionário {"tipo": ..., ...}.
+# A mesma função aplica a mutação em memória e durante o replay do journal.
+# Se receber o IndiceGrupos, mantém o índice junto e o usa nas buscas.
+# "membro" é sempre o id; quem cria o membro escolhe o id em dados["proximo_id"].
+def aplicar_mutacao(dados, mutacao, indice_grupos=None):
+    tipo = mutacao["tipo"]
+    if tipo == "membro_adicionado":
+        membro = mutacao["membro"]
+        dados["membros"][membro] = mutacao["nome"]
+        dados["excluidos"].pop(membro, None)
+        dados["restricoes_horarios"][membro] = mascara_restricoes(mutacao.get("restricoes", 0))
+        dados["proximo_id"] = max(dados["proximo_id"], membro + 1)
+    elif tipo == "membro_excluido":
+        membro = mutacao["membro"]
+        nome = dados["membros"].pop(membro, None)
+        if nome is not None:
+            dados["excluidos"][membro] = nome
+        dados["restricoes_horarios"].pop(membro, None)
+        dados["preferencias_horarios"].pop(membro, None)
+        if indice_grupos is not None:
+            grupos = indice_grupos.remover_membro(membro)
+        else:
+            grupos = [g for g, membros_grupo in dados["grupos"].items() if membro in membros_grupo]
+        for grupo in grupos:
+            dados["grupos"][grupo].pop(membro, None)
+    elif tipo == "membro_renomeado":
+        membro = mutacao["membro"]
+        for chave in ("membros", "excluidos"):
+            if membro in dados[chave]:
+                dados[chave][membro] = mutacao["nome"]
+    elif tipo == "restricoes_alteradas":
+        dados["restricoes_horarios"][mutacao["membro"]] = mascara_restricoes(mutacao["restricoes"])
+    elif tipo == "preferencias_alteradas":
+        preferencias = mascara_restricoes(mutacao["preferencias"])
+        if preferencias:
+            dados["preferencias_horarios"][mutacao["membro"]] = preferencias
+        else:
+            dados["preferencias_horarios"].pop(mutacao["membro"], None)
+    elif tipo == "grupo_criado":
+        dados["grupos"].setdefault(mutacao["grupo"], {})
+        if indice_grupos is not None:
+            indice_grupos.criar_grupo(mutacao["grupo"])
+    elif tipo == "membro_grupo_adicionado":
+        grupo, membro = mutacao["grupo"], mutacao["membro"]
+        membros_grupo = dados["grupos"].setdefault(grupo, {})
+        if indice_grupos is not None:
+            if indice_grupos.contem(grupo, membro):
+                return
+            indice_grupos.adicionar(grupo, membro)
+        elif membro in membros_grupo:
+            return
+        membros_grupo[membro] = None
+    elif tipo == "membro_grupo_removido":
+        grupo, membro = mutacao["grupo"], mutacao["membro"]
+        if indice_grupos is not None:
+            if not indice_grupos.contem(grupo, membro):
+                return
+            indice_grupos.remover(grupo, membro)
+        dados["grupos"].get(grupo, {}).pop(membro, None)
+    elif tipo == "sorteio_registrado":
+        dados["sorteios"].append(mutacao["sorteio"])
+    elif tipo == "sorteios_registrados":
+        dados["sorteios"].extend(mutacao["sorteios"])
+    elif tipo == "sorteio_reparado":
+        # Só os turnos alterados. O sorteio é trocado por uma cópia, não
+        # alterado no lugar: a interface e a gravação em segundo plano
+        # compartilham os mesmos dicts de sorteio.
+        posicao = localizar_reparo(dados["sorteios"], mutacao)
+        if posicao is not None:
+            sorteio = dados["sorteios"][posicao]
+            turnos = list(sorteio["turnos"])
+            for slot, _, depois in mutacao["alteracoes"]:
+                turnos[slot] = depois
+            dados["sorteios"][posicao] = dict(sorteio, turnos=turnos)
+    elif tipo == "lote":
+        # Várias mutações gravadas como uma só (importação em massa)
+        for item in mutacao["mutacoes"]:
+            aplicar_mutacao(dados, item, indice_grupos)
+    else:
+        raise ValueError(f"Mutação desconhecida: {tipo}")
+
+def separar_mutacao(mutacao):
+    # Divide em (parte do cadastro, parte do histórico); qualquer uma pode ser None
+    if mutacao["tipo"] in TIPOS_SORTEIO:
+        return None, mutacao
+    if mutacao["tipo"] != "lote":
+        return mutacao, None
+    cadastro, historico = [], []
+    for item in mutacao["mutacoes"]:
+        parte_cadastro, parte_historico = separar_mutacao(item)
+        if parte_cadastro:
+            cadastro.append(parte_cadastro)
+        if parte_historico:
+            historico.append(parte_historico)
+    return ({"tipo": "lote", "mutacoes": cadastro} if cadastro else None,
+            {"tipo": "lote", "mutacoes": historico} if historico else None)
+
+# ==================================================
+# MIGRAÇÃO DOS FORMATOS POR NOME
+# ==================================================
+# Até o formato 3 o membro era o próprio nome. Cada nome distinto ganha um
+# id; nomes que só aparecem no histórico viram membros excluídos.
+def _id_legado(dados, ids, nome):
+    if nome not in ids:
+        ids[nome] = dados["proximo_id"]
+        dados["proximo_id"] += 1
+        dados["excluidos"][ids[nome]] = nome
+    return ids[nome]
+
+def migrar_sorteio(dados, ids, sorteio):
+    resultados = sorteio["resultados"]
+    migrado = {"data": sorteio["data"],
+               "turnos": [None if nome == SEM_MEMBRO else _id_legado(dados, ids, nome)
+                          for nome in resultados.values()]}
+    if tuple(resultados) != CALENDARIO_PADRAO.rotulos:
+        migrado["horarios"] = list(resultados)
+    return migrado
+
+def migrar_legado(antigos):
+    # Devolve os dados no formato atual e o mapa nome -> id usado
+    dados = dados_vazios()
+    ids = {}
+    for nome in antigos.get("membros", []):
+        if nome not in ids:
+            ids[nome] = dados["proximo_id"]
+            dados["proximo_id"] += 1
+            dados["membros"][ids[nome]] = nome
+            dados["restricoes_horarios"][ids[nome]] = 0
+    for nome, restricoes in antigos.get("restricoes_horarios", {}).items():
+        if nome in ids:
+            dados["restricoes_horarios"][ids[nome]] = mascara_restricoes(restricoes)
+    for grupo, membros_grupo in antigos.get("grupos", {}).items():
+        dados["grupos"][grupo] = dict.fromkeys(ids[nome] for nome in membros_grupo if nome in ids)
+    dados["sorteios"] = [migrar_sorteio(dados, ids, s) for s in antigos.get("sorteios", [])]
+    return dados, ids
+
+def aplicar_legado(dados, mutacao, ids):
+    # Entrada de journal gravada antes dos ids: traduz os nomes e aplica
+    tipo = mutacao["tipo"]
+    if tipo == "lote":
+        for item in mutacao["mutacoes"]:
+            aplicar_legado(dados, item, ids)
+        return
+    mutacao = dict(mutacao)
+    if tipo == "membro_adicionado":
+        ids[mutacao["nome"]] = dados["proximo_id"]
+        mutacao["membro"] = ids[mutacao["nome"]]
+    elif tipo == "membro_excluido":
+        if mutacao["nome"] not in ids:
+            return
+        mutacao["membro"] = ids[mutacao["nome"]]
+    elif tipo in ("restricoes_alteradas", "membro_grupo_adicionado", "membro_grupo_removido"):
+        if mutacao["membro"] not in ids:
+            return
+        mutacao["membro"] = ids[mutacao["membro"]]
+    elif tipo == "sorteio_registrado":
+        mutacao["sorteio"] = migrar_sorteio(dados, ids, mutacao["sorteio"])
+    elif tipo == "sorteios_registrados":
+        mutacao["sorteios"] = [migrar_sorteio(dados, ids, s) for s in mutacao["sorteios"]]
+    aplicar_mutacao(dados, mutacao)
+
+# ==================================================
+# CONVERSÃO DO SNAPSHOT
+# ==================================================
+# No JSON as chaves de dicionário são texto e os grupos são listas
+def dados_do_snapshot(snapshot):
+    dados = dados_vazios()
+    dados["membros"] = {int(membro): nome for membro, nome in snapshot.get("membros", {}).items()}
+    dados["excluidos"] = {int(membro): nome for membro, nome in snapshot.get("excluidos", {}).items()}
+    dados["proximo_id"] = snapshot.get("proximo_id", max([*dados["membros"], *dados["excluidos"], 0]) + 1)
+    dados["grupos"] = {grupo: dict.fromkeys(membros_grupo)
+                       for grupo, membros_grupo in snapshot.get("grupos", {}).items()}
+    dados["restricoes_horarios"] = {int(membro): mascara_restricoes(restricoes)
+                                    for membro, restricoes in snapshot.get("restricoes_horarios", {}).items()}
+    dados["preferencias_horarios"] = {int(membro): mascara_restricoes(preferencias)
+                                      for membro, preferencias in snapshot.get("preferencias_horarios", {}).items()}
+    return dados
+
+# ==================================================
+# LEITURA PARCIAL DO SNAPSHOT
+# ==================================================
+def _pular_espacos(texto, pos):
+    while pos < len(texto) and texto[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+def ler_cadastro_json(texto):
+    # Decodifica o objeto de topo chave a chave. No formato 2 para ao chegar
+    # em "sorteios" e devolve a posição do valor; em arquivos antigos lê tudo.
+    decoder = json.JSONDecoder()
+    dados = {}
+    pos = _pular_espacos(texto, 0)
+    if not texto.startswith("{", pos):
+        raise json.JSONDecodeError("Esperado um objeto", texto, pos)
+    pos += 1
+    while True:
+        pos = _pular_espacos(texto, pos)
+        if texto.startswith("}", pos):
+            return dados, None
+        chave, pos = decoder.raw_decode(texto, pos)
+        pos = _pular_espacos(texto, pos)
+        if not texto.startswith(":", pos):
+            raise json.JSONDecodeError("Esperado ':'", texto, pos)
+        pos = _pular_espacos(texto, pos + 1)
+        if chave == "sorteios" and dados.get("formato", 0) >= 2:
+            return dados, pos
+        dados[chave], pos = decoder.raw_decode(texto, pos)
+        pos = _pular_espacos(texto, pos)
+        if texto.startswith(",", pos):
+            pos += 1
+
+# ==================================================
+# ARQUIVO JSON ÚNICO
+# ==================================================
+class ArmazenamentoJson:
+    # Reescreve o dados.json inteiro a cada alteração (comportamento original).
+    # Sorteios com mais de dias_arquivo dias vão para o arquivo frio (pasta
+    # arquivo_sorteios ao lado do dados.json) quando o histórico é lido.
+    # Com somente_leitura a carga não mexe em nenhum arquivo (não migra, não
+    # arquiva, não trunca o journal) e qualquer gravação é recusada.
+    def __init__(self, caminho=ARQUIVO_DADOS, caminho_journal=ARQUIVO_JOURNAL, dias_arquivo=None,
+                 somente_leitura=False):
+        self.caminho = caminho
+        self.somente_leitura = somente_leitura
+        self.caminho_journal = caminho_journal
+        self.pasta_arquivo = os.path.join(os.path.dirname(caminho), PASTA_ARQUIVO)
+        self.dias_arquivo = dias_para_arquivar() if dias_arquivo is None else dias_arquivo
+        self.arquivo = None
+        self.arquivados = 0
+        self._reescrever = False
+        self.versao = 0
+        self.historico = IndiceHistorico([])
+        self._texto = None
+        self._pos_sorteios = None
+        self._sorteios = []
+        self._adiadas = []
+
+    @medido("armazenamento.carregar")
+    def carregar(self, incluir_sorteios=True):
+        # Com incluir_sorteios=False devolve só o cadastro, com "sorteios"
+        # vazio; o histórico vem depois por carregar_sorteios()
+        texto = None
+        if os.path.exists(self.caminho):
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                texto = f.read()
+        if texto is not None:
+            snapshot, self._pos_sorteios = ler_cadastro_json(texto)
+        else:
+            snapshot, self._pos_sorteios = {"formato": FORMATO}, None
+        if snapshot.get("formato", 0) < FORMATO:
+            return self._migrar(snapshot, texto, incluir_sorteios)
+        self._texto = texto if self._pos_sorteios is not None else None
+        self._sorteios = snapshot.get("sorteios", []) if self._pos_sorteios is None else None
+        self.versao = snapshot.get("versao", 0)
+        self.arquivados = snapshot.get("arquivados", 0)
+        dados = dados_do_snapshot(snapshot)
+
+        # Entradas de journal ainda não compactadas também valem aqui; as que
+        # mexem no histórico esperam o histórico ser lido
+        self._adiadas = []
+        for mutacao in self._ler_journal():
+            cadastro, historico = separar_mutacao(mutacao)
+            if cadastro:
+                aplicar_mutacao(dados, cadastro)
+            if historico:
+                self._adiadas.append(historico)
+        if incluir_sorteios:
+            dados["sorteios"] = self.carregar_sorteios()
+        return dados
+
+    def _migrar(self, antigos, texto, incluir_sorteios):
+        # Arquivo por nomes: lê tudo, converte, refaz o journal pendente com os
+        # nomes traduzidos e grava já no formato atual, para que as próximas
+        # entradas de journal (com ids) nunca caiam sobre um snapshot antigo
+        if self._pos_sorteios is not None:
+            antigos["sorteios"] = json.JSONDecoder().raw_decode(texto, self._pos_sorteios)[0]
+        self.versao = antigos.get("versao", 0)
+        dados, ids = migrar_legado(antigos)
+        for mutacao in self._ler_journal():
+            aplicar_legado(dados, mutacao, ids)
+        if not self.somente_leitura:
+            self.salvar(dados)
+        self._texto = self._pos_sorteios = None
+        self._sorteios = dados["sorteios"]
+        self._adiadas = []
+        dados["sorteios"] = self.carregar_sorteios() if incluir_sorteios else []
+        return dados
+
+    @medido("armazenamento.carregar_sorteios")
+    def carregar_sorteios(self):
+        if self._sorteios is None:
+            self._sorteios = json.JSONDecoder().raw_decode(self._texto, self._pos_sorteios)[0]
+            self._texto = None
+        parcial = {"sorteios": self._sorteios}
+        for mutacao in self._adiadas:
+            aplicar_mutacao(parcial, mutacao)
+        self._adiadas = []
+        self._arquivar()
+        self.indexar_historico(self._sorteios)
+        return self._sorteios
+
+    def _arquivar(self):
+        # O começo da lista pode já estar no arquivo frio (arquivado depois
+        # da última gravação do snapshot): sai da lista. Depois vão para o
+        # arquivo os que passaram da idade. O dados.json sem eles é gravado
+        # no próximo salvar, ou ao fechar.
+        if self.arquivo is not None:
+            self.arquivo.fechar()
+        self.arquivo = ArquivoFrio(self.pasta_arquivo, self.somente_leitura)
+        ja_arquivados = max(0, len(self.arquivo) - self.arquivados)
+        novos = 0 if self.somente_leitura else quantos_arquivar(self._sorteios[ja_arquivados:], self.dias_arquivo)
+        self.arquivo.anexar(self._sorteios[ja_arquivados:ja_arquivados + novos])
+        if ja_arquivados + novos:
+            del self._sorteios[:ja_arquivados + novos]
+            self._reescrever = not self.somente_leitura
+        self.arquivados = len(self.arquivo)
+
+    def sorteios_arquivados(self):
+        # Lista completa do arquivo frio, para quem precisa de todo o histórico
+        return self.arquivo.ler_todos() if self.arquivo is not None else []
+
+    def indexar_historico(self, sorteios):
+        self.historico = IndiceHistorico(sorteios, self.arquivo)
+
+    def _entradas_journal(self):
+        # (versão, mutação) de cada linha íntegra do journal
+        if not os.path.exists(self.caminho_journal):
+            return
+        with open(self.caminho_journal, "rb" if self.somente_leitura else "rb+") as f:
+            valido = 0
+            for linha in f:
+                try:
+                    entrada = json.loads(linha.decode("utf-8"))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    # Última linha truncada por queda durante a escrita: descarta
+                    if not self.somente_leitura:
+                        f.truncate(valido)
+                    break
+                valido += len(linha)
+                yield entrada["versao"], entrada["mutacao"]
+
+    def _ler_journal(self):
+        for versao, mutacao in self._entradas_journal():
+            if versao <= self.versao:
+                continue
+            self.versao = versao
+            yield mutacao
+
+    @medido("armazenamento.salvar", lambda self, dados: tamanhos_dados(dados))
+    def salvar(self, dados):
+        # Grava num temporário e troca de uma vez: uma queda no meio da
+        # escrita nunca deixa o dados.json pela metade. O cadastro sai
+        # indentado; cada sorteio numa linha compacta, por último.
+        if self.somente_leitura:
+            raise PermissionError(f"{self.caminho} foi aberto só para leitura")
+        cadastro = {"formato": FORMATO, "versao": self.versao, "arquivados": self.arquivados}
+        for chave, valor in dados.items():
+            if chave == "grupos":
+                valor = {grupo: list(membros_grupo) for grupo, membros_grupo in valor.items()}
+            if chave != "sorteios":
+                cadastro[chave] = valor
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(json.dumps(cadastro, indent=4, ensure_ascii=False)[:-2])
+            f.write(',\n    "sorteios": [')
+            separador = "\n        "
+            for sorteio in dados["sorteios"]:
+                f.write(separador + json.dumps(sorteio, ensure_ascii=False, separators=(",", ":")))
+                separador = ",\n        "
+            f.write("\n    ]\n}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+        self._reescrever = False
+        if os.path.exists(self.caminho_journal):
+            os.remove(self.caminho_journal)
+
+    def registrar(self, dados, mutacao):
+        self.registrar_varios(dados, [mutacao])
+
+    @medido("armazenamento.registrar", lambda self, dados, mutacoes: {"mutacoes": len(mutacoes)})
+    def registrar_varios(self, dados, mutacoes):
+        if self.somente_leitura:
+            raise PermissionError(f"{self.caminho} foi aberto só para leitura")
+        self.versao += len(mutacoes)
+        for mutacao in mutacoes:
+            self._indexar(mutacao)
+        self.salvar(dados)
+
+    def _indexar(self, mutacao):
+        if mutacao["tipo"] == "sorteio_registrado":
+            self.historico.sorteio_adicionado()
+        elif mutacao["tipo"] == "sorteios_registrados":
+            self.historico.sorteio_adicionado(len(mutacao["sorteios"]))
+        elif mutacao["tipo"] == "lote":
+            for item in mutacao["mutacoes"]:
+                self._indexar(item)
+
+    # === CONSULTAS AO HISTÓRICO ===
+    def contar_sorteios(self, inicio=None, fim=None):
+        return self.historico.contar_sorteios(inicio, fim)
+
+    def cabecalhos_sorteios(self, offset=0, limite=50, inicio=None, fim=None):
+        return self.historico.cabecalhos_sorteios(offset, limite, inicio, fim)
+
+    def carregar_sorteio(self, id_sorteio):
+        return self.historico.carregar_sorteio(id_sorteio)
+
+    def fechar(self, dados):
+        if self._reescrever:
+            self.salvar(dados)
+        if self.arquivo is not None:
+            self.arquivo.fechar()
+
+# ==================================================
+# JOURNAL APENAS-ANEXAR
+# ==================================================
+class ArmazenamentoJournal(ArmazenamentoJson):
+    # Cada mutação vira uma linha no journal; de tempos em tempos o journal é
+    # compactado num novo dados.json. O custo de cada clique não depende do
+    # tamanho do histórico.
+    def __init__(self, caminho=ARQUIVO_DADOS, caminho_journal=ARQUIVO_JOURNAL, limite=LIMITE_COMPACTACAO,
+                 dias_arquivo=None, somente_leitura=False):
+        super().__init__(caminho, caminho_journal, dias_arquivo, somente_leitura)
+        self.limite = limite
+        self.entradas = 0
+
+    def carregar(self, incluir_sorteios=True):
+        dados = super().carregar(incluir_sorteios)
+        self.entradas = 0
+        if os.path.exists(self.caminho_journal):
+            with open(self.caminho_journal, "r", encoding="utf-8") as f:
+                self.entradas = sum(1 for _ in f)
+        return dados
+
+    @medido("armazenamento.registrar", lambda self, dados, mutacoes: {"mutacoes": len(mutacoes)})
+    def registrar_varios(self, dados, mutacoes):
+        if self.somente_leitura:
+            raise PermissionError(f"{self.caminho} foi aberto só para leitura")
+        linhas = []
+        for mutacao in mutacoes:
+            self.versao += 1
+            self._indexar(mutacao)
+            linhas.append(json.dumps({"versao": self.versao, "mutacao": mutacao},
+                                     ensure_ascii=False, separators=(",", ":")) + "\n")
+        with open(self.caminho_journal, "a", encoding="utf-8") as f:
+            f.write("".join(linhas))
+            f.flush()
+            os.fsync(f.fileno())
+        self.entradas += len(mutacoes)
+        if self.entradas >= self.limite:
+            return self.compactar(dados)
+
+    def compactar(self, dados):
+        # O snapshot guarda a versão da última mutação incorporada; se cair antes
+        # de apagar o journal, o replay ignora as entradas já compactadas.
+        self.salvar(dados)
+        self.entradas = 0
+
+    def fechar(self, dados):
+        if self.entradas and not self.somente_leitura:
+            self.compactar(dados)
+        super().fechar(dados)
+
+MODOS = {
+    "json": ArmazenamentoJson,
+    "journal": ArmazenamentoJournal,
+}
+
+def criar_armazenamento(modo=None, somente_leitura=False):
+    # O padrão continua o dados.json único; SORTEIO_ARMAZENAMENTO escolhe
+    # journal, sqlite ou compartilhado. somente_leitura serve a quem só
+    # consulta (o servidor). O json e o journal são lidos do mesmo jeito; no
+    # modo compartilhado quem só lê continua acompanhando as outras instâncias.
+    modo = modo or os.environ.get("SORTEIO_ARMAZENAMENTO", "json")
+    if modo == "sqlite":
+        from armazenamento_sqlite import ArmazenamentoSqlite
+        return ArmazenamentoSqlite(somente_leitura=somente_leitura)
+    if modo == "compartilhado":
+        from concorrencia import ArmazenamentoCompartilhado
+        return ArmazenamentoCompartilhado(somente_leitura=somente_leitura)
+    if modo not in MODOS:
+        raise ValueError(f"Modo de armazenamento desconhecido: {modo}")
+    if somente_leitura:
+        return ArmazenamentoJson(somente_leitura=True)
+    return MODOS[modo]()
@@ -0,0 +1,360 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from itertools import groupby
+
+from armazenamento import (ARQUIVO_DADOS, ARQUIVO_JOURNAL, ArmazenamentoJson, dados_vazios, localizar_reparo,
+                           tamanhos_dados)
+from calendario import CALENDARIO_PADRAO
+from instrumentacao import medido
+from motor_sorteio import calendario_do_sorteio, hora_do_horario, horas_da_mascara, mascara_restricoes
+
+ARQUIVO_SQLITE = "dados.db"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS membros (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    ativo INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS grupos (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS grupo_membros (
+    grupo_id INTEGER NOT NULL REFERENCES grupos(id),
+    membro_id INTEGER NOT NULL REFERENCES membros(id),
+    PRIMARY KEY (grupo_id, membro_id)
+);
+CREATE INDEX IF NOT EXISTS idx_grupo_membros_membro ON grupo_membros(membro_id);
+CREATE TABLE IF NOT EXISTS restricoes (
+    membro_id INTEGER NOT NULL REFERENCES membros(id),
+    hora TEXT NOT NULL,
+    PRIMARY KEY (membro_id, hora)
+);
+CREATE TABLE IF NOT EXISTS preferencias (
+    membro_id INTEGER NOT NULL REFERENCES membros(id),
+    hora TEXT NOT NULL,
+    PRIMARY KEY (membro_id, hora)
+);
+CREATE TABLE IF NOT EXISTS sorteios (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    data_iso TEXT NOT NULL,
+    calendario TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sorteios_data ON sorteios(data_iso);
+CREATE TABLE IF NOT EXISTS sorteio_slots (
+    sorteio_id INTEGER NOT NULL REFERENCES sorteios(id),
+    horario TEXT NOT NULL,
+    membro_id INTEGER REFERENCES membros(id),
+    PRIMARY KEY (sorteio_id, horario)
+);
+CREATE INDEX IF NOT EXISTS idx_sorteio_slots_membro ON sorteio_slots(membro_id);
+"""
+
+# Versão 1: o id do membro é o mesmo de dados["membros"] e o nome pode se
+# repetir; sorteios fora do calendário padrão guardam a configuração dele
+VERSAO_ESQUEMA = 1
+MIGRACAO_V1 = """
+ALTER TABLE sorteios ADD COLUMN calendario TEXT;
+CREATE TABLE membros_v1 (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    ativo INTEGER NOT NULL DEFAULT 1
+);
+INSERT INTO membros_v1 (id, nome, ativo) SELECT id, nome, ativo FROM membros;
+DROP TABLE membros;
+ALTER TABLE membros_v1 RENAME TO membros;
+"""
+
+def data_iso(data):
+    return datetime.strptime(data, "%d/%m/%Y %H:%M").strftime("%Y-%m-%d %H:%M")
+
+# ==================================================
+# ARMAZENAMENTO SQLITE
+# ==================================================
+class ArmazenamentoSqlite:
+    # Cada mutação toca só as linhas envolvidas. Membros excluídos ficam
+    # inativos para que os sorteios antigos continuem com o nome. Os ids de
+    # membros são os mesmos dos dados em memória. Com somente_leitura o banco
+    # é aberto em modo "ro": não é criado, migrado nem alterado.
+    def __init__(self, caminho=ARQUIVO_SQLITE, caminho_json=ARQUIVO_DADOS, somente_leitura=False):
+        self.caminho = caminho
+        self.caminho_json = caminho_json
+        self.somente_leitura = somente_leitura
+        self.conexao = None
+        # A conexão pode ser usada pela thread de gravação e pela interface
+        self.trava = threading.RLock()
+
+    def _conectar(self):
+        if self.conexao is None and self.somente_leitura:
+            if not os.path.exists(self.caminho):
+                raise FileNotFoundError(f"{self.caminho} não existe")
+            conexao = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, check_same_thread=False)
+            if conexao.execute("PRAGMA user_version").fetchone()[0] < VERSAO_ESQUEMA:
+                conexao.close()
+                raise RuntimeError(f"{self.caminho} está num formato antigo: abra o programa uma vez para atualizá-lo")
+            self.conexao = conexao
+        if self.conexao is None:
+            novo = not os.path.exists(self.caminho)
+            self.conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            versao = self.conexao.execute("PRAGMA user_version").fetchone()[0]
+            existente = self.conexao.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'membros'").fetchone()
+            if existente and versao < 1:
+                self.conexao.executescript(MIGRACAO_V1)
+                self._marcar_calendarios()
+            self.conexao.executescript(ESQUEMA)
+            self.conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+            if novo and self.caminho_json:
+                self.salvar(carregar_json_completo(self.caminho_json))
+        return self.conexao
+
+    def _marcar_calendarios(self):
+        # Bancos antigos gravavam os rótulos em cada turno, sem calendário;
+        # os sorteios fora do padrão passam a guardar seus rótulos
+        con = self.conexao
+        padrao = list(CALENDARIO_PADRAO.rotulos)
+        linhas = con.execute("SELECT sorteio_id, horario FROM sorteio_slots ORDER BY sorteio_id, rowid")
+        with con:
+            for id_sorteio, grupo in groupby(linhas.fetchall(), key=lambda linha: linha[0]):
+                horarios = [horario for _, horario in grupo]
+                if horarios != padrao:
+                    con.execute("UPDATE sorteios SET calendario = ? WHERE id = ?",
+                                (json.dumps({"horarios": horarios}, ensure_ascii=False), id_sorteio))
+
+    # === LEITURA ===
+    @medido("armazenamento.carregar")
+    def carregar(self, incluir_sorteios=True):
+        with self.trava:
+            dados = self._carregar_cadastro()
+            if incluir_sorteios:
+                dados["sorteios"] = self._carregar_sorteios()
+            return dados
+
+    @medido("armazenamento.carregar_sorteios")
+    def carregar_sorteios(self):
+        with self.trava:
+            return self._carregar_sorteios()
+
+    def indexar_historico(self, sorteios):
+        # As consultas ao histórico vão direto às tabelas
+        pass
+
+    def _carregar_sorteios(self):
+        return [self._montar_sorteio(id_sorteio, data, calendario)
+                for id_sorteio, data, calendario in self._conectar().execute(
+                    "SELECT id, data, calendario FROM sorteios ORDER BY data_iso, id").fetchall()]
+
+    def _montar_sorteio(self, id_sorteio, data, calendario):
+        sorteio = {"data": data, "turnos": self.turnos_sorteio(id_sorteio)}
+        if calendario:
+            sorteio.update(json.loads(calendario))
+        return sorteio
+
+    def _carregar_cadastro(self):
+        con = self._conectar()
+        dados = dados_vazios()
+        for membro, nome, ativo in con.execute("SELECT id, nome, ativo FROM membros ORDER BY id"):
+            dados["membros" if ativo else "excluidos"][membro] = nome
+            dados["proximo_id"] = membro + 1
+        for (nome,) in con.execute("SELECT nome FROM grupos ORDER BY id"):
+            dados["grupos"][nome] = {}
+        for grupo, membro in con.execute(
+                "SELECT g.nome, gm.membro_id FROM grupo_membros gm JOIN grupos g ON g.id = gm.grupo_id "
+                "ORDER BY gm.rowid"):
+            dados["grupos"][grupo][membro] = None
+        restricoes = dados["restricoes_horarios"]
+        for membro in dados["membros"]:
+            restricoes[membro] = 0
+        for membro, hora in con.execute("SELECT membro_id, hora FROM restricoes"):
+            restricoes[membro] = restricoes.get(membro, 0) | 1 << hora_do_horario(hora)
+        preferencias = dados["preferencias_horarios"]
+        # Só falta num banco anterior às preferências aberto para leitura
+        if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'preferencias'").fetchone():
+            for membro, hora in con.execute("SELECT membro_id, hora FROM preferencias"):
+                preferencias[membro] = preferencias.get(membro, 0) | 1 << hora_do_horario(hora)
+        return dados
+
+    def contar_sorteios(self, inicio=None, fim=None):
+        where, params = self._filtro_datas(inicio, fim)
+        with self.trava:
+            return self._conectar().execute(f"SELECT COUNT(*) FROM sorteios {where}", params).fetchone()[0]
+
+    def cabecalhos_sorteios(self, offset=0, limite=50, inicio=None, fim=None):
+        # Só id e data: os resultados são lidos sob demanda
+        where, params = self._filtro_datas(inicio, fim)
+        with self.trava:
+            return [{"id": id_sorteio, "data": data} for id_sorteio, data in self._conectar().execute(
+                f"SELECT id, data FROM sorteios {where} ORDER BY data_iso, id LIMIT ? OFFSET ?",
+                params + [limite, offset])]
+
+    def carregar_sorteio(self, id_sorteio):
+        with self.trava:
+            linha = self._conectar().execute(
+                "SELECT data, calendario FROM sorteios WHERE id = ?", (id_sorteio,)).fetchone()
+            if linha is None:
+                raise KeyError(id_sorteio)
+            return self._montar_sorteio(id_sorteio, *linha)
+
+    def turnos_sorteio(self, id_sorteio):
+        return [membro for (membro,) in self._conectar().execute(
+            "SELECT membro_id FROM sorteio_slots WHERE sorteio_id = ? ORDER BY rowid", (id_sorteio,))]
+
+    def turnos_membro(self, membro):
+        with self.trava:
+            return self._conectar().execute(
+                "SELECT so.data, s.horario FROM sorteio_slots s JOIN sorteios so ON so.id = s.sorteio_id "
+                "WHERE s.membro_id = ? ORDER BY so.data_iso, s.rowid", (membro,)).fetchall()
+
+    def _filtro_datas(self, inicio, fim):
+        condicoes, params = [], []
+        if inicio is not None:
+            condicoes.append("data_iso >= ?")
+            params.append(inicio.strftime("%Y-%m-%d %H:%M"))
+        if fim is not None:
+            condicoes.append("data_iso <= ?")
+            params.append(fim.strftime("%Y-%m-%d %H:%M"))
+        return ("WHERE " + " AND ".join(condicoes) if condicoes else ""), params
+
+    # === ESCRITA ===
+    def _id_grupo(self, nome):
+        con = self._conectar()
+        con.execute("INSERT OR IGNORE INTO grupos (nome) VALUES (?)", (nome,))
+        return con.execute("SELECT id FROM grupos WHERE nome = ?", (nome,)).fetchone()[0]
+
+    def _definir_horas(self, tabela, id_membro, mascara):
+        # Uma linha por hora em "restricoes" ou "preferencias"
+        con = self._conectar()
+        con.execute(f"DELETE FROM {tabela} WHERE membro_id = ?", (id_membro,))
+        con.executemany(f"INSERT OR IGNORE INTO {tabela} (membro_id, hora) VALUES (?, ?)",
+                        [(id_membro, hora) for hora in horas_da_mascara(mascara_restricoes(mascara))])
+
+    def _inserir_sorteio(self, sorteio):
+        con = self._conectar()
+        calendario = {chave: sorteio[chave] for chave in ("calendario", "horarios") if chave in sorteio}
+        id_sorteio = con.execute("INSERT INTO sorteios (data, data_iso, calendario) VALUES (?, ?, ?)",
+                                 (sorteio["data"], data_iso(sorteio["data"]),
+                                  json.dumps(calendario) if calendario else None)).lastrowid
+        con.executemany("INSERT INTO sorteio_slots (sorteio_id, horario, membro_id) VALUES (?, ?, ?)",
+                        [(id_sorteio, horario, membro)
+                         for horario, membro in zip(calendario_do_sorteio(sorteio).rotulos, sorteio["turnos"])])
+        return id_sorteio
+
+    def _reparar_sorteio(self, mutacao):
+        # Mesmo critério de armazenamento.localizar_reparo, entre os sorteios da data
+        con = self._conectar()
+        candidatos = con.execute("SELECT id, calendario FROM sorteios WHERE data = ? ORDER BY id DESC",
+                                 (mutacao["data"],)).fetchall()
+        for id_sorteio, calendario in candidatos:
+            sorteio = self._montar_sorteio(id_sorteio, mutacao["data"], calendario)
+            if localizar_reparo([sorteio], mutacao) is None:
+                continue
+            rotulos = calendario_do_sorteio(sorteio).rotulos
+            con.executemany("UPDATE sorteio_slots SET membro_id = ? WHERE sorteio_id = ? AND horario = ?",
+                            [(depois, id_sorteio, rotulos[slot]) for slot, _, depois in mutacao["alteracoes"]])
+            return
+
+    def _aplicar(self, mutacao):
+        con = self._conectar()
+        tipo = mutacao["tipo"]
+        if tipo == "membro_adicionado":
+            con.execute("INSERT OR REPLACE INTO membros (id, nome, ativo) VALUES (?, ?, 1)",
+                        (mutacao["membro"], mutacao["nome"]))
+            self._definir_horas("restricoes", mutacao["membro"], mutacao.get("restricoes", 0))
+        elif tipo == "membro_excluido":
+            con.execute("UPDATE membros SET ativo = 0 WHERE id = ?", (mutacao["membro"],))
+            con.execute("DELETE FROM grupo_membros WHERE membro_id = ?", (mutacao["membro"],))
+            con.execute("DELETE FROM restricoes WHERE membro_id = ?", (mutacao["membro"],))
+            con.execute("DELETE FROM preferencias WHERE membro_id = ?", (mutacao["membro"],))
+        elif tipo == "membro_renomeado":
+            con.execute("UPDATE membros SET nome = ? WHERE id = ?", (mutacao["nome"], mutacao["membro"]))
+        elif tipo == "restricoes_alteradas":
+            self._definir_horas("restricoes", mutacao["membro"], mutacao["restricoes"])
+        elif tipo == "preferencias_alteradas":
+            self._definir_horas("preferencias", mutacao["membro"], mutacao["preferencias"])
+        elif tipo == "grupo_criado":
+            self._id_grupo(mutacao["grupo"])
+        elif tipo == "membro_grupo_adicionado":
+            con.execute("INSERT OR IGNORE INTO grupo_membros (grupo_id, membro_id) VALUES (?, ?)",
+                        (self._id_grupo(mutacao["grupo"]), mutacao["membro"]))
+        elif tipo == "membro_grupo_removido":
+            con.execute("DELETE FROM grupo_membros WHERE grupo_id = ? AND membro_id = ?",
+                        (self._id_grupo(mutacao["grupo"]), mutacao["membro"]))
+        elif tipo == "sorteio_registrado":
+            self._inserir_sorteio(mutacao["sorteio"])
+        elif tipo == "sorteios_registrados":
+            for sorteio in mutacao["sorteios"]:
+                self._inserir_sorteio(sorteio)
+        elif tipo == "sorteio_reparado":
+            self._reparar_sorteio(mutacao)
+        elif tipo == "lote":
+            for item in mutacao["mutacoes"]:
+                self._aplicar(item)
+        else:
+            raise ValueError(f"Mutação desconhecida: {tipo}")
+
+    def registrar(self, dados, mutacao):
+        self.registrar_varios(dados, [mutacao])
+
+    @medido("armazenamento.registrar", lambda self, dados, mutacoes: {"mutacoes": len(mutacoes)})
+    def registrar_varios(self, dados, mutacoes):
+        with self.trava, self._conectar():
+            for mutacao in mutacoes:
+                self._aplicar(mutacao)
+
+    @medido("armazenamento.salvar", lambda self, dados: tamanhos_dados(dados))
+    def salvar(self, dados):
+        # Regrava tudo numa única transação (usado na migração)
+        con = self._conectar()
+        with self.trava, con:
+            for tabela in ("sorteio_slots", "sorteios", "preferencias", "restricoes", "grupo_membros", "grupos",
+                           "membros"):
+                con.execute(f"DELETE FROM {tabela}")
+            con.executemany("INSERT INTO membros (id, nome, ativo) VALUES (?, ?, 0)", dados["excluidos"].items())
+            for membro, nome in dados["membros"].items():
+                self._aplicar({"tipo": "membro_adicionado", "membro": membro, "nome": nome,
+                               "restricoes": dados["restricoes_horarios"].get(membro, 0)})
+            for membro, preferencias in dados["preferencias_horarios"].items():
+                self._definir_horas("preferencias", membro, preferencias)
+            for grupo, membros_grupo in dados["grupos"].items():
+                self._id_grupo(grupo)
+                for membro in membros_grupo:
+                    self._aplicar({"tipo": "membro_grupo_adicionado", "grupo": grupo, "membro": membro})
+            for sorteio in dados["sorteios"]:
+                self._inserir_sorteio(sorteio)
+
+    def fechar(self, dados):
+        with self.trava:
+            if self.conexao is not None:
+                self.conexao.close()
+                self.conexao = None
+
+# ==================================================
+# MIGRAÇÃO
+# ==================================================
+def carregar_json_completo(caminho_json):
+    # O histórico inteiro, inclusive o que já foi para o arquivo frio. A
+    # origem só é lida: o journal é o que fica ao lado do dados.json
+    caminho_journal = os.path.splitext(caminho_json)[0] + os.path.splitext(ARQUIVO_JOURNAL)[1]
+    origem = ArmazenamentoJson(caminho_json, caminho_journal, somente_leitura=True)
+    dados = origem.carregar()
+    dados["sorteios"][:0] = origem.sorteios_arquivados()
+    origem.fechar(dados)
+    return dados
+
+def migrar_json(caminho_json=ARQUIVO_DADOS, caminho_db=ARQUIVO_SQLITE):
+    dados = carregar_json_completo(caminho_json)
+    destino = ArmazenamentoSqlite(caminho_db, caminho_json=None)
+    destino.salvar(dados)
+    destino.fechar(dados)
+    return dados
+
+if __name__ == "__main__":
+    dados = migrar_json(*sys.argv[1:3])
+    print(f"{len(dados['membros'])} membros, {len(dados['grupos'])} grupos e "
+          f"{len(dados['sorteios'])} sorteios migrados.")
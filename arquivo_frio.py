@@ -0,0 +1,179 @@
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+PASTA_ARQUIVO = "arquivo_sorteios"
+DIAS_ARQUIVO = 365            # SORTEIO_ARQUIVO_DIAS muda; 0 desliga
+MANTER_RECENTES = 200         # nunca arquiva os últimos, que o motor e a equidade leem
+TAMANHO_SEGMENTO = 4 * 1024 * 1024
+NIVEL_COMPRESSAO = 6
+# Entrada do índice: data "dd/mm/aaaa HH:MM", posição e tamanho no segmento
+ENTRADA = struct.Struct("<16sQI")
+# Início de cada registro (antes de comprimir): tipo do array de ids,
+# quantidade de turnos e tamanho do JSON com as chaves extras do sorteio
+CABECALHO = struct.Struct("<cHI")
+
+# Sorteios antigos em segmentos só de anexar, um registro comprimido por
+# sorteio (ids dos turnos, 0 = vago). O .idx ao lado diz onde está cada um.
+
+def dias_para_arquivar():
+    return int(os.environ.get("SORTEIO_ARQUIVO_DIAS", DIAS_ARQUIVO))
+
+def quantos_arquivar(sorteios, dias, agora=None):
+    # Só um prefixo é arquivado: a lista e o arquivo continuam na mesma ordem
+    if dias <= 0:
+        return 0
+    limite = (agora or datetime.now()) - timedelta(days=dias)
+    maximo = max(0, len(sorteios) - MANTER_RECENTES)
+    quantidade = 0
+    while quantidade < maximo and datetime.strptime(sorteios[quantidade]["data"], "%d/%m/%Y %H:%M") < limite:
+        quantidade += 1
+    return quantidade
+
+# ==================================================
+# CODIFICAÇÃO
+# ==================================================
+def codificar_sorteio(sorteio):
+    ids = [0 if membro is None else membro for membro in sorteio["turnos"]]
+    turnos = array("H" if max(ids, default=0) < 1 << 16 else "I", ids)
+    if sys.byteorder == "big":
+        turnos.byteswap()
+    extras = {chave: valor for chave, valor in sorteio.items() if chave not in ("data", "turnos")}
+    extra = json.dumps(extras, ensure_ascii=False, separators=(",", ":")).encode("utf-8") if extras else b""
+    registro = CABECALHO.pack(turnos.typecode.encode("ascii"), len(turnos), len(extra)) + extra + turnos.tobytes()
+    return zlib.compress(registro, NIVEL_COMPRESSAO)
+
+def decodificar_sorteio(data, bloco):
+    registro = zlib.decompress(bloco)
+    tipo, quantidade, tamanho_extra = CABECALHO.unpack_from(registro)
+    inicio = CABECALHO.size + tamanho_extra
+    turnos = array(tipo.decode("ascii"))
+    turnos.frombytes(registro[inicio:inicio + quantidade * turnos.itemsize])
+    if sys.byteorder == "big":
+        turnos.byteswap()
+    sorteio = {"data": data, "turnos": [membro or None for membro in turnos]}
+    if tamanho_extra:
+        sorteio.update(json.loads(registro[CABECALHO.size:inicio].decode("utf-8")))
+    return sorteio
+
+# ==================================================
+# SEGMENTOS
+# ==================================================
+class ArquivoFrio:
+    # Sorteios numerados de 0 a len()-1 na ordem de entrada. Com
+    # somente_leitura nada é criado nem truncado.
+    def __init__(self, pasta, somente_leitura=False):
+        self.pasta = pasta
+        self.somente_leitura = somente_leitura
+        self.entradas = []    # (data, segmento, posição, tamanho)
+        self.segmentos = []
+        self.mapas = {}
+        if not os.path.isdir(pasta):
+            return
+        for nome in sorted(os.listdir(pasta)):
+            if nome.startswith("segmento_") and nome.endswith(".dat"):
+                self.segmentos.append(nome[:-4])
+        for segmento in self.segmentos:
+            self._ler_indice(segmento)
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def _caminho(self, segmento, extensao):
+        return os.path.join(self.pasta, segmento + extensao)
+
+    def _ler_indice(self, segmento):
+        caminho_idx = self._caminho(segmento, ".idx")
+        if self.somente_leitura:
+            conteudo = b""
+            if os.path.exists(caminho_idx):
+                with open(caminho_idx, "rb") as f:
+                    conteudo = f.read()
+            validos = len(conteudo) - len(conteudo) % ENTRADA.size
+        else:
+            with open(caminho_idx, "ab+") as f:
+                f.seek(0)
+                conteudo = f.read()
+                # Entrada pela metade (queda no meio da escrita): descarta
+                validos = len(conteudo) - len(conteudo) % ENTRADA.size
+                if validos != len(conteudo):
+                    f.truncate(validos)
+        fim = 0
+        for data, posicao, tamanho in ENTRADA.iter_unpack(conteudo[:validos]):
+            self.entradas.append((data.decode("ascii"), segmento, posicao, tamanho))
+            fim = posicao + tamanho
+        # Registros sem entrada no índice nunca foram confirmados
+        caminho_dat = self._caminho(segmento, ".dat")
+        if not self.somente_leitura and os.path.getsize(caminho_dat) > fim:
+            with open(caminho_dat, "r+b") as f:
+                f.truncate(fim)
+
+    def data(self, indice):
+        return self.entradas[indice][0]
+
+    def _bytes(self, segmento, posicao, tamanho):
+        if mmap is None:
+            with open(self._caminho(segmento, ".dat"), "rb") as f:
+                f.seek(posicao)
+                return f.read(tamanho)
+        mapa = self.mapas.get(segmento)
+        if mapa is None or len(mapa[1]) < posicao + tamanho:
+            self._fechar_mapa(segmento)
+            arquivo = open(self._caminho(segmento, ".dat"), "rb")
+            mapa = self.mapas[segmento] = (arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ))
+        return mapa[1][posicao:posicao + tamanho]
+
+    def ler(self, indice):
+        data, segmento, posicao, tamanho = self.entradas[indice]
+        return decodificar_sorteio(data, self._bytes(segmento, posicao, tamanho))
+
+    def ler_todos(self):
+        return [self.ler(indice) for indice in range(len(self.entradas))]
+
+    def anexar(self, sorteios):
+        # Grava os registros, sincroniza e só então as entradas do índice:
+        # depois de uma queda, o que não está no índice não foi arquivado
+        if not sorteios:
+            return
+        if self.somente_leitura:
+            raise PermissionError(f"{self.pasta} foi aberto só para leitura")
+        os.makedirs(self.pasta, exist_ok=True)
+        segmento = self.segmentos[-1] if self.segmentos else None
+        if segmento is None or os.path.getsize(self._caminho(segmento, ".dat")) >= TAMANHO_SEGMENTO:
+            segmento = f"segmento_{len(self.segmentos) + 1:05d}"
+            self.segmentos.append(segmento)
+        novas = []
+        with open(self._caminho(segmento, ".dat"), "ab") as f:
+            posicao = f.tell()
+            for sorteio in sorteios:
+                bloco = codificar_sorteio(sorteio)
+                f.write(bloco)
+                novas.append((sorteio["data"], segmento, posicao, len(bloco)))
+                posicao += len(bloco)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._caminho(segmento, ".idx"), "ab") as f:
+            f.write(b"".join(ENTRADA.pack(data.encode("ascii"), posicao, tamanho)
+                             for data, _, posicao, tamanho in novas))
+            f.flush()
+            os.fsync(f.fileno())
+        self.entradas.extend(novas)
+
+    def _fechar_mapa(self, segmento):
+        arquivo, mapa = self.mapas.pop(segmento, (None, None))
+        if mapa is not None:
+            mapa.close()
+            arquivo.close()
+
+    def fechar(self):
+        for segmento in list(self.mapas):
+            self._fechar_mapa(segmento)
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import armazenamento
+import armazenamento_sqlite
+import exportacao
+import motor_sorteio
+import otimizacao
+from calendario import obter_calendario
+from equidade import ContadoresServico
+from historico import IndiceHistorico, PaginadorHistorico
+from indices import IndiceGrupos
+
+# Benchmarks dos caminhos críticos, sem interface gráfica:
+#   python benchmark.py --escala media --saida benchmark.json
+
+ESCALAS = {
+    "pequena": {"membros": 60, "grupos": 5, "densidade": 0.3, "sorteios": 100},
+    "media": {"membros": 1000, "grupos": 20, "densidade": 0.3, "sorteios": 5000},
+    "grande": {"membros": 10000, "grupos": 100, "densidade": 0.3, "sorteios": 50000},
+}
+
+# ==================================================
+# DADOS SINTÉTICOS
+# ==================================================
+def gerar_dados_sinteticos(membros=60, grupos=5, densidade=0.3, sorteios=100, semente=0):
+    # Mesmo formato do dados.json. densidade = fração média de horas restritas.
+    rng = random.Random(semente)
+    horas = motor_sorteio.get_horarios_restricao()
+    horarios = motor_sorteio.get_horarios_sorteio()
+    ids = list(range(1, membros + 1))
+
+    dados = armazenamento.dados_vazios()
+    dados["membros"] = {membro: f"Membro {membro:05d}" for membro in ids}
+    dados["proximo_id"] = membros + 1
+    for membro in ids:
+        quantidade = min(len(horas), int(rng.expovariate(1.0 / max(densidade * len(horas), 1e-9))))
+        dados["restricoes_horarios"][membro] = motor_sorteio.mascara_restricoes(rng.sample(horas, quantidade))
+    for g in range(grupos):
+        dados["grupos"][f"Grupo {g:03d}"] = {}
+    nomes_grupos = list(dados["grupos"])
+    for membro in ids:
+        if nomes_grupos:
+            for grupo in rng.sample(nomes_grupos, min(len(nomes_grupos), rng.randint(1, 2))):
+                dados["grupos"][grupo][membro] = None
+
+    inicio = datetime(2020, 1, 1, 20, 0)
+    for k in range(sorteios):
+        escolhidos = rng.sample(ids, min(len(ids), len(horarios)))
+        escolhidos += [None] * (len(horarios) - len(escolhidos))
+        dados["sorteios"].append(motor_sorteio.montar_sorteio(
+            (inicio + timedelta(days=k)).strftime("%d/%m/%Y %H:%M"), escolhidos))
+    return dados
+
+# ==================================================
+# MEDIÇÃO
+# ==================================================
+def medir(funcao, repeticoes=5):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "mediana_ms": round(statistics.median(tempos), 3),
+        "min_ms": round(min(tempos), 3),
+        "max_ms": round(max(tempos), 3),
+        "repeticoes": repeticoes,
+    }
+
+def benchmark_sorteio(dados, repeticoes):
+    rng = random.Random(1)
+    membros, restricoes, sorteios = dados["membros"], dados["restricoes_horarios"], dados["sorteios"]
+    contadores = ContadoresServico(sorteios)
+    vigilia = obter_calendario(minutos=15, dias=7, turnos_por_membro=3)
+    turnos = motor_sorteio.sortear_turnos(membros, restricoes, sorteios, random.Random(2))
+    return {
+        "sorteio_guloso": medir(lambda: motor_sorteio.gerar_sorteio(membros, restricoes, sorteios, rng), repeticoes),
+        "sorteio_otimo": medir(lambda: motor_sorteio.gerar_sorteio(
+            membros, restricoes, sorteios, rng, modo=motor_sorteio.MODO_OTIMO), repeticoes),
+        "sorteio_equidade": medir(lambda: motor_sorteio.gerar_sorteio(
+            membros, restricoes, sorteios, rng, contadores=contadores), repeticoes),
+        # Cadeia de 7 dias em turnos de 15 min (672 turnos), até 3 por membro
+        "sorteio_vigilia_semana": medir(lambda: motor_sorteio.gerar_sorteio(
+            membros, restricoes, sorteios, rng, calendario=vigilia), repeticoes),
+        # Busca local das metas com número fixo de tentativas, sem prazo
+        "sorteio_metas": medir(lambda: otimizacao.otimizar_turnos(
+            turnos, list(membros), restricoes, dados["grupos"], sorteios=sorteios, orcamento=None, iteracoes=20000,
+            rng=rng), repeticoes),
+    }
+
+def benchmark_armazenamento(dados, repeticoes, pasta):
+    resultados = {}
+    sorteio = motor_sorteio.gerar_sorteio(dados["membros"], dados["restricoes_horarios"], dados["sorteios"])
+    mutacao = {"tipo": "sorteio_registrado", "sorteio": sorteio}
+
+    caminho_json = os.path.join(pasta, "dados.json")
+    caminho_journal = os.path.join(pasta, "dados.journal")
+    # dias_arquivo=0: aqui o histórico inteiro fica no dados.json
+    json_ = armazenamento.ArmazenamentoJson(caminho_json, caminho_journal, dias_arquivo=0)
+    resultados["json_salvar"] = medir(lambda: json_.salvar(dados), repeticoes)
+    resultados["json_carregar"] = medir(lambda: json_.carregar(), repeticoes)
+    resultados["json_carregar_cadastro"] = medir(lambda: json_.carregar(incluir_sorteios=False), repeticoes)
+    resultados["json_registrar"] = medir(lambda: json_.registrar(dados, mutacao), repeticoes)
+
+    journal = armazenamento.ArmazenamentoJournal(caminho_json, caminho_journal, dias_arquivo=0)
+    journal.carregar()
+    resultados["journal_registrar"] = medir(lambda: journal.registrar(dados, mutacao), repeticoes)
+    resultados["journal_carregar"] = medir(lambda: journal.carregar(), repeticoes)
+
+    caminho_db = os.path.join(pasta, "dados.db")
+    resultados["sqlite_migrar"] = medir(lambda: armazenamento_sqlite.migrar_json(caminho_json, caminho_db), 1)
+    sqlite = armazenamento_sqlite.ArmazenamentoSqlite(caminho_db, caminho_json=None)
+    resultados["sqlite_registrar"] = medir(lambda: sqlite.registrar(dados, mutacao), repeticoes)
+    resultados["sqlite_carregar"] = medir(lambda: sqlite.carregar(), repeticoes)
+    resultados["sqlite_carregar_cadastro"] = medir(lambda: sqlite.carregar(incluir_sorteios=False), repeticoes)
+    sqlite.fechar(dados)
+
+    # Arquivo frio: todos menos os mais recentes saem do dados.json
+    pasta_fria = os.path.join(pasta, "frio")
+    os.makedirs(pasta_fria)
+    caminho_frio = os.path.join(pasta_fria, "dados.json")
+    armazenamento.ArmazenamentoJson(caminho_frio, caminho_journal, dias_arquivo=0).salvar(dados)
+    frio = armazenamento.ArmazenamentoJournal(caminho_frio, caminho_journal, dias_arquivo=1)
+    resultados["arquivo_arquivar"] = medir(lambda: frio.fechar(frio.carregar()), 1)
+    resultados["arquivo_carregar"] = medir(lambda: frio.carregar(), repeticoes)
+    resultados["arquivo_ler_sorteio"] = medir(lambda: frio.historico.carregar_sorteio(0), repeticoes)
+    frio.arquivo.fechar()
+    return resultados
+
+def benchmark_exportacao(dados, repeticoes, pasta):
+    indice_grupos = IndiceGrupos(dados["grupos"])
+    sorteio = dados["sorteios"][-1] if dados["sorteios"] else motor_sorteio.gerar_sorteio(
+        dados["membros"], dados["restricoes_horarios"])
+    caminho_pdf = os.path.join(pasta, "sorteio.pdf")
+
+    def nome_de(membro):
+        return armazenamento.nome_membro(dados, membro)
+
+    return {
+        "exportar_texto": medir(lambda: exportacao.texto_sorteio(sorteio, indice_grupos, nome_de), repeticoes),
+        "exportar_pdf": medir(lambda: exportacao.pdf_sorteio(sorteio, indice_grupos, nome_de, caminho_pdf),
+                              repeticoes),
+    }
+
+def benchmark_historico(dados, repeticoes):
+    # Parte da aba Histórico que não depende de widgets: primeira página,
+    # leitura do sorteio escolhido e divisão por grupos
+    fonte = IndiceHistorico(dados["sorteios"])
+    indice_grupos = IndiceGrupos(dados["grupos"])
+
+    def abrir_historico():
+        paginador = PaginadorHistorico(fonte)
+        pagina = paginador.proxima_pagina()
+        if pagina:
+            indice_grupos.rotear(motor_sorteio.turnos_rotulados(fonte.carregar_sorteio(pagina[0]["id"])))
+
+    def filtrar_periodo():
+        PaginadorHistorico(fonte, datetime(2021, 1, 1), datetime(2021, 3, 31, 23, 59)).proxima_pagina()
+
+    return {
+        "historico_abrir": medir(abrir_historico, repeticoes),
+        "historico_filtrar": medir(filtrar_periodo, repeticoes),
+    }
+
+def executar(parametros, repeticoes=5, semente=0):
+    inicio = time.perf_counter()
+    dados = gerar_dados_sinteticos(semente=semente, **parametros)
+    geracao_ms = round((time.perf_counter() - inicio) * 1000, 3)
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = {}
+        resultados.update(benchmark_sorteio(dados, repeticoes))
+        resultados.update(benchmark_armazenamento(dados, repeticoes, pasta))
+        resultados.update(benchmark_exportacao(dados, repeticoes, pasta))
+        resultados.update(benchmark_historico(dados, repeticoes))
+    return {"parametros": parametros, "geracao_dados_ms": geracao_ms, "resultados": resultados}
+
+# ==================================================
+# LINHA DE COMANDO
+# ==================================================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do Sorteio de Oração")
+    parser.add_argument("--escala", choices=list(ESCALAS) + ["todas"], default="pequena")
+    parser.add_argument("--membros", type=int)
+    parser.add_argument("--grupos", type=int)
+    parser.add_argument("--densidade", type=float, help="fração média de horas restritas por membro")
+    parser.add_argument("--sorteios", type=int, help="tamanho do histórico")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", default="benchmark.json", help="relatório JSON")
+    args = parser.parse_args()
+
+    escalas = list(ESCALAS) if args.escala == "todas" else [args.escala]
+    relatorio = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cenarios": [],
+    }
+    for escala in escalas:
+        parametros = dict(ESCALAS[escala])
+        for chave in ("membros", "grupos", "densidade", "sorteios"):
+            if getattr(args, chave) is not None:
+                parametros[chave] = getattr(args, chave)
+        cenario = executar(parametros, args.repeticoes, args.semente)
+        cenario["escala"] = escala
+        relatorio["cenarios"].append(cenario)
+        print(f"== {escala}: {parametros}")
+        for nome, tempo in cenario["resultados"].items():
+            print(f"  {nome:<20} {tempo['mediana_ms']:>10.2f} ms")
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=4, ensure_ascii=False)
+    print(f"Relatório salvo em {args.saida}")
+
+if __name__ == "__main__":
+    main()
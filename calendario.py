@@ -0,0 +1,100 @@
+from functools import lru_cache
+
+MINUTOS_DIA = 24 * 60
+INICIO_NOTURNO = "00:00"
+FIM_NOTURNO = "06:00"
+
+HORAS_RESTRICAO = tuple(f"{hora:02d}:00" for hora in range(24))
+
+def minutos_do_horario(texto):
+    # "HH:MM" -> minutos desde a meia-noite; "24:00" vale como fim do dia
+    horas, _, minutos = texto.strip().partition(":")
+    if not horas.isdigit() or not minutos.isdigit() or int(minutos) > 59 or int(horas) * 60 + int(minutos) > MINUTOS_DIA:
+        raise ValueError(f"horário inválido '{texto}'")
+    return int(horas) * 60 + int(minutos)
+
+def horario_do_rotulo(rotulo):
+    # "Dia 3 08:15" -> "08:15"; rótulos de um dia só já são o horário
+    return rotulo[-5:]
+
+def eh_noturno(h):
+    return INICIO_NOTURNO <= horario_do_rotulo(h) <= FIM_NOTURNO
+
+# ==================================================
+# CALENDÁRIO DE TURNOS
+# ==================================================
+class Calendario:
+    # Tabela fixa dos turnos de uma vigília: cada dia vai de `inicio` até
+    # `fim` (fim menor ou igual ao início atravessa a meia-noite) em turnos de
+    # `minutos`, repetido por `dias`. O turno s aparece nos resultados como
+    # rotulos[s], tem sua hora de restrição em horas[s] e começa inicios[s]
+    # minutos depois da meia-noite do primeiro dia. As tabelas são tuplas
+    # montadas uma vez; use obter_calendario() para reaproveitá-las.
+    def __init__(self, inicio="00:00", fim="24:00", minutos=15, dias=1, turnos_por_membro=1):
+        inicio_min = minutos_do_horario(inicio) % MINUTOS_DIA
+        janela = (minutos_do_horario(fim) - inicio_min) % MINUTOS_DIA or MINUTOS_DIA
+        if minutos < 1 or janela % minutos:
+            raise ValueError(f"turnos de {minutos} min não dividem a janela de {janela} min")
+        if dias < 1:
+            raise ValueError("a vigília precisa de pelo menos um dia")
+        if turnos_por_membro < 1:
+            raise ValueError("cada membro precisa poder ter pelo menos um turno")
+        self.config = (inicio, fim, minutos, dias, turnos_por_membro)
+        self.turnos_por_membro = turnos_por_membro
+        self.dias = dias
+        self.duracao = minutos
+
+        rotulos, horas, inicios = [], [], []
+        for dia in range(dias):
+            for passo in range(janela // minutos):
+                minuto = (inicio_min + passo * minutos) % MINUTOS_DIA
+                horario = f"{minuto // 60:02d}:{minuto % 60:02d}"
+                rotulos.append(horario if dias == 1 else f"Dia {dia + 1} {horario}")
+                horas.append(minuto // 60)
+                inicios.append(dia * MINUTOS_DIA + inicio_min + passo * minutos)
+        self.rotulos = tuple(rotulos)
+        self.horas = tuple(horas)
+        self.inicios = tuple(inicios)
+        self.noturnos = tuple(eh_noturno(r) for r in rotulos)
+        self.chaves = tuple(zip(self.horas, self.noturnos))
+
+    def __len__(self):
+        return len(self.rotulos)
+
+@lru_cache(maxsize=None)
+def obter_calendario(inicio="00:00", fim="24:00", minutos=15, dias=1, turnos_por_membro=1):
+    return Calendario(inicio, fim, minutos, dias, turnos_por_membro)
+
+CALENDARIO_PADRAO = obter_calendario()
+
+class TurnosAvulsos:
+    # Só as tabelas de rótulos, para sorteios antigos cujos horários não
+    # correspondem a nenhum calendário conhecido
+    def __init__(self, rotulos):
+        self.config = None
+        self.turnos_por_membro = 1
+        self.rotulos = tuple(rotulos)
+        self.horas = tuple(int(horario_do_rotulo(r)[:2]) for r in self.rotulos)
+        self.noturnos = tuple(eh_noturno(r) for r in self.rotulos)
+        self.chaves = tuple(zip(self.horas, self.noturnos))
+        # Início de cada turno pelo "Dia N" e pelo horário; um horário menor
+        # que o anterior atravessou a meia-noite
+        inicios, dia, virada = [], 0, 0
+        for r in self.rotulos:
+            minuto = minutos_do_horario(horario_do_rotulo(r))
+            dia_rotulo = int(r.split()[1]) - 1 if r.startswith("Dia ") else 0
+            if dia_rotulo != dia:
+                dia, virada = dia_rotulo, 0
+            elif inicios and (dia + virada) * MINUTOS_DIA + minuto < inicios[-1]:
+                virada += 1
+            inicios.append((dia + virada) * MINUTOS_DIA + minuto)
+        self.inicios = tuple(inicios)
+        passos = [b - a for a, b in zip(inicios, inicios[1:]) if b > a]
+        self.duracao = min(passos) if passos else 15
+
+    def __len__(self):
+        return len(self.rotulos)
+
+@lru_cache(maxsize=None)
+def obter_turnos_avulsos(rotulos):
+    return TurnosAvulsos(rotulos)
@@ -0,0 +1,245 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from armazenamento import (ARQUIVO_DADOS, ARQUIVO_JOURNAL, LIMITE_COMPACTACAO, ArmazenamentoJournal,
+                           aplicar_mutacao)
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+RETER_JOURNAL = 200       # entradas que sobrevivem à compactação, para quem ainda não as leu
+ESPERA_TRAVA = 10.0
+
+# Várias instâncias sobre a mesma pasta, com o journal como canal. Sob a
+# trava, cada uma lê o que as outras anexaram antes de continuar a numeração.
+
+class ConflitoConcorrente(Exception):
+    def __init__(self, nossa, alheia):
+        super().__init__(f"'{nossa['tipo']}' conflita com '{alheia['tipo']}' gravada por outra instância")
+        self.nossa = nossa
+        self.alheia = alheia
+
+class RecargaNecessaria(Exception):
+    pass
+
+# ==================================================
+# TRAVA ENTRE PROCESSOS
+# ==================================================
+class TravaArquivo:
+    # Trava exclusiva e consultiva (fcntl no Unix, msvcrt no Windows) num
+    # arquivo ao lado dos dados. Reentrante dentro do processo.
+    def __init__(self, caminho, espera=ESPERA_TRAVA):
+        self.caminho = caminho
+        self.espera = espera
+        self.local = threading.RLock()
+        self.nivel = 0
+        self.arquivo = None
+
+    def _tentar(self, arquivo):
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _soltar(self, arquivo):
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+        else:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def __enter__(self):
+        self.local.acquire()
+        if self.nivel == 0:
+            arquivo = open(self.caminho, "a+b")
+            prazo = time.monotonic() + self.espera
+            while True:
+                try:
+                    self._tentar(arquivo)
+                    break
+                except OSError:
+                    if time.monotonic() < prazo:
+                        time.sleep(0.02)
+                        continue
+                    arquivo.close()
+                    self.local.release()
+                    raise TimeoutError(f"{self.caminho} está travado por outra instância há mais de {self.espera:.0f} s")
+            self.arquivo = arquivo
+        self.nivel += 1
+        return self
+
+    def __exit__(self, *erro):
+        self.nivel -= 1
+        if self.nivel == 0:
+            self._soltar(self.arquivo)
+            self.arquivo.close()
+            self.arquivo = None
+        self.local.release()
+
+# ==================================================
+# CONFLITOS
+# ==================================================
+def chaves_mutacao(mutacao):
+    # O que a mutação altera. Sorteios novos só são anexados e não conflitam.
+    tipo = mutacao["tipo"]
+    if tipo == "lote":
+        return set().union(*(chaves_mutacao(item) for item in mutacao["mutacoes"]))
+    if tipo in ("membro_adicionado", "membro_excluido"):
+        return {("membro", mutacao["membro"])}
+    if tipo == "membro_renomeado":
+        return {("nome", mutacao["membro"])}
+    if tipo == "restricoes_alteradas":
+        return {("restricoes", mutacao["membro"])}
+    if tipo == "preferencias_alteradas":
+        return {("preferencias", mutacao["membro"])}
+    if tipo == "grupo_criado":
+        return {("grupo", mutacao["grupo"])}
+    if tipo in ("membro_grupo_adicionado", "membro_grupo_removido"):
+        return {("grupo_membro", mutacao["grupo"], mutacao["membro"])}
+    if tipo == "sorteio_reparado":
+        return {("sorteio", mutacao["data"])}
+    return set()
+
+def _membros(chaves):
+    return {chave[-1] for chave in chaves if chave[0] != "grupo"}
+
+def _entradas_saidas(chaves):
+    return {chave[1] for chave in chaves if chave[0] == "membro"}
+
+def conflito(nossas, alheias):
+    # Primeiro par (nossa, alheia) em conflito, ou None. Criar ou excluir um
+    # membro conflita com qualquer mudança nele; a mesma mutação dos dois
+    # lados não conflita.
+    for alheia in alheias:
+        chaves_alheia = chaves_mutacao(alheia)
+        if not chaves_alheia:
+            continue
+        for nossa in nossas:
+            chaves_nossa = chaves_mutacao(nossa)
+            if not chaves_nossa or nossa == alheia:
+                continue
+            if (chaves_nossa & chaves_alheia or _entradas_saidas(chaves_alheia) & _membros(chaves_nossa)
+                    or _entradas_saidas(chaves_nossa) & _membros(chaves_alheia)):
+                return nossa, alheia
+    return None
+
+def versao_snapshot(caminho):
+    # "versao" é a segunda chave do dados.json: basta o começo do arquivo
+    if not os.path.exists(caminho):
+        return 0
+    with open(caminho, "r", encoding="utf-8", errors="replace") as f:
+        achado = re.search(r'"versao":\s*(\d+)', f.read(512))
+    return int(achado.group(1)) if achado else 0
+
+# ==================================================
+# JOURNAL COMPARTILHADO
+# ==================================================
+class ArmazenamentoCompartilhado(ArmazenamentoJournal):
+    # A compactação mantém as últimas `reter` entradas no journal para que as
+    # outras instâncias possam alcançá-la; quem ficou para trás recebe
+    # RecargaNecessaria.
+    compartilhado = True
+
+    def __init__(self, caminho=ARQUIVO_DADOS, caminho_journal=ARQUIVO_JOURNAL, limite=LIMITE_COMPACTACAO,
+                 dias_arquivo=None, reter=RETER_JOURNAL, somente_leitura=False):
+        super().__init__(caminho, caminho_journal, limite, dias_arquivo, somente_leitura)
+        self.trava_arquivo = TravaArquivo(caminho + ".trava")
+        self.reter = reter
+        self._marca = None
+
+    def _marca_atual(self):
+        # Tamanho e data dos dois arquivos: se não mudaram, não há nada novo
+        marca = []
+        for caminho in (self.caminho, self.caminho_journal):
+            try:
+                estado = os.stat(caminho)
+                marca.append((estado.st_size, estado.st_mtime_ns))
+            except FileNotFoundError:
+                marca.append(None)
+        return tuple(marca)
+
+    def carregar(self, incluir_sorteios=True):
+        with self.trava_arquivo:
+            dados = super().carregar(incluir_sorteios)
+            self._marca = self._marca_atual()
+            return dados
+
+    def carregar_sorteios(self):
+        with self.trava_arquivo:
+            return super().carregar_sorteios()
+
+    def _novas(self):
+        # Entradas gravadas pelas outras instâncias depois de self.versao
+        if self._marca_atual() == self._marca:
+            return []
+        novas = [(versao, mutacao) for versao, mutacao in self._entradas_journal() if versao > self.versao]
+        if novas[:1] and novas[0][0] != self.versao + 1 or not novas and versao_snapshot(self.caminho) > self.versao:
+            raise RecargaNecessaria("outra instância compactou entradas que esta ainda não tinha lido")
+        self._marca = self._marca_atual()
+        return novas
+
+    def _incorporar(self, dados, novas):
+        for versao, mutacao in novas:
+            aplicar_mutacao(dados, mutacao)
+            self._indexar(mutacao)
+            self.versao = versao
+        self.entradas += len(novas)
+        return [mutacao for _, mutacao in novas]
+
+    def sincronizar(self, dados):
+        # Aplica em `dados` o que as outras instâncias gravaram e devolve essas mutações
+        with self.trava_arquivo:
+            return self._incorporar(dados, self._novas())
+
+    def registrar_varios(self, dados, mutacoes, ja_recebidas=()):
+        # `dados` já tem `mutacoes` aplicadas. ja_recebidas são mutações
+        # alheias que entraram em `dados` depois que essas foram feitas: também
+        # contam como conflito. Devolve as alheias lidas agora.
+        if self.somente_leitura:
+            raise PermissionError(f"{self.caminho} foi aberto só para leitura")
+        with self.trava_arquivo:
+            novas = self._novas()
+            par = conflito(mutacoes, [*ja_recebidas, *(mutacao for _, mutacao in novas)])
+            if par is not None:
+                raise ConflitoConcorrente(*par)
+            recebidas = self._incorporar(dados, novas)
+            # A compactação, se houver, pode trazer mais alheias
+            recebidas += super().registrar_varios(dados, mutacoes) or []
+            self._marca = self._marca_atual()
+            return recebidas
+
+    def salvar(self, dados):
+        # O snapshot inclui o que as outras instâncias gravaram até aqui;
+        # essas mutações são devolvidas, como em registrar_varios
+        if self.somente_leitura:
+            raise PermissionError(f"{self.caminho} foi aberto só para leitura")
+        with self.trava_arquivo:
+            recebidas = self._incorporar(dados, self._novas()) if self._marca is not None else []
+            cauda = []
+            if os.path.exists(self.caminho_journal):
+                with open(self.caminho_journal, "rb") as f:
+                    cauda = [linha for linha in deque(f, maxlen=self.reter) if linha.endswith(b"\n")]
+            super().salvar(dados)
+            if cauda:
+                # As entradas mantidas já estão no snapshot: o replay as ignora
+                temporario = self.caminho_journal + ".tmp"
+                with open(temporario, "wb") as f:
+                    f.write(b"".join(cauda))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporario, self.caminho_journal)
+            # Só as entradas novas contam para a próxima compactação
+            self.entradas = 0
+            self._marca = self._marca_atual()
+            return recebidas
+
+    def compactar(self, dados):
+        return self.salvar(dados)
@@ -0,0 +1,56 @@
+import math
+from collections import Counter, deque
+
+from motor_sorteio import calendario_do_sorteio
+
+JANELA_PADRAO = 30
+PESO_HORA = 1.0
+PESO_TOTAL = 0.3
+PESO_MINIMO = 1e-100
+
+# ==================================================
+# CONTADORES DE SERVIÇO
+# ==================================================
+class ContadoresServico:
+    # Quantas vezes cada membro serviu em cada hora nos últimos `janela`
+    # sorteios. Cada sorteio registrado soma seus turnos e o que sai da
+    # janela é subtraído: nada de reler os resultados antigos.
+    def __init__(self, sorteios=(), janela=JANELA_PADRAO):
+        self.janela = janela
+        self.turnos_por_sorteio = deque()
+        self.por_hora = {}
+        self.total = Counter()
+        for sorteio in list(sorteios)[-janela:] if janela else []:
+            self.registrar(sorteio)
+
+    def registrar(self, sorteio):
+        if not self.janela:
+            return
+        horas = calendario_do_sorteio(sorteio).horas
+        turnos = [(membro, hora) for membro, hora in zip(sorteio["turnos"], horas) if membro is not None]
+        self._somar(turnos, 1)
+        self.turnos_por_sorteio.append(turnos)
+        if len(self.turnos_por_sorteio) > self.janela:
+            self._somar(self.turnos_por_sorteio.popleft(), -1)
+
+    def _somar(self, turnos, sinal):
+        for membro, hora in turnos:
+            horas = self.por_hora.setdefault(membro, Counter())
+            horas[hora] += sinal
+            self.total[membro] += sinal
+            if not horas[hora]:
+                del horas[hora]
+                if not horas:
+                    del self.por_hora[membro]
+            if not self.total[membro]:
+                del self.total[membro]
+
+    def vezes(self, membro, hora=None):
+        if hora is None:
+            return self.total.get(membro, 0)
+        return self.por_hora.get(membro, {}).get(hora, 0)
+
+    def peso(self, membro, hora):
+        # Quem já serviu muito, e principalmente nessa hora, tem menos chance
+        penalidade = PESO_HORA * self.vezes(membro, hora) + PESO_TOTAL * self.vezes(membro)
+        return max(math.exp(-penalidade), PESO_MINIMO)
@@ -0,0 +1,26 @@
+from collections import defaultdict
+
+# ==================================================
+# AVISOS DE MUDANÇA
+# ==================================================
+class Eventos:
+    # Repassa cada mutação a quem assinou o tipo dela; um "lote", item a item
+    def __init__(self):
+        self.assinantes = defaultdict(list)
+
+    def assinar(self, tipos, funcao):
+        for tipo in tipos:
+            self.assinantes[tipo].append(funcao)
+
+    def publicar(self, mutacao):
+        if mutacao["tipo"] == "lote":
+            for item in mutacao["mutacoes"]:
+                self.publicar(item)
+            return
+        for funcao in list(self.assinantes[mutacao["tipo"]]):
+            funcao(mutacao)
+
+    def cancelar(self, tipos, funcao):
+        for tipo in tipos:
+            if funcao in self.assinantes[tipo]:
+                self.assinantes[tipo].remove(funcao)
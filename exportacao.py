@@ -0,0 +1,51 @@
+from instrumentacao import medido
+from motor_sorteio import turnos_rotulados
+
+# nome_de(id) devolve o nome a exibir (armazenamento.nome_membro); None é
+# turno vago
+
+# ==================================================
+# TEXTO
+# ==================================================
+@medido("exportacao.texto")
+def texto_sorteio(sorteio, indice_grupos, nome_de):
+    turnos = list(turnos_rotulados(sorteio))
+    linhas = [f"Sorteio - {sorteio['data']}", "", "Geral:"]
+    linhas.extend(f"{h}: {nome_de(m)}" for h, m in turnos)
+    linhas.append("")
+    for grupo, turnos_grupo in indice_grupos.rotear(turnos).items():
+        linhas.append(f"{grupo}:")
+        linhas.extend(f"{h}: {nome_de(m)}" for h, m in turnos_grupo)
+        linhas.append("")
+    return "\n".join(linhas) + "\n"
+
+# ==================================================
+# PDF
+# ==================================================
+def nome_arquivo_pdf(sorteio):
+    return f"sorteio_{sorteio['data'].replace('/', '-').replace(':', '-')}.pdf"
+
+@medido("exportacao.pdf")
+def pdf_sorteio(sorteio, indice_grupos, nome_de, file_path=None):
+    file_path = file_path or nome_arquivo_pdf(sorteio)
+    turnos = list(turnos_rotulados(sorteio))
+    # fpdf só é importado na primeira exportação
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"Sorteio - {sorteio['data']}", ln=1, align='C')
+    pdf.set_font("Arial", 'B', size=10)
+    pdf.cell(200, 10, txt="Geral:", ln=1)
+    pdf.set_font("Arial", size=10)
+    for h, m in turnos:
+        pdf.cell(200, 10, txt=f"{h}: {nome_de(m) if m is not None else '-'}", ln=1)
+    for grupo, turnos_grupo in indice_grupos.rotear(turnos).items():
+        pdf.set_font("Arial", 'B', size=10)
+        pdf.cell(200, 10, txt=f"{grupo}:", ln=1)
+        pdf.set_font("Arial", size=10)
+        for h, m in turnos_grupo:
+            pdf.cell(200, 10, txt=f"{h}: {nome_de(m)}", ln=1)
+    pdf.output(file_path)
+    return file_path
@@ -0,0 +1,260 @@
+import csv
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from instrumentacao import medido
+from motor_sorteio import calendario_do_sorteio
+
+SORTEIOS_POR_BLOCO = 50
+FORMATOS = ("pdf", "csv", "ics")
+CABECALHO_CSV = ("data_sorteio", "horario", "inicio", "fim", "membro", "grupos")
+LIMITE_LINHA_ICS = 75
+
+# Exportação dos sorteios de um período numa passada só. Os sorteios correm
+# por uma sequência de geradores (leitura -> turnos de cada sorteio -> blocos)
+# e cada bloco vira texto CSV e iCalendar num processo de trabalho, escrito
+# na ordem em que foi lido. O PDF é um documento só (o FPDF não junta
+# documentos): é desenhado nesta thread, bloco a bloco, enquanto os
+# processos cuidam do CSV e do iCalendar.
+
+# ==================================================
+# ETAPAS
+# ==================================================
+def mapa_grupos(grupos):
+    # id -> grupos do membro, na ordem de dados["grupos"]
+    por_membro = {}
+    for grupo, membros_grupo in grupos.items():
+        for membro in membros_grupo:
+            por_membro.setdefault(membro, []).append(grupo)
+    return {membro: tuple(lista) for membro, lista in por_membro.items()}
+
+def ler_sorteios(fonte, cabecalhos):
+    for cabecalho in cabecalhos:
+        yield fonte.carregar_sorteio(cabecalho["id"])
+
+def turnos_sorteios(sorteios, nomes, grupos_por_membro, grupos=None):
+    # Um bloco por sorteio: {"data", "turnos": [(slot, rótulo, início, fim,
+    # id, nome, grupos)]}. Com `grupos`, só os turnos de membros desses grupos.
+    for sorteio in sorteios:
+        calendario = calendario_do_sorteio(sorteio)
+        dia = datetime.strptime(sorteio["data"], "%d/%m/%Y %H:%M").replace(hour=0, minute=0)
+        duracao = timedelta(minutes=calendario.duracao)
+        turnos = []
+        for slot, (rotulo, inicio, membro) in enumerate(zip(calendario.rotulos, calendario.inicios,
+                                                              sorteio["turnos"])):
+            grupos_membro = grupos_por_membro.get(membro, ())
+            if grupos and not grupos.intersection(grupos_membro):
+                continue
+            comeco = dia + timedelta(minutes=inicio)
+            turnos.append((slot, rotulo, comeco, comeco + duracao, membro,
+                           nomes.get(membro) if membro is not None else None, grupos_membro))
+        yield {"data": sorteio["data"], "turnos": turnos}
+
+def em_blocos(itens, tamanho):
+    bloco = []
+    for item in itens:
+        bloco.append(item)
+        if len(bloco) == tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+# ==================================================
+# CSV
+# ==================================================
+def csv_bloco(sorteios):
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    for sorteio in sorteios:
+        for _, rotulo, inicio, fim, _, nome, grupos in sorteio["turnos"]:
+            escritor.writerow((sorteio["data"], rotulo, inicio.strftime("%d/%m/%Y %H:%M"),
+                               fim.strftime("%d/%m/%Y %H:%M"), nome or "", ";".join(grupos)))
+    return saida.getvalue()
+
+# ==================================================
+# ICALENDAR
+# ==================================================
+def escapar_ics(texto):
+    return texto.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def dobrar_linha_ics(linha):
+    # RFC 5545: no máximo 75 octetos por linha; a continuação começa com espaço
+    if len(linha) * 4 <= LIMITE_LINHA_ICS or len(linha.encode("utf-8")) <= LIMITE_LINHA_ICS:
+        return linha + "\r\n"
+    partes, atual, tamanho = [], [], 0
+    for c in linha:
+        octetos = len(c.encode("utf-8"))
+        if tamanho + octetos > LIMITE_LINHA_ICS:
+            partes.append("".join(atual))
+            atual, tamanho = [" "], 1
+        atual.append(c)
+        tamanho += octetos
+    partes.append("".join(atual))
+    return "\r\n".join(partes) + "\r\n"
+
+def inicio_ics(nome_calendario):
+    linhas = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Sorteio de Oracao//PT-BR", "CALSCALE:GREGORIAN",
+              f"X-WR-CALNAME:{escapar_ics(nome_calendario)}"]
+    return "".join(dobrar_linha_ics(linha) for linha in linhas)
+
+def fim_ics():
+    return "END:VCALENDAR\r\n"
+
+def ics_bloco(sorteios, carimbo):
+    # Um evento por turno preenchido; horários locais, sem fuso
+    linhas = []
+    for sorteio in sorteios:
+        chave = datetime.strptime(sorteio["data"], "%d/%m/%Y %H:%M").strftime("%Y%m%dT%H%M")
+        for slot, rotulo, inicio, fim, membro, nome, grupos in sorteio["turnos"]:
+            if membro is None:
+                continue
+            linhas.extend([
+                "BEGIN:VEVENT",
+                f"UID:{chave}-{slot}-{membro}@sorteio-igreja",
+                f"DTSTAMP:{carimbo}",
+                f"DTSTART:{inicio:%Y%m%dT%H%M%S}",
+                f"DTEND:{fim:%Y%m%dT%H%M%S}",
+                f"SUMMARY:{escapar_ics(f'Oração - {nome}')}",
+            ])
+            if grupos:
+                linhas.append(f"DESCRIPTION:{escapar_ics(', '.join(grupos))}")
+            linhas.append("END:VEVENT")
+    return "".join(dobrar_linha_ics(linha) for linha in linhas)
+
+# ==================================================
+# PDF
+# ==================================================
+def latin1(texto):
+    # As fontes padrão do FPDF só têm latin-1
+    return texto.replace("—", "-").encode("latin-1", "replace").decode("latin-1")
+
+def iniciar_pdf(titulo):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, 15)
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', size=14)
+    pdf.cell(0, 10, txt=latin1(titulo), ln=1, align='C')
+    return pdf
+
+def pdf_bloco(pdf, sorteios, grupos):
+    # Cada sorteio com seus turnos: "Geral" ou uma seção por grupo pedido.
+    # Um multi_cell por seção em vez de um cell por linha.
+    for sorteio in sorteios:
+        pdf.set_font("Arial", 'B', size=11)
+        pdf.cell(0, 8, txt=latin1(f"Sorteio - {sorteio['data']}"), ln=1)
+        if grupos:
+            secoes = [(grupo, [t for t in sorteio["turnos"] if grupo in t[6]]) for grupo in grupos]
+        else:
+            secoes = [("Geral", sorteio["turnos"])]
+        for nome_secao, turnos in secoes:
+            if not turnos:
+                continue
+            pdf.set_font("Arial", 'B', size=10)
+            pdf.cell(0, 6, txt=latin1(f"{nome_secao}:"), ln=1)
+            pdf.set_font("Arial", size=9)
+            pdf.multi_cell(0, 4.5, latin1("\n".join(f"{t[1]}: {t[5] or '-'}" for t in turnos)))
+        pdf.ln(2)
+
+# ==================================================
+# EXPORTAÇÃO
+# ==================================================
+def nome_base(inicio=None, fim=None):
+    if inicio is None and fim is None:
+        return "sorteios_todos"
+    return (f"sorteios_{inicio.strftime('%Y%m%d') if inicio else 'inicio'}_"
+            f"{fim.strftime('%Y%m%d') if fim else 'fim'}")
+
+def _enviar(executor, funcao, *args):
+    if executor is not None:
+        return executor.submit(funcao, *args)
+    futuro = Future()
+    futuro.set_result(funcao(*args))
+    return futuro
+
+@medido("exportacao.periodo", lambda fonte, cabecalhos, *args, **kwargs: {"sorteios": len(cabecalhos)})
+def exportar_periodo(fonte, cabecalhos, nomes, grupos_por_membro, pasta, base, formatos=FORMATOS, grupos=(),
+                     titulo="Sorteios", processos=None, progresso=None, cancelado=None):
+    # cabecalhos: os do período, do mais antigo ao mais recente. nomes e
+    # grupos_por_membro são cópias feitas por quem chama: aqui pode rodar
+    # fora da thread da interface. progresso(feitas, total) é chamado a cada
+    # tarefa concluída; com `cancelado` (threading.Event) ligado, para e
+    # devolve None. Senão devolve os caminhos gerados. Cancelada ou com erro,
+    # não deixa arquivos pela metade. Só o documento do PDF cresce com o
+    # período: o FPDF guarda as páginas em memória até gravar.
+    processos = processos or os.cpu_count() or 1
+    grupos = list(grupos)
+    por_bloco = [f for f in FORMATOS if f in formatos]
+    total = -(-len(cabecalhos) // SORTEIOS_POR_BLOCO) * len(por_bloco)
+    caminhos = {formato: os.path.join(pasta, f"{base}.{formato}") for formato in FORMATOS if formato in formatos}
+    carimbo = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    feitas = 0
+    concluida = False
+
+    # spawn, como no lote_sorteios: a interface tem outras threads rodando
+    executor = (ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn"))
+                if processos > 1 else None)
+    arquivos = {}
+    try:
+        if "csv" in caminhos:
+            arquivos["csv"] = open(caminhos["csv"], "w", encoding="utf-8-sig", newline="")
+            csv.writer(arquivos["csv"]).writerow(CABECALHO_CSV)
+        if "ics" in caminhos:
+            arquivos["ics"] = open(caminhos["ics"], "w", encoding="utf-8", newline="")
+            arquivos["ics"].write(inicio_ics(titulo))
+
+        pendentes = deque()
+        pdf = iniciar_pdf(titulo) if "pdf" in caminhos else None
+
+        def avancar():
+            nonlocal feitas
+            feitas += 1
+            if progresso:
+                progresso(feitas, total)
+
+        def concluir_primeira():
+            formato, futuro = pendentes.popleft()
+            arquivos[formato].write(futuro.result())
+            avancar()
+
+        etapas = em_blocos(turnos_sorteios(ler_sorteios(fonte, cabecalhos), nomes, grupos_por_membro,
+                                           set(grupos)), SORTEIOS_POR_BLOCO)
+        for bloco in etapas:
+            if cancelado is not None and cancelado.is_set():
+                break
+            if "csv" in arquivos:
+                pendentes.append(("csv", _enviar(executor, csv_bloco, bloco)))
+            if "ics" in arquivos:
+                pendentes.append(("ics", _enviar(executor, ics_bloco, bloco, carimbo)))
+            if pdf is not None:
+                pdf_bloco(pdf, bloco, grupos)
+                avancar()
+            # Poucas tarefas adiantadas: a memória não cresce com o período
+            while len(pendentes) > 2 * processos:
+                concluir_primeira()
+        while pendentes and not (cancelado is not None and cancelado.is_set()):
+            concluir_primeira()
+
+        if cancelado is not None and cancelado.is_set():
+            return None
+        if "ics" in arquivos:
+            arquivos["ics"].write(fim_ics())
+        if pdf is not None:
+            pdf.output(caminhos["pdf"])
+        concluida = True
+        return [caminhos[formato] for formato in FORMATOS if formato in caminhos]
+    finally:
+        for arquivo in arquivos.values():
+            arquivo.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if not concluida:
+            for caminho in caminhos.values():
+                if os.path.exists(caminho):
+                    os.remove(caminho)
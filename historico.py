@@ -0,0 +1,122 @@
+from bisect import bisect_left, bisect_right, insort
+
+TAMANHO_PAGINA = 50
+
+def chave_data(data):
+    # "dd/mm/aaaa HH:MM" -> "aaaammddHH:MM", que ordena como texto
+    return data[6:10] + data[3:5] + data[0:2] + data[11:16]
+
+def chave_datetime(momento):
+    return momento.strftime("%Y%m%d%H:%M")
+
+# ==================================================
+# ÍNDICE DO HISTÓRICO EM MEMÓRIA
+# ==================================================
+class IndiceHistorico:
+    # Mesmas consultas do ArmazenamentoSqlite. Os ids 0..len(arquivo)-1 são
+    # os arquivados; depois vem a posição na lista.
+    def __init__(self, sorteios, arquivo=None):
+        self.sorteios = sorteios
+        self.arquivo = arquivo
+        self.base = len(arquivo) if arquivo is not None else 0
+        self.ordem_datas = None
+
+    def _total(self):
+        return self.base + len(self.sorteios)
+
+    def _data(self, id_sorteio):
+        if id_sorteio < self.base:
+            return self.arquivo.data(id_sorteio)
+        return self.sorteios[id_sorteio - self.base]["data"]
+
+    def _datas(self):
+        # Montado só na primeira consulta por período
+        if self.ordem_datas is None:
+            self.ordem_datas = sorted((chave_data(self._data(i)), i) for i in range(self._total()))
+        return self.ordem_datas
+
+    def sorteio_adicionado(self, quantidade=1):
+        if self.ordem_datas is not None:
+            for idx in range(self._total() - quantidade, self._total()):
+                insort(self.ordem_datas, (chave_data(self._data(idx)), idx))
+
+    def _intervalo(self, inicio, fim):
+        datas = self._datas()
+        lo = bisect_left(datas, (chave_datetime(inicio), -1)) if inicio is not None else 0
+        hi = bisect_right(datas, (chave_datetime(fim), self._total())) if fim is not None else len(datas)
+        return lo, max(lo, hi)
+
+    def contar_sorteios(self, inicio=None, fim=None):
+        if inicio is None and fim is None:
+            return self._total()
+        lo, hi = self._intervalo(inicio, fim)
+        return hi - lo
+
+    def cabecalhos_sorteios(self, offset=0, limite=TAMANHO_PAGINA, inicio=None, fim=None):
+        if inicio is None and fim is None:
+            ids = range(offset, min(offset + limite, self._total()))
+        else:
+            lo, hi = self._intervalo(inicio, fim)
+            ids = [i for _, i in self.ordem_datas[lo + offset:min(lo + offset + limite, hi)]]
+        return [{"id": i, "data": self._data(i)} for i in ids]
+
+    def carregar_sorteio(self, id_sorteio):
+        # Id desconhecido: KeyError, como no ArmazenamentoSqlite
+        if not isinstance(id_sorteio, int) or not 0 <= id_sorteio < self._total():
+            raise KeyError(id_sorteio)
+        if id_sorteio < self.base:
+            return self.arquivo.ler(id_sorteio)
+        return self.sorteios[id_sorteio - self.base]
+
+# ==================================================
+# PAGINAÇÃO
+# ==================================================
+class PaginadorHistorico:
+    # Cabeçalhos do mais recente para o mais antigo, uma página por vez
+    def __init__(self, fonte, inicio=None, fim=None, tamanho_pagina=TAMANHO_PAGINA):
+        self.fonte = fonte
+        self.inicio = inicio
+        self.fim = fim
+        self.tamanho_pagina = tamanho_pagina
+        self.total = fonte.contar_sorteios(inicio, fim)
+        self.carregados = []
+
+    def tem_mais(self):
+        return len(self.carregados) < self.total
+
+    def proxima_pagina(self):
+        fim = self.total - len(self.carregados)
+        inicio = max(0, fim - self.tamanho_pagina)
+        if fim <= 0:
+            return []
+        pagina = self.fonte.cabecalhos_sorteios(inicio, fim - inicio, self.inicio, self.fim)
+        pagina.reverse()
+        self.carregados.extend(pagina)
+        return pagina
+
+    def no_periodo(self, data):
+        chave = chave_data(data)
+        return ((self.inicio is None or chave >= chave_datetime(self.inicio)) and
+                (self.fim is None or chave <= chave_datetime(self.fim)))
+
+    def sorteio_adicionado(self, sorteio):
+        # O cabeçalho leva o próprio sorteio, sem id. False: é preciso recarregar.
+        if self.carregados and chave_data(sorteio["data"]) < chave_data(self.carregados[0]["data"]):
+            return False
+        self.total += 1
+        self.carregados.insert(0, {"id": None, "data": sorteio["data"], "sorteio": sorteio})
+        return True
+
+    def sorteio_reparado(self, mutacao):
+        # O reparo troca o dict do sorteio por uma cópia (ver aplicar_mutacao):
+        # os cabeçalhos que guardam o sorteio antigo passam a guardar a cópia
+        # reparada. Os demais têm id e são lidos de novo da fonte.
+        for cabecalho in self.carregados:
+            sorteio = cabecalho.get("sorteio")
+            if sorteio is None or sorteio["data"] != mutacao["data"]:
+                continue
+            turnos = list(sorteio["turnos"])
+            if all(slot < len(turnos) and turnos[slot] == antes for slot, antes, _ in mutacao["alteracoes"]):
+                for slot, _, depois in mutacao["alteracoes"]:
+                    turnos[slot] = depois
+                cabecalho["sorteio"] = dict(sorteio, turnos=turnos)
@@ -0,0 +1,202 @@
+import csv
+import json
+import os
+
+from indices import normalizar
+from motor_sorteio import mascara_restricoes
+
+TAMANHO_BLOCO = 64 * 1024
+SEPARADORES = (";", "|")
+
+# Importação em massa de membros a partir de CSV (colunas nome, grupos,
+# restricoes) ou JSON (lista ou um objeto por linha com as mesmas chaves).
+# Grupos e restrições aceitam vários valores separados por ";" ou "|".
+
+class RelatorioImportacao:
+    def __init__(self):
+        self.membros = 0
+        self.grupos_criados = []
+        self.duplicados = []
+        self.erros = []
+
+    def resumo(self):
+        linhas = [f"{self.membros} membros importados."]
+        if self.grupos_criados:
+            linhas.append(f"Grupos criados: {', '.join(self.grupos_criados)}")
+        if self.duplicados:
+            linhas.append(f"{len(self.duplicados)} nomes já cadastrados foram ignorados.")
+        if self.erros:
+            linhas.append(f"{len(self.erros)} linhas com erro:")
+            linhas.extend(f"  linha {linha}: {mensagem}" for linha, mensagem in self.erros[:10])
+            if len(self.erros) > 10:
+                linhas.append(f"  ... e mais {len(self.erros) - 10}")
+        return "\n".join(linhas)
+
+# ==================================================
+# LEITURA EM FLUXO
+# ==================================================
+def ler_csv(caminho):
+    with open(caminho, "r", encoding="utf-8-sig", newline="") as f:
+        leitor = csv.DictReader(f)
+        for registro in leitor:
+            yield leitor.line_num, {(chave or "").strip().lower(): valor for chave, valor in registro.items()}
+
+def ler_json(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        inicio = f.read(1)
+        while inicio.isspace():
+            inicio = f.read(1)
+        if inicio == "[":
+            yield from _itens_lista_json(f)
+            return
+        # Um objeto JSON por linha
+        f.seek(0)
+        for numero, linha in enumerate(f, 1):
+            if linha.strip():
+                try:
+                    yield numero, json.loads(linha)
+                except json.JSONDecodeError as erro:
+                    yield numero, erro
+
+def _itens_lista_json(f):
+    # Lê os itens de uma lista JSON aos poucos, sem carregar o arquivo inteiro.
+    # Um item malformado vira um erro só dele e a leitura recomeça no item
+    # seguinte.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    numero = 0
+    fim_arquivo = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        retomar = None
+        try:
+            item, fim = decoder.raw_decode(buffer, pos)
+            completo = fim < len(buffer) or fim_arquivo
+        except json.JSONDecodeError as erro:
+            item = erro
+            completo = fim_arquivo or erro.pos < len(buffer) and not erro.msg.startswith("Unterminated string")
+            if completo:
+                retomar = _recomeco_json(buffer, pos, erro.pos)
+                completo = retomar is not None or fim_arquivo
+        if not completo:
+            bloco = f.read(TAMANHO_BLOCO)
+            fim_arquivo = not bloco
+            buffer = buffer[pos:] + bloco
+            pos = 0
+            continue
+        numero += 1
+        yield numero, item
+        if isinstance(item, Exception):
+            if retomar is None:
+                return
+            fim = retomar
+        pos = fim
+
+def _recomeco_json(buffer, inicio, pos_erro):
+    # Onde retomar depois do item malformado que começa em `inicio`: logo
+    # após a próxima "," fora de chaves e colchetes, ou no "]" que fecha a
+    # lista. None se o buffer ainda não chega lá. Um fechamento sem par
+    # fecha até a abertura correspondente, e uma quebra de linha encerra uma
+    # string aberta, como num texto com erro de digitação.
+    pilha = []
+    em_string = escape = False
+    for i in range(inicio, len(buffer)):
+        c = buffer[i]
+        if em_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c in "\"\n":
+                em_string = False
+        elif c == '"':
+            em_string = True
+        elif c in "{[":
+            pilha.append(c)
+        elif c in "}]":
+            abertura = "{" if c == "}" else "["
+            if abertura in pilha:
+                del pilha[len(pilha) - 1 - pilha[::-1].index(abertura):]
+            elif c == "]" and i >= pos_erro:
+                return i
+        elif c == "," and not pilha and i >= pos_erro:
+            return i + 1
+    return None
+
+def ler_registros(caminho):
+    if os.path.splitext(caminho)[1].lower() in (".json", ".jsonl"):
+        return ler_json(caminho)
+    return ler_csv(caminho)
+
+# ==================================================
+# VALIDAÇÃO
+# ==================================================
+def _lista(valor):
+    if valor is None:
+        return []
+    if isinstance(valor, list):
+        return [str(v).strip() for v in valor if str(v).strip()]
+    texto = str(valor)
+    for separador in SEPARADORES[1:]:
+        texto = texto.replace(separador, SEPARADORES[0])
+    return [v.strip() for v in texto.split(SEPARADORES[0]) if v.strip()]
+
+def hora_restricao(valor):
+    # "7", "07", "7:00" e "07:00" viram "07:00"
+    hora = valor.split(":")[0]
+    if not hora.isdigit() or not 0 <= int(hora) <= 23 or valor.split(":")[1:] not in ([], ["00"]):
+        raise ValueError(f"hora inválida '{valor}'")
+    return f"{int(hora):02d}:00"
+
+# ==================================================
+# IMPORTAÇÃO
+# ==================================================
+def importar_membros(caminho, dados):
+    # Devolve uma única mutação "lote" com tudo o que foi importado, para ser
+    # registrada de uma vez, e o relatório linha a linha. Os ids novos seguem
+    # dados["proximo_id"].
+    relatorio = RelatorioImportacao()
+    existentes = {normalizar(nome) for nome in dados["membros"].values()}
+    proximo_id = dados["proximo_id"]
+    grupos = {normalizar(grupo): grupo for grupo in dados["grupos"]}
+    mutacoes = []
+
+    for linha, registro in ler_registros(caminho):
+        if isinstance(registro, Exception):
+            relatorio.erros.append((linha, f"JSON inválido ({registro.msg})"))
+            continue
+        if not isinstance(registro, dict):
+            relatorio.erros.append((linha, "registro deve ser um objeto"))
+            continue
+        nome = str(registro.get("nome") or "").strip()
+        if not nome:
+            relatorio.erros.append((linha, "nome vazio"))
+            continue
+        chave = normalizar(nome)
+        if chave in existentes:
+            relatorio.duplicados.append(nome)
+            continue
+        try:
+            restricoes = mascara_restricoes([hora_restricao(h) for h in _lista(registro.get("restricoes"))])
+        except ValueError as erro:
+            relatorio.erros.append((linha, str(erro)))
+            continue
+
+        existentes.add(chave)
+        membro = proximo_id
+        proximo_id += 1
+        mutacoes.append({"tipo": "membro_adicionado", "membro": membro, "nome": nome, "restricoes": restricoes})
+        relatorio.membros += 1
+        for grupo in _lista(registro.get("grupos")):
+            chave_grupo = normalizar(grupo)
+            if chave_grupo not in grupos:
+                grupos[chave_grupo] = grupo
+                mutacoes.append({"tipo": "grupo_criado", "grupo": grupo})
+                relatorio.grupos_criados.append(grupo)
+            mutacoes.append({"tipo": "membro_grupo_adicionado", "grupo": grupos[chave_grupo], "membro": membro})
+
+    return {"tipo": "lote", "mutacoes": mutacoes}, relatorio
@@ -0,0 +1,139 @@
+import unicodedata
+from itertools import count
+
+TAMANHO_NGRAMA = 3
+
+def normalizar(texto):
+    # "João" -> "joao": sem acentos e sem diferença de maiúsculas
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+def ngramas(texto, tamanho):
+    return {texto[i:i + tamanho] for i in range(len(texto) - tamanho + 1)}
+
+# ==================================================
+# BUSCA DE MEMBROS
+# ==================================================
+class IndiceBusca:
+    # Índice de n-gramas (1 a 3 letras) dos nomes normalizados, apontando
+    # para os ids dos membros. Cada consulta intersecta os conjuntos dos
+    # n-gramas da busca; se a nova busca só acrescenta letras à anterior,
+    # filtra o resultado anterior.
+    def __init__(self, membros=None):
+        self.sequencia = count()
+        self.ordem = {}
+        self.normalizados = {}
+        self.ngramas = {}
+        self.ultima_consulta = None
+        self.ultimo_resultado = []
+        for membro, nome in (membros or {}).items():
+            self.adicionar(membro, nome)
+
+    def adicionar(self, membro, nome):
+        if membro in self.ordem:
+            return
+        self.ordem[membro] = next(self.sequencia)
+        self._indexar(membro, nome)
+
+    def _indexar(self, membro, nome):
+        norm = normalizar(nome)
+        self.normalizados[membro] = norm
+        for tamanho in range(1, TAMANHO_NGRAMA + 1):
+            for grama in ngramas(norm, tamanho):
+                self.ngramas.setdefault(grama, set()).add(membro)
+        self.ultima_consulta = None
+
+    def _desindexar(self, membro):
+        norm = self.normalizados.pop(membro)
+        for tamanho in range(1, TAMANHO_NGRAMA + 1):
+            for grama in ngramas(norm, tamanho):
+                membros = self.ngramas[grama]
+                membros.discard(membro)
+                if not membros:
+                    del self.ngramas[grama]
+        self.ultima_consulta = None
+
+    def remover(self, membro):
+        if membro not in self.ordem:
+            return
+        del self.ordem[membro]
+        self._desindexar(membro)
+
+    def renomear(self, membro, nome):
+        # Troca só os n-gramas; a posição na ordem de cadastro continua
+        if membro not in self.ordem:
+            return
+        self._desindexar(membro)
+        self._indexar(membro, nome)
+
+    def todos(self):
+        return sorted(self.ordem, key=self.ordem.__getitem__)
+
+    def buscar(self, consulta):
+        # Resultado na ordem de cadastro dos membros
+        q = normalizar(consulta.strip())
+        if not q:
+            resultado = self.todos()
+        elif self.ultima_consulta and self.ultima_consulta in q:
+            resultado = [m for m in self.ultimo_resultado if q in self.normalizados[m]]
+        else:
+            tamanho = min(len(q), TAMANHO_NGRAMA)
+            conjuntos = sorted((self.ngramas.get(g, set()) for g in ngramas(q, tamanho)), key=len)
+            candidatos = set(conjuntos[0]).intersection(*conjuntos[1:])
+            if len(q) > TAMANHO_NGRAMA:
+                candidatos = {m for m in candidatos if q in self.normalizados[m]}
+            resultado = sorted(candidatos, key=self.ordem.__getitem__)
+        self.ultima_consulta = q
+        self.ultimo_resultado = resultado
+        return resultado
+
+# ==================================================
+# GRUPOS DE CADA MEMBRO
+# ==================================================
+class IndiceGrupos:
+    # Índice invertido membro -> grupos, com conjuntos nos dois sentidos.
+    # A ordem dos grupos é a de dados["grupos"].
+    def __init__(self, grupos=None):
+        self.membros_por_grupo = {}
+        self.grupos_por_membro = {}
+        for grupo, membros_grupo in (grupos or {}).items():
+            self.criar_grupo(grupo)
+            for membro in membros_grupo:
+                self.adicionar(grupo, membro)
+
+    def criar_grupo(self, grupo):
+        self.membros_por_grupo.setdefault(grupo, set())
+
+    def adicionar(self, grupo, membro):
+        self.criar_grupo(grupo)
+        self.membros_por_grupo[grupo].add(membro)
+        self.grupos_por_membro.setdefault(membro, set()).add(grupo)
+
+    def remover(self, grupo, membro):
+        self.membros_por_grupo.get(grupo, set()).discard(membro)
+        grupos = self.grupos_por_membro.get(membro)
+        if grupos is not None:
+            grupos.discard(grupo)
+            if not grupos:
+                del self.grupos_por_membro[membro]
+
+    def remover_membro(self, membro):
+        grupos = self.grupos_por_membro.pop(membro, set())
+        for grupo in grupos:
+            self.membros_por_grupo[grupo].discard(membro)
+        return grupos
+
+    def grupos_de(self, membro):
+        return self.grupos_por_membro.get(membro, set())
+
+    def contem(self, grupo, membro):
+        return grupo in self.grupos_por_membro.get(membro, ())
+
+    def rotear(self, turnos):
+        # turnos: pares (rótulo, id). Uma passada: cada turno vai direto para
+        # os grupos do membro
+        por_grupo = {grupo: [] for grupo in self.membros_por_grupo}
+        for h, membro in turnos:
+            for grupo in self.grupos_por_membro.get(membro, ()):
+                por_grupo[grupo].append((h, membro))
+        return por_grupo
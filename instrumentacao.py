@@ -0,0 +1,177 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import wraps
+
+VARIAVEL = "SORTEIO_DIAGNOSTICO"   # "1" mede; "perfil" também liga o cProfile
+VARIAVEL_ARQUIVO = "SORTEIO_DIAGNOSTICO_ARQUIVO"
+RECENTES = 200
+BALDES = 28                  # baldes de 2^k microssegundos, até ~2 min
+INTERVALO_PULSO_MS = 50
+LIMITE_TRAVAMENTO_MS = 200
+
+# Medição opcional dos caminhos quentes. Desligada, cada função marcada com
+# @medido custa só um teste de booleano. Ligada (pela variável de ambiente ou
+# pelo atalho escondido da interface), guarda por operação contagem, total,
+# mínimo, máximo e um histograma em potências de 2, mais as últimas
+# operações com os tamanhos dos dados envolvidos. Na saída grava tudo num
+# JSON e, no modo "perfil", também o resultado do cProfile.
+
+# ==================================================
+# ESTATÍSTICAS
+# ==================================================
+class Estatistica:
+    def __init__(self):
+        self.contagem = 0
+        self.total = 0.0
+        self.minimo = None
+        self.maximo = 0.0
+        self.baldes = [0] * BALDES
+
+    def adicionar(self, ms):
+        self.contagem += 1
+        self.total += ms
+        self.minimo = ms if self.minimo is None else min(self.minimo, ms)
+        self.maximo = max(self.maximo, ms)
+        self.baldes[min(BALDES - 1, int(ms * 1000).bit_length())] += 1
+
+    def percentil(self, fracao):
+        # Interpola dentro do balde onde cai o percentil: aproximado, mas barato
+        alvo = fracao * self.contagem
+        acumulado = 0
+        for k, quantidade in enumerate(self.baldes):
+            if quantidade and acumulado + quantidade >= alvo:
+                baixo, alto = (1 << k >> 1) / 1000, (1 << k) / 1000
+                valor = baixo + (alto - baixo) * (alvo - acumulado) / quantidade
+                return min(self.maximo, max(self.minimo, valor))
+            acumulado += quantidade
+        return self.maximo
+
+    def resumo(self):
+        return {"contagem": self.contagem, "total_ms": round(self.total, 3),
+                "media_ms": round(self.total / self.contagem, 3) if self.contagem else 0.0,
+                "min_ms": round(self.minimo or 0.0, 3), "p50_ms": round(self.percentil(0.5), 3),
+                "p95_ms": round(self.percentil(0.95), 3), "max_ms": round(self.maximo, 3),
+                "baldes_us": {1 << k: n for k, n in enumerate(self.baldes) if n}}
+
+# ==================================================
+# ESTADO
+# ==================================================
+ativo = False
+perfil = None
+inicio = None
+estatisticas = {}
+recentes = deque(maxlen=RECENTES)
+trava = threading.Lock()
+ultima_operacao = None
+
+def ativar(modo_perfil=False):
+    global ativo, perfil, inicio
+    if ativo:
+        return
+    inicio = time.time()
+    if modo_perfil:
+        import cProfile
+        perfil = cProfile.Profile()
+        perfil.enable()
+    ativo = True
+    atexit.register(despejar)
+
+def ativar_pelo_ambiente():
+    valor = os.environ.get(VARIAVEL, "").strip().lower()
+    if valor and valor != "0":
+        ativar(modo_perfil=valor == "perfil")
+    return ativo
+
+def registrar(operacao, ms, tamanhos=None):
+    global ultima_operacao
+    with trava:
+        estatisticas.setdefault(operacao, Estatistica()).adicionar(ms)
+        recentes.append({"operacao": operacao, "momento": round(time.time(), 3), "ms": round(ms, 3),
+                         "thread": threading.current_thread().name, "tamanhos": tamanhos or {}})
+        ultima_operacao = operacao
+
+# ==================================================
+# MEDIÇÃO
+# ==================================================
+def medido(operacao, tamanhos=None):
+    # Decorador. tamanhos(*args, **kwargs) devolve um dict com o tamanho dos
+    # dados da chamada; só é chamado com a medição ligada
+    def decorar(funcao):
+        @wraps(funcao)
+        def medir_chamada(*args, **kwargs):
+            if not ativo:
+                return funcao(*args, **kwargs)
+            comeco = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                ms = (time.perf_counter() - comeco) * 1000
+                registrar(operacao, ms, tamanhos(*args, **kwargs) if tamanhos else None)
+        return medir_chamada
+    return decorar
+
+class Trecho:
+    def __init__(self, operacao, tamanhos):
+        self.operacao = operacao
+        self.tamanhos = tamanhos
+
+    def __enter__(self):
+        self.comeco = time.perf_counter() if ativo else None
+        return self
+
+    def __exit__(self, *erro):
+        if self.comeco is not None:
+            registrar(self.operacao, (time.perf_counter() - self.comeco) * 1000, self.tamanhos)
+
+def medir(operacao, **tamanhos):
+    # Para trechos que não são uma função inteira: with medir("op", n=10): ...
+    return Trecho(operacao, tamanhos)
+
+def vigiar_laco(root, intervalo_ms=INTERVALO_PULSO_MS, limite_ms=LIMITE_TRAVAMENTO_MS):
+    # Um pulso a cada intervalo_ms no laço do Tk: quando chega atrasado mais
+    # que limite_ms, a interface ficou travada esse tempo todo
+    esperado = time.perf_counter() + intervalo_ms / 1000
+
+    def pulso():
+        nonlocal esperado
+        agora = time.perf_counter()
+        atraso = (agora - esperado) * 1000
+        if atraso >= limite_ms:
+            registrar("tk.travamento", atraso, {"apos": ultima_operacao})
+        esperado = agora + intervalo_ms / 1000
+        root.after(intervalo_ms, pulso)
+
+    root.after(intervalo_ms, pulso)
+
+# ==================================================
+# RELATÓRIO
+# ==================================================
+def resumo():
+    with trava:
+        return {operacao: est.resumo() for operacao, est in sorted(estatisticas.items())}
+
+def ultimas(n=RECENTES):
+    with trava:
+        return list(recentes)[-n:]
+
+def despejar(caminho=None):
+    # JSON com o resumo e as últimas operações; no modo perfil, o cProfile
+    # vai ao lado com extensão .prof (leia com python -m pstats)
+    if not ativo:
+        return None
+    caminho = caminho or os.environ.get(VARIAVEL_ARQUIVO) or \
+        f"diagnostico_{datetime.fromtimestamp(inicio).strftime('%Y%m%d_%H%M%S')}.json"
+    relatorio = {"inicio": datetime.fromtimestamp(inicio).isoformat(timespec="seconds"),
+                 "duracao_s": round(time.time() - inicio, 3), "operacoes": resumo(), "recentes": ultimas()}
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    if perfil is not None:
+        perfil.disable()
+        perfil.dump_stats(os.path.splitext(caminho)[0] + ".prof")
+        perfil.enable()
+    return caminho
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from datetime import timedelta
+
+import motor_sorteio
+from calendario import CALENDARIO_PADRAO, obter_calendario
+from instrumentacao import medido
+
+ALTERNATIVAS_PADRAO = 4
+
+# Vários sorteios em dias consecutivos. A regra da madrugada encadeia cada
+# dia ao anterior, então os dias saem em sequência; dentro de cada dia as
+# alternativas (sementes diferentes) são sorteadas em paralelo e fica a que
+# preenche mais horários. Mesma semente, mesmo lote.
+
+def rng_alternativa(semente, dia, alternativa):
+    # random.Random com texto é determinístico entre execuções e processos
+    return random.Random(f"{semente}:{dia}:{alternativa}")
+
+def horarios_preenchidos(turnos):
+    return sum(1 for membro in turnos if membro is not None)
+
+# ==================================================
+# PROCESSOS DE TRABALHO
+# ==================================================
+_membros = None
+_restricoes = None
+_modo = None
+_calendario = None
+
+def _iniciar_trabalhador(membros, restricoes_horarios, modo, config_calendario):
+    # O cadastro vai uma vez para cada processo, não a cada tarefa. Do
+    # calendário vai só a configuração: cada processo monta suas tabelas.
+    global _membros, _restricoes, _modo, _calendario
+    _membros, _restricoes, _modo = membros, restricoes_horarios, modo
+    _calendario = obter_calendario(*config_calendario)
+
+def _sortear_alternativa(ultimos, contadores, semente, dia, alternativa):
+    rng = rng_alternativa(semente, dia, alternativa)
+    return motor_sorteio.sortear_turnos(_membros, _restricoes, ultimos, rng, _calendario, modo=_modo,
+                                        contadores=contadores)
+
+# ==================================================
+# LOTE
+# ==================================================
+@medido("lote.gerar", lambda membros, restricoes_horarios, sorteios, dias, *args, **kwargs:
+        {"membros": len(membros), "dias": dias})
+def gerar_lote(membros, restricoes_horarios, sorteios, dias, data_inicial, semente,
+               modo=motor_sorteio.MODO_GULOSO, contadores=None, alternativas=ALTERNATIVAS_PADRAO, processos=None,
+               calendario=None):
+    processos = processos or os.cpu_count() or 1
+    calendario = calendario or CALENDARIO_PADRAO
+    config_calendario = calendario.config
+    membros = list(membros)
+    ultimos = list(sorteios[-1:])
+    contadores = deepcopy(contadores)
+    lote = []
+
+    executor = None
+    if processos > 1 and alternativas > 1:
+        # spawn: quem chama tem outras threads rodando (Tk, gravação), e um
+        # fork poderia herdar uma trava presa
+        executor = ProcessPoolExecutor(max_workers=min(processos, alternativas), initializer=_iniciar_trabalhador,
+                                       initargs=(membros, restricoes_horarios, modo, config_calendario),
+                                       mp_context=multiprocessing.get_context("spawn"))
+    else:
+        _iniciar_trabalhador(membros, restricoes_horarios, modo, config_calendario)
+    try:
+        for dia in range(dias):
+            if executor is not None:
+                futuros = [executor.submit(_sortear_alternativa, ultimos, contadores, semente, dia, alt)
+                           for alt in range(alternativas)]
+                opcoes = [futuro.result() for futuro in futuros]
+            else:
+                opcoes = [_sortear_alternativa(ultimos, contadores, semente, dia, alt) for alt in range(alternativas)]
+            # Empate fica com a primeira alternativa: o resultado não depende
+            # da ordem em que os processos terminam
+            turnos = max(opcoes, key=horarios_preenchidos)
+            # Uma vigília de vários dias só começa quando a anterior termina
+            data = (data_inicial + timedelta(days=dia * calendario.dias)).strftime("%d/%m/%Y %H:%M")
+            sorteio = motor_sorteio.montar_sorteio(data, turnos, calendario)
+            lote.append(sorteio)
+            ultimos = [sorteio]
+            if contadores is not None:
+                contadores.registrar(sorteio)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return lote
@@ -0,0 +1,324 @@
+import random
+from array import array
+from collections import Counter, deque
+from datetime import datetime
+
+from calendario import (CALENDARIO_PADRAO, HORAS_RESTRICAO, horario_do_rotulo, obter_calendario,
+                        obter_turnos_avulsos)
+from instrumentacao import medido
+
+# Motor do sorteio, sem tkinter. Um sorteio guarda o id (ou None) de cada
+# turno, na ordem dos rótulos do seu calendário.
+
+SEM_MEMBRO = "—"
+
+# Restrições de um membro: bit h ligado = não pode na hora h
+TODAS_HORAS = (1 << 24) - 1
+
+MODO_GULOSO = "guloso"
+MODO_OTIMO = "otimo"
+
+# ==================================================
+# HORÁRIOS
+# ==================================================
+# As tabelas vêm prontas de calendario.py; aqui só são copiadas
+def get_horarios_restricao():
+    return list(HORAS_RESTRICAO)
+
+def get_horarios_sorteio():
+    return list(CALENDARIO_PADRAO.rotulos)
+
+def hora_cheia(h):
+    return horario_do_rotulo(h)[:2] + ":00"
+
+def hora_do_horario(h):
+    return int(horario_do_rotulo(h)[:2])
+
+def mascara_restricoes(restricoes):
+    # Aceita a máscara ou a lista antiga de "HH:00"
+    if isinstance(restricoes, int):
+        return restricoes & TODAS_HORAS
+    mascara = 0
+    for h in restricoes:
+        mascara |= 1 << hora_do_horario(h)
+    return mascara
+
+def horas_da_mascara(mascara):
+    return [f"{hora:02d}:00" for hora in range(24) if mascara >> hora & 1]
+
+def mascaras_membros(membros, restricoes_horarios):
+    # Uma máscara por posição em `membros`, num array de inteiros de 32 bits
+    return array("L", (mascara_restricoes(restricoes_horarios.get(m, 0)) for m in membros))
+
+# ==================================================
+# SORTEIOS GRAVADOS
+# ==================================================
+# {"data": ..., "turnos": [id ou None, ...]} mais, fora do calendário padrão,
+# "calendario" com a configuração dele. Sorteios migrados cujos horários não
+# batem com nenhum calendário trazem os rótulos em "horarios".
+def calendario_do_sorteio(sorteio):
+    if "horarios" in sorteio:
+        return obter_turnos_avulsos(tuple(sorteio["horarios"]))
+    if "calendario" in sorteio:
+        return obter_calendario(*sorteio["calendario"])
+    return CALENDARIO_PADRAO
+
+def turnos_rotulados(sorteio):
+    # Pares (rótulo, id ou None) na ordem do calendário
+    return zip(calendario_do_sorteio(sorteio).rotulos, sorteio["turnos"])
+
+def montar_sorteio(data, turnos, calendario=None):
+    sorteio = {"data": data, "turnos": turnos}
+    if calendario is not None and calendario.config != CALENDARIO_PADRAO.config:
+        sorteio["calendario"] = list(calendario.config)
+    return sorteio
+
+def membros_restritos(sorteios):
+    # Quem serviu na madrugada do último sorteio não volta à madrugada no próximo
+    restritos = set()
+    if sorteios:
+        ultimo = sorteios[-1]
+        for noturno, membro in zip(calendario_do_sorteio(ultimo).noturnos, ultimo["turnos"]):
+            if noturno and membro is not None:
+                restritos.add(membro)
+    return restritos
+
+# ==================================================
+# ÍNDICE DE CANDIDATOS
+# ==================================================
+class IndiceCandidatos:
+    # Membros elegíveis por (hora, madrugada?). O sorteado sai de todas as
+    # listas (troca com o último), só depois do seu último turno.
+    @medido("motor.filtrar_candidatos", lambda self, membros, *args, **kwargs: {"membros": len(membros)})
+    def __init__(self, membros, restricoes_horarios, restritos=(), calendario=None, contadores=None):
+        calendario = calendario or CALENDARIO_PADRAO
+        self.chaves_slot = calendario.chaves
+        chaves = list(dict.fromkeys(self.chaves_slot))
+        restritos = set(restritos)
+
+        self.listas = {chave: [] for chave in chaves}
+        self.posicoes = {chave: {} for chave in chaves}
+        self.chaves_por_membro = {}
+        self.pesos = {chave: [] for chave in chaves} if contadores is not None else None
+
+        unicos = list(dict.fromkeys(membros))
+        for m, mascara in zip(unicos, mascaras_membros(unicos, restricoes_horarios)):
+            livres = ~mascara
+            chaves_membro = []
+            for chave in chaves:
+                hora, noturno = chave
+                if not livres >> hora & 1 or (noturno and m in restritos):
+                    continue
+                lista = self.listas[chave]
+                self.posicoes[chave][m] = len(lista)
+                lista.append(m)
+                if self.pesos is not None:
+                    self.pesos[chave].append(contadores.peso(m, hora))
+                chaves_membro.append(chave)
+            self.chaves_por_membro[m] = chaves_membro
+        self.restantes = None
+        if calendario.turnos_por_membro > 1:
+            self.restantes = dict.fromkeys(unicos, calendario.turnos_por_membro)
+
+    def candidatos(self, chave):
+        return self.listas[chave]
+
+    def remover(self, membro):
+        for chave in self.chaves_por_membro.pop(membro, ()):
+            lista = self.listas[chave]
+            posicoes = self.posicoes[chave]
+            idx = posicoes.pop(membro)
+            ultimo = lista.pop()
+            if ultimo != membro:
+                lista[idx] = ultimo
+                posicoes[ultimo] = idx
+            if self.pesos is not None:
+                pesos = self.pesos[chave]
+                peso_ultimo = pesos.pop()
+                if ultimo != membro:
+                    pesos[idx] = peso_ultimo
+
+    def escolher(self, chave, rng=random):
+        lista = self.listas[chave]
+        if not lista:
+            return None
+        if self.pesos is not None:
+            escolhido = rng.choices(lista, weights=self.pesos[chave])[0]
+        else:
+            escolhido = rng.choice(lista)
+        if self.restantes is not None:
+            self.restantes[escolhido] -= 1
+            if self.restantes[escolhido]:
+                return escolhido
+        self.remover(escolhido)
+        return escolhido
+
+# ==================================================
+# EMPARELHAMENTO MÁXIMO (HOPCROFT-KARP)
+# ==================================================
+def emparelhamento_maximo(adjacencias, rng=random, embaralhar=True):
+    # adjacencias[s] = membros elegíveis para o horário s. As listas são
+    # embaralhadas antes; com embaralhar=False a ordem recebida é a preferência.
+    if embaralhar:
+        adjacencias = [rng.sample(lista, len(lista)) for lista in adjacencias]
+    par_slot = [None] * len(adjacencias)
+    par_membro = {}
+
+    ordem = list(range(len(adjacencias)))
+    rng.shuffle(ordem)
+    for s in ordem:
+        for m in adjacencias[s]:
+            if m not in par_membro:
+                par_slot[s] = m
+                par_membro[m] = s
+                break
+
+    while True:
+        livres = [s for s in ordem if par_slot[s] is None and adjacencias[s]]
+        dist = {s: 0 for s in livres}
+        fila = list(livres)
+        encontrou = False
+        for s in fila:
+            for m in adjacencias[s]:
+                t = par_membro.get(m)
+                if t is None:
+                    encontrou = True
+                elif t not in dist:
+                    dist[t] = dist[s] + 1
+                    fila.append(t)
+        if not encontrou:
+            return par_slot
+
+        iteradores = {}
+        for raiz in livres:
+            pilha = [raiz]
+            escolhidos = []
+            iteradores.setdefault(raiz, iter(adjacencias[raiz]))
+            while pilha:
+                s = pilha[-1]
+                avancou = False
+                for m in iteradores[s]:
+                    t = par_membro.get(m)
+                    if t is None:
+                        escolhidos.append(m)
+                        for slot, membro in zip(pilha, escolhidos):
+                            par_slot[slot] = membro
+                            par_membro[membro] = slot
+                        pilha = []
+                        avancou = True
+                        break
+                    if dist.get(t) == dist[s] + 1:
+                        escolhidos.append(m)
+                        pilha.append(t)
+                        iteradores.setdefault(t, iter(adjacencias[t]))
+                        avancou = True
+                        break
+                if not avancou:
+                    # Sem caminho por aqui nesta fase
+                    dist[s] = None
+                    pilha.pop()
+                    if escolhidos:
+                        escolhidos.pop()
+
+# ==================================================
+# SORTEIO
+# ==================================================
+def ordem_ponderada(lista, pesos, rng):
+    # Permutação aleatória ponderada (Efraimidis-Spirakis): quem tem mais peso
+    # tende a vir antes
+    chaves = [rng.random() ** (1.0 / peso) for peso in pesos]
+    return [m for _, m in sorted(zip(chaves, lista), key=lambda par: par[0], reverse=True)]
+
+def copias_membros(lista, turnos):
+    # Com vários turnos por membro o emparelhamento vê uma cópia por turno
+    if turnos == 1:
+        return lista
+    return [(m, turno) for m in lista for turno in range(turnos)]
+
+def tamanhos_sorteio(membros, restricoes_horarios, sorteios=(), rng=None, calendario=None, modo=MODO_GULOSO,
+                     contadores=None):
+    return {"membros": len(membros), "turnos": len(calendario or CALENDARIO_PADRAO), "modo": modo,
+            "equidade": contadores is not None}
+
+@medido("motor.sortear_turnos", tamanhos_sorteio)
+def sortear_turnos(membros, restricoes_horarios, sorteios=(), rng=None, calendario=None, modo=MODO_GULOSO,
+                   contadores=None):
+    # contadores (equidade.ContadoresServico) ativa o modo de equidade
+    rng = rng or random
+    calendario = calendario or CALENDARIO_PADRAO
+    indice = IndiceCandidatos(membros, restricoes_horarios, membros_restritos(sorteios), calendario, contadores)
+
+    if modo == MODO_OTIMO:
+        turnos = calendario.turnos_por_membro
+        if contadores is not None:
+            adjacencias = [copias_membros(ordem_ponderada(indice.candidatos(chave), indice.pesos[chave], rng), turnos)
+                           for chave in indice.chaves_slot]
+            escolhidos = emparelhamento_maximo(adjacencias, rng, embaralhar=False)
+        else:
+            escolhidos = emparelhamento_maximo([copias_membros(indice.candidatos(chave), turnos)
+                                                for chave in indice.chaves_slot], rng)
+        if turnos > 1:
+            escolhidos = [m[0] if m is not None else None for m in escolhidos]
+        return escolhidos
+
+    return [indice.escolher(chave, rng) for chave in indice.chaves_slot]
+
+def gerar_sorteio(membros, restricoes_horarios, sorteios=(), rng=None, agora=None, modo=MODO_GULOSO,
+                  contadores=None, calendario=None):
+    agora = agora or datetime.now()
+    turnos = sortear_turnos(membros, restricoes_horarios, sorteios, rng, calendario, modo=modo, contadores=contadores)
+    return montar_sorteio(agora.strftime("%d/%m/%Y %H:%M"), turnos, calendario)
+
+# ==================================================
+# REPARO
+# ==================================================
+def reparar_turnos(sorteios, posicao, membro, membros, restricoes_horarios, rng=None, contadores=None):
+    # Tira `membro` de sorteios[posicao] e preenche os turnos dele pelo
+    # caminho de aumento mais curto, mudando o mínimo de pessoas de horário.
+    # A regra da madrugada vale também com o sorteio seguinte.
+    # Devolve [(slot, antes, depois)]; turno sem caminho fica vago.
+    rng = rng or random
+    sorteio = sorteios[posicao]
+    calendario = calendario_do_sorteio(sorteio)
+    turnos = list(sorteio["turnos"])
+    abertos = [s for s, m in enumerate(turnos) if m == membro]
+    for s in abertos:
+        turnos[s] = None
+    restritos = membros_restritos(sorteios[posicao - 1:posicao] if posicao else ())
+    restritos |= membros_restritos(sorteios[posicao + 1:posicao + 2])
+
+    candidatos = [m for m in dict.fromkeys(membros) if m != membro]
+    mascaras = dict(zip(candidatos, mascaras_membros(candidatos, restricoes_horarios)))
+    uso = Counter(m for m in turnos if m is not None)
+    ordem = list(range(len(turnos)))
+    rng.shuffle(ordem)
+
+    def pode(m, s):
+        hora, noturno = calendario.chaves[s]
+        return not mascaras[m] >> hora & 1 and not (noturno and m in restritos)
+
+    for aberto in abertos:
+        livres = [m for m in candidatos if uso[m] < calendario.turnos_por_membro]
+        anterior = {aberto: None}     # turno -> (turno que ele preenche, membro que anda)
+        fila = deque([aberto])
+        while fila:
+            s = fila.popleft()
+            diretos = [m for m in livres if pode(m, s)]
+            if diretos:
+                if contadores is not None:
+                    hora = calendario.horas[s]
+                    novo = rng.choices(diretos, weights=[contadores.peso(m, hora) for m in diretos])[0]
+                else:
+                    novo = rng.choice(diretos)
+                uso[novo] += 1
+                turnos[s] = novo
+                while anterior[s] is not None:
+                    s, andou = anterior[s]
+                    turnos[s] = andou
+                break
+            for t in ordem:
+                m = turnos[t]
+                if m is not None and t not in anterior and m in mascaras and pode(m, s):
+                    anterior[t] = (s, m)
+                    fila.append(t)
+    return [(s, antes, depois) for s, (antes, depois) in enumerate(zip(sorteio["turnos"], turnos)) if antes != depois]
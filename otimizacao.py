@@ -0,0 +1,202 @@
+import math
+import random
+import time
+from collections import Counter
+
+from calendario import CALENDARIO_PADRAO
+from instrumentacao import medido
+from motor_sorteio import TODAS_HORAS, mascaras_membros, membros_restritos
+
+ORCAMENTO_PADRAO = 0.5        # segundos de busca por sorteio
+MINUTOS_BLOCO = 180           # o espalhamento compara blocos de 3 h da vigília
+TERMOS = ("espalhamento", "vizinhos", "preferencias")
+PESOS_PADRAO = {"espalhamento": 1.0, "vizinhos": 3.0, "preferencias": 2.0}
+TEMPERATURA_INICIAL = 2.0
+TEMPERATURA_FINAL = 0.02
+CHANCE_TROCA = 0.7            # o resto das tentativas troca um membro por outro livre
+VAZIO = frozenset()
+
+# Metas que só melhoram um sorteio já válido. A pontuação soma penalidades
+# (menor é melhor): espalhamento dos grupos pelos blocos, vizinhos do mesmo
+# grupo e turnos fora das horas preferidas.
+
+# ==================================================
+# PONTUAÇÃO
+# ==================================================
+class PontuacaoMetas:
+    # Espalhamento do grupo: Σ (c - T·w)² = Σc² - 2·T·Σc·w + T²·Σw², com c
+    # turnos por bloco, T o total e w a fração de cada bloco. Basta manter
+    # Σc² e Σc·w para a variação de uma troca.
+    def __init__(self, turnos, calendario, grupos, preferencias):
+        n = len(turnos)
+        self.turnos = list(turnos)
+        self.horas = calendario.horas
+        self.preferencias = preferencias
+
+        inicio = calendario.inicios[0] if n else 0
+        extensao = calendario.inicios[-1] - inicio + calendario.duracao if n else 1
+        blocos = max(1, min(n, -(-extensao // MINUTOS_BLOCO)))
+        self.bloco = [(i - inicio) * blocos // extensao for i in calendario.inicios]
+        tamanhos = Counter(self.bloco)
+        self.fracao = [tamanhos[k] / n if n else 0.0 for k in range(blocos)]
+        self.soma_fracoes = sum(w * w for w in self.fracao)
+        # ligado[s]: o turno s + 1 começa quando o s termina
+        self.ligado = [b - a == calendario.duracao for a, b in zip(calendario.inicios, calendario.inicios[1:])]
+        self.ligado.append(False)
+
+        indices = {}
+        for g, membros_grupo in enumerate(grupos.values()):
+            for membro in membros_grupo:
+                indices.setdefault(membro, []).append(g)
+        self.grupos_de = {membro: frozenset(gs) for membro, gs in indices.items()}
+        self.contagem = [[0] * blocos for _ in grupos]
+        self.total = [0] * len(grupos)
+        self.quadrados = [0] * len(grupos)
+        self.ponderada = [0.0] * len(grupos)
+        for s, membro in enumerate(self.turnos):
+            self._somar(s, membro, 1)
+
+    def _somar(self, s, membro, d):
+        # Entra (d = 1) ou sai (d = -1) `membro` do turno s
+        k = self.bloco[s]
+        w = self.fracao[k]
+        for g in self.grupos_de.get(membro, VAZIO):
+            c = self.contagem[g][k]
+            self.quadrados[g] += 2 * c * d + 1
+            self.ponderada[g] += w * d
+            self.contagem[g][k] = c + d
+            self.total[g] += d
+
+    def custo_grupo(self, g):
+        total = self.total[g]
+        return self.quadrados[g] - 2 * total * self.ponderada[g] + total * total * self.soma_fracoes
+
+    def custo_par(self, s):
+        a, b = self.turnos[s], self.turnos[s + 1]
+        if a is None or b is None:
+            return 0
+        return 0 if self.grupos_de.get(a, VAZIO).isdisjoint(self.grupos_de.get(b, VAZIO)) else 1
+
+    def custo_preferencia(self, s):
+        preferidas = self.preferencias.get(self.turnos[s], 0)
+        return 1 if preferidas and not preferidas >> self.horas[s] & 1 else 0
+
+    def _termos(self, grupos, pares, turnos):
+        return (sum(self.custo_grupo(g) for g in grupos), sum(self.custo_par(s) for s in pares),
+                sum(self.custo_preferencia(s) for s in turnos))
+
+    def mudar(self, alteracoes):
+        # Aplica [(turno, novo membro)] e devolve a variação de cada termo
+        grupos, pares = set(), set()
+        for s, novo in alteracoes:
+            grupos |= self.grupos_de.get(self.turnos[s], VAZIO) | self.grupos_de.get(novo, VAZIO)
+            if self.ligado[s]:
+                pares.add(s)
+            if s and self.ligado[s - 1]:
+                pares.add(s - 1)
+        turnos = [s for s, _ in alteracoes]
+        antes = self._termos(grupos, pares, turnos)
+        for s, novo in alteracoes:
+            self._somar(s, self.turnos[s], -1)
+            self.turnos[s] = novo
+            self._somar(s, novo, 1)
+        depois = self._termos(grupos, pares, turnos)
+        return tuple(d - a for a, d in zip(antes, depois))
+
+    def pontuacao(self, pesos=PESOS_PADRAO):
+        termos = dict(zip(TERMOS, self._termos(range(len(self.total)),
+                                               [s for s, ligado in enumerate(self.ligado) if ligado],
+                                               range(len(self.turnos)))))
+        # Só o espalhamento é fracionário: tira o resíduo de arredondamento
+        termos["espalhamento"] = max(0.0, termos["espalhamento"])
+        termos["total"] = sum(pesos[termo] * termos[termo] for termo in TERMOS)
+        return termos
+
+def pontuar_turnos(turnos, calendario, grupos, preferencias=None, pesos=None):
+    # {"espalhamento", "vizinhos", "preferencias", "total"} de um sorteio pronto
+    metas = PontuacaoMetas(turnos, calendario, grupos, preferencias or {})
+    return metas.pontuacao(dict(PESOS_PADRAO, **(pesos or {})))
+
+# ==================================================
+# BUSCA LOCAL
+# ==================================================
+@medido("otimizacao.otimizar_turnos", lambda turnos, membros, *args, **kwargs:
+        {"turnos": len(turnos), "membros": len(membros)})
+def otimizar_turnos(turnos, membros, restricoes_horarios, grupos, preferencias=None, sorteios=(), calendario=None,
+                    pesos=None, orcamento=ORCAMENTO_PADRAO, iteracoes=None, rng=None):
+    # Recozimento simulado a partir de `turnos`, até acabar o orçamento
+    # (segundos, None = sem prazo) ou as iteracoes. Devolve os melhores
+    # turnos vistos e a pontuação antes e depois.
+    rng = rng or random
+    calendario = calendario or CALENDARIO_PADRAO
+    pesos = dict(PESOS_PADRAO, **(pesos or {}))
+    preferencias = preferencias or {}
+    metas = PontuacaoMetas(turnos, calendario, grupos, preferencias)
+    antes = metas.pontuacao(pesos)
+
+    membros = list(dict.fromkeys(membros))
+    mascaras = dict(zip(membros, mascaras_membros(membros, restricoes_horarios)))
+    restritos = membros_restritos(sorteios)
+    uso = Counter(m for m in turnos if m is not None)
+    limite = calendario.turnos_por_membro
+    n = len(turnos)
+
+    def pode(m, s):
+        if m is None:
+            return True
+        hora, noturno = calendario.chaves[s]
+        return not mascaras.get(m, TODAS_HORAS) >> hora & 1 and not (noturno and m in restritos)
+
+    custo = melhor_custo = antes["total"]
+    melhor = None      # None: o estado atual é o melhor visto
+    feitas = aceitas = 0
+    inicio = time.perf_counter()
+    temperatura = TEMPERATURA_INICIAL
+    razao = TEMPERATURA_FINAL / TEMPERATURA_INICIAL
+    # Sem grupos nem preferências não há o que melhorar
+    while n > 1 and membros and (grupos or preferencias) and (iteracoes is None or feitas < iteracoes):
+        if feitas % 64 == 0:
+            progresso = feitas / iteracoes if iteracoes else 0.0
+            if orcamento is not None:
+                progresso = max(progresso, (time.perf_counter() - inicio) / orcamento) if orcamento > 0 else 1.0
+            if progresso >= 1.0:
+                break
+            temperatura = TEMPERATURA_INICIAL * razao ** progresso
+        feitas += 1
+
+        a = rng.randrange(n)
+        membro_a = metas.turnos[a]
+        if rng.random() < CHANCE_TROCA:
+            b = rng.randrange(n)
+            membro_b = metas.turnos[b]
+            if membro_a == membro_b or not pode(membro_a, b) or not pode(membro_b, a):
+                continue
+            alteracoes = ((a, membro_b), (b, membro_a))
+            entra = None
+        else:
+            entra = membros[rng.randrange(len(membros))]
+            if membro_a is None or uso[entra] >= limite or not pode(entra, a):
+                continue
+            alteracoes = ((a, entra),)
+        desfazer = tuple((s, metas.turnos[s]) for s, _ in alteracoes)
+
+        delta = sum(pesos[termo] * d for termo, d in zip(TERMOS, metas.mudar(alteracoes)))
+        if delta > 0 and rng.random() >= math.exp(-delta / temperatura):
+            metas.mudar(desfazer)
+            continue
+        aceitas += 1
+        if entra is not None:
+            uso[membro_a] -= 1
+            uso[entra] += 1
+        if delta > 0 and melhor is None:
+            # Saindo do melhor estado: guarda como ele era
+            melhor = list(metas.turnos)
+            for s, membro in desfazer:
+                melhor[s] = membro
+        custo += delta
+        if custo < melhor_custo - 1e-9:
+            melhor_custo, melhor = custo, None
+
+    final = metas.turnos if melhor is None else melhor
+    return final, {"antes": antes, "depois": PontuacaoMetas(final, calendario, grupos, preferencias).pontuacao(pesos),
+                   "iteracoes": feitas, "aceitas": aceitas, "segundos": time.perf_counter() - inicio}
@@ -0,0 +1,225 @@
+import atexit
+import copy
+import queue
+import threading
+import time
+
+from armazenamento import aplicar_mutacao
+from concorrencia import ConflitoConcorrente, RecargaNecessaria
+
+DEBOUNCE_SEGUNDOS = 0.5
+INTERVALO_SINCRONIA = 1.0     # armazenamento compartilhado: busca o que as outras instâncias gravaram
+LIMITE_RECEBIDAS = 1000
+
+# ==================================================
+# GRAVAÇÃO EM SEGUNDO PLANO
+# ==================================================
+class PersistenciaAssincrona:
+    # Fica na frente de um armazenamento com a mesma interface. A interface só
+    # enfileira a mutação; uma thread aplica as mutações numa cópia própria
+    # dos dados e grava tudo o que chegou dentro da janela de debounce numa
+    # única escrita. Consultas ao histórico esperam as gravações pendentes.
+    # Com historico_carregado=False os dados vieram sem os sorteios, e nada é
+    # gravado até sorteios_carregados() entregar o histórico.
+    # Com um armazenamento compartilhado, a thread também traz, quando está
+    # ociosa, o que as outras instâncias gravaram; a interface recolhe isso
+    # em mudancas_externas(). Se uma gravação falha, a réplica é relida do
+    # disco e a interface recebe um "recarregar", como num conflito.
+    def __init__(self, armazenamento, dados, debounce=DEBOUNCE_SEGUNDOS, historico_carregado=True):
+        self.armazenamento = armazenamento
+        self.replica = copy.deepcopy(dados)
+        self.historico_pronto = threading.Event()
+        if historico_carregado:
+            self._indexar()
+        self.debounce = debounce
+        self.fila = queue.Queue()
+        self.pendentes = 0
+        self.trava = threading.Lock()
+        self.erro = None
+        self.compartilhado = getattr(armazenamento, "compartilhado", False)
+        self.externas = queue.Queue()   # ("mutacoes", lista) ou ("recarregar", dados, motivo)
+        self.recebidas = []             # (sequência, mutação) alheias já aplicadas na réplica
+        self.total_recebidas = 0
+        self.vistas = 0                 # quantas delas a interface já aplicou
+        self.recargas = 0               # recargas da réplica; mutações feitas antes da última são descartadas
+        self.recargas_vistas = 0
+        self.thread = threading.Thread(target=self._executar, name="persistencia", daemon=True)
+        self.thread.start()
+        atexit.register(self.descarregar)
+
+    def _executar(self):
+        parar = False
+        while not parar:
+            lote, avisos = [], []
+            try:
+                tipo, valor = self.fila.get(timeout=INTERVALO_SINCRONIA if self.compartilhado else None)
+            except queue.Empty:
+                self._sincronizar()
+                continue
+            prazo = time.monotonic() + self.debounce
+            while True:
+                if tipo == "mutacao":
+                    lote.append(valor)
+                elif tipo == "descarregar":
+                    avisos.append(valor)
+                    break
+                else:
+                    parar = True
+                    break
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    tipo, valor = self.fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+            if lote:
+                self.historico_pronto.wait()
+                try:
+                    self._gravar(lote)
+                except (ConflitoConcorrente, RecargaNecessaria) as erro:
+                    self._recarregar(erro)
+                except Exception as erro:
+                    self._recarregar(f"falha ao gravar: {erro}")
+                with self.trava:
+                    self.pendentes -= len(lote)
+            for aviso in avisos:
+                aviso.set()
+
+    def _gravar(self, lote):
+        # Mutações feitas sobre dados que a interface ainda não trocou pelos recarregados
+        lote = [(mutacao, vistas) for mutacao, vistas, recargas in lote if recargas == self.recargas]
+        if not lote:
+            return
+        mutacoes = [mutacao for mutacao, _ in lote]
+        for mutacao in mutacoes:
+            aplicar_mutacao(self.replica, mutacao)
+        if not self.compartilhado:
+            self.armazenamento.registrar_varios(self.replica, mutacoes)
+            return
+        # Alheias que a interface ainda não tinha visto quando fez o lote
+        base = min(vistas for _, vistas in lote)
+        ja_recebidas = [mutacao for sequencia, mutacao in self.recebidas if sequencia > base]
+        self._receber(self.armazenamento.registrar_varios(self.replica, mutacoes, ja_recebidas))
+
+    # === OUTRAS INSTÂNCIAS ===
+    def _sincronizar(self):
+        if not self.historico_pronto.is_set():
+            return
+        try:
+            self._receber(self.armazenamento.sincronizar(self.replica))
+        except RecargaNecessaria as erro:
+            self._recarregar(erro)
+        except TimeoutError:
+            pass    # outra instância está gravando; tenta de novo no próximo intervalo
+        except Exception as erro:
+            self._recarregar(f"falha ao ler as outras instâncias: {erro}")
+
+    def _receber(self, mutacoes):
+        if not mutacoes:
+            return
+        for mutacao in mutacoes:
+            self.total_recebidas += 1
+            self.recebidas.append((self.total_recebidas, mutacao))
+        del self.recebidas[:-LIMITE_RECEBIDAS]
+        self.externas.put(("mutacoes", mutacoes))
+
+    def _recarregar(self, motivo):
+        # Conflito ou journal compactado por outra instância: o que está na
+        # fila foi feito sobre dados que não valem mais e é descartado
+        descartadas, outros = 0, []
+        while True:
+            try:
+                tipo, valor = self.fila.get_nowait()
+            except queue.Empty:
+                break
+            if tipo == "mutacao":
+                descartadas += 1
+            else:
+                outros.append((tipo, valor))
+        for item in outros:
+            self.fila.put(item)
+        with self.trava:
+            self.pendentes -= descartadas
+        try:
+            self.replica = self.armazenamento.carregar()
+        except Exception as erro:
+            # Nem a releitura deu certo: nada mais é gravado
+            self.erro = erro
+            return
+        self._indexar()
+        self.recebidas = []
+        self.recargas += 1
+        self.externas.put(("recarregar", copy.deepcopy(self.replica), str(motivo)))
+
+    def mudancas_externas(self):
+        # O que chegou das outras instâncias desde a última chamada, em ordem
+        mudancas = []
+        while True:
+            try:
+                mudanca = self.externas.get_nowait()
+            except queue.Empty:
+                return mudancas
+            if mudanca[0] == "mutacoes":
+                self.vistas += len(mudanca[1])
+            else:
+                self.recargas_vistas += 1
+            mudancas.append(mudanca)
+
+    def verificar(self):
+        # A interface chama antes de alterar os dados. O erro não se apaga:
+        # a réplica não confere mais com o disco
+        if self.erro is not None:
+            raise RuntimeError(f"Falha ao gravar os dados: {self.erro}") from self.erro
+
+    def registrar(self, dados, mutacao):
+        self.verificar()
+        with self.trava:
+            self.pendentes += 1
+        self.fila.put(("mutacao", (mutacao, self.vistas, self.recargas_vistas)))
+
+    def _indexar(self):
+        # O índice do histórico passa a apontar para a lista da réplica, que
+        # é a que recebe as mutações nesta thread
+        self.armazenamento.indexar_historico(self.replica["sorteios"])
+        self.historico_pronto.set()
+
+    def sorteios_carregados(self, sorteios):
+        self.replica["sorteios"][:0] = sorteios
+        self._indexar()
+
+    def descarregar(self):
+        # Espera até que tudo o que foi enfileirado esteja gravado
+        if self.thread.is_alive() and self.historico_pronto.is_set():
+            aviso = threading.Event()
+            self.fila.put(("descarregar", aviso))
+            aviso.wait()
+        self.verificar()
+
+    def fechar(self, dados):
+        atexit.unregister(self.descarregar)
+        if not self.historico_pronto.is_set():
+            # Sem o histórico a réplica está incompleta e não pode ser gravada
+            if self.pendentes:
+                raise RuntimeError(f"{self.pendentes} alteração(ões) não gravada(s): o histórico não foi lido")
+            return
+        self.descarregar()
+        if self.thread.is_alive():
+            self.fila.put(("parar", None))
+            self.thread.join()
+        self.armazenamento.fechar(self.replica)
+
+    # === CONSULTAS AO HISTÓRICO ===
+    def _consultar(self):
+        if self.pendentes:
+            self.descarregar()
+        return self.armazenamento
+
+    def contar_sorteios(self, inicio=None, fim=None):
+        return self._consultar().contar_sorteios(inicio, fim)
+
+    def cabecalhos_sorteios(self, offset=0, limite=50, inicio=None, fim=None):
+        return self._consultar().cabecalhos_sorteios(offset, limite, inicio, fim)
+
+    def carregar_sorteio(self, id_sorteio):
+        return self._consultar().carregar_sorteio(id_sorteio)
@@ -0,0 +1,498 @@
+import argparse
+import asyncio
+import copy
+import gzip
+import hashlib
+import json
+import sys
+import threading
+from bisect import insort
+from collections import OrderedDict, defaultdict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import armazenamento
+from armazenamento import aplicar_mutacao, localizar_reparo, nome_membro
+from exportacao_periodo import mapa_grupos, turnos_sorteios
+from indices import normalizar
+from instrumentacao import medido
+
+HOST_PADRAO = "127.0.0.1"
+PORTA_PADRAO = 8765
+ESPERA_CONEXAO = 15           # segundos de conexão ociosa antes de fechar
+TAMANHO_CABECALHO = 16 * 1024
+MINIMO_GZIP = 1024
+MAXIMO_CACHE = 2000
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 200
+INTERVALO_SINCRONIA = 0.5
+
+# Servidor HTTP/JSON só de leitura, em asyncio. Cada resposta fica no cache
+# (com ETag e gzip) até uma mutação mexer numa das etiquetas dela.
+#
+#   GET /                              página para consulta pelo celular
+#   GET /api/membros                   membros ativos com seus grupos
+#   GET /api/membros/<id>              um membro
+#   GET /api/membros/<id>/turnos       turnos do membro, mais recentes antes (?limite=)
+#   GET /api/grupos                    grupos com seus membros
+#   GET /api/sorteios                  sorteios, mais recentes antes (?offset=&limite=)
+#   GET /api/sorteios/<id>|ultimo      um sorteio com todos os turnos (?grupo=)
+#
+# O arquivo frio não é servido, mas o id de um sorteio é a posição no
+# histórico completo, contando os arquivados (no SQLite não bate com o id
+# da linha no banco).
+
+class ErroHttp(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+MOTIVOS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           431: "Request Header Fields Too Large"}
+
+def etiquetas_mutacao(mutacao):
+    tipo = mutacao["tipo"]
+    if tipo == "lote":
+        return set().union(*(etiquetas_mutacao(item) for item in mutacao["mutacoes"]))
+    if tipo == "membro_excluido":
+        return {"cadastro", "grupos"}
+    if tipo in ("membro_adicionado", "membro_renomeado"):
+        return {"cadastro"}
+    if tipo in ("grupo_criado", "membro_grupo_adicionado", "membro_grupo_removido"):
+        return {"grupos"}
+    if tipo == "sorteio_registrado":
+        return {"sorteios"} | {f"turnos:{m}" for m in mutacao["sorteio"]["turnos"] if m is not None}
+    if tipo == "sorteios_registrados":
+        return {"sorteios"} | {f"turnos:{m}" for sorteio in mutacao["sorteios"]
+                               for m in sorteio["turnos"] if m is not None}
+    if tipo == "sorteio_reparado":
+        return {f"turnos:{m}" for _, antes, depois in mutacao["alteracoes"] for m in (antes, depois)
+                if m is not None}
+    return set()
+
+# ==================================================
+# RESPOSTAS PRONTAS
+# ==================================================
+class Resposta:
+    def __init__(self, corpo, tipo="application/json; charset=utf-8", status=200):
+        self.status = status
+        self.corpo = corpo
+        self.tipo = tipo
+        self.etag = '"' + hashlib.blake2b(corpo, digest_size=12).hexdigest() + '"'
+        self.comprimido = gzip.compress(corpo, 6) if len(corpo) >= MINIMO_GZIP else None
+
+def resposta_json(valor, status=200):
+    return Resposta(json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), status=status)
+
+def montar_http(status, cabecalhos, corpo=b""):
+    linhas = [f"HTTP/1.1 {status} {MOTIVOS[status]}"]
+    linhas.extend(f"{nome}: {valor}" for nome, valor in cabecalhos)
+    return ("\r\n".join(linhas) + "\r\n\r\n").encode("latin-1") + corpo
+
+def inteiro(consulta, nome, padrao, maximo=None):
+    try:
+        valor = int(consulta.get(nome, padrao))
+    except ValueError:
+        raise ErroHttp(400, f"'{nome}' precisa ser um número")
+    if valor < 0:
+        raise ErroHttp(400, f"'{nome}' não pode ser negativo")
+    return min(valor, maximo) if maximo is not None else valor
+
+# ==================================================
+# DADOS E CACHE
+# ==================================================
+class ServidorSorteios:
+    # `base` é quantos sorteios estão no arquivo frio, para que os ids
+    # sejam posições no histórico completo
+    def __init__(self, dados, base=0):
+        self.loop = None
+        self.servidor = None
+        self.endereco = None
+        self.substituir(dados, base)
+
+    def substituir(self, dados, base=None):
+        self.dados = dados
+        if base is not None:
+            self.base = base
+        self.cache = OrderedDict()      # chave -> Resposta
+        self.por_etiqueta = defaultdict(set)
+        self._grupos_por_membro = None
+        # membro -> [(posição em dados["sorteios"], slot)], em ordem
+        self.turnos_membro = defaultdict(list)
+        for posicao, sorteio in enumerate(dados["sorteios"]):
+            self._indexar_turnos(posicao, sorteio)
+
+    def _indexar_turnos(self, posicao, sorteio):
+        for slot, membro in enumerate(sorteio["turnos"]):
+            if membro is not None:
+                self.turnos_membro[membro].append((posicao, slot))
+
+    def aplicar(self, mutacao):
+        if mutacao["tipo"] == "lote":
+            for item in mutacao["mutacoes"]:
+                self.aplicar(item)
+            return
+        etiquetas = etiquetas_mutacao(mutacao)
+        if mutacao["tipo"] == "sorteio_reparado":
+            posicao = localizar_reparo(self.dados["sorteios"], mutacao)
+            if posicao is not None:
+                self._reindexar_turnos(posicao, mutacao["alteracoes"])
+                etiquetas.add(f"sorteio:{posicao}")
+        inicio = len(self.dados["sorteios"])
+        aplicar_mutacao(self.dados, mutacao)
+        for posicao in range(inicio, len(self.dados["sorteios"])):
+            self._indexar_turnos(posicao, self.dados["sorteios"][posicao])
+        self.invalidar(etiquetas)
+
+    def _reindexar_turnos(self, posicao, alteracoes):
+        for slot, antes, depois in alteracoes:
+            if antes is not None:
+                self.turnos_membro[antes].remove((posicao, slot))
+            if depois is not None:
+                insort(self.turnos_membro[depois], (posicao, slot))
+
+    def invalidar(self, etiquetas):
+        if "grupos" in etiquetas:
+            self._grupos_por_membro = None
+        for etiqueta in etiquetas:
+            for chave in self.por_etiqueta.pop(etiqueta, ()):
+                self.cache.pop(chave, None)
+
+    # Chamados de outras threads
+    def publicar(self, mutacao):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.aplicar, copy.deepcopy(mutacao))
+
+    def publicar_dados(self, dados, base=None):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.substituir, copy.deepcopy(dados), base)
+
+    # === RECURSOS ===
+    def grupos_por_membro(self):
+        if self._grupos_por_membro is None:
+            self._grupos_por_membro = mapa_grupos(self.dados["grupos"])
+        return self._grupos_por_membro
+
+    def _membro(self, membro):
+        return {"id": membro, "nome": nome_membro(self.dados, membro),
+                "grupos": list(self.grupos_por_membro().get(membro, ()))}
+
+    def _posicao_sorteio(self, texto):
+        sorteios = self.dados["sorteios"]
+        if texto == "ultimo":
+            posicao = len(sorteios) - 1
+        else:
+            try:
+                posicao = int(texto) - self.base
+            except ValueError:
+                raise ErroHttp(404, "sorteio não encontrado")
+        if not 0 <= posicao < len(sorteios):
+            raise ErroHttp(404, "sorteio não encontrado")
+        return posicao
+
+    def _id_membro(self, texto):
+        try:
+            membro = int(texto)
+        except ValueError:
+            raise ErroHttp(404, "membro não encontrado")
+        if membro not in self.dados["membros"] and membro not in self.dados["excluidos"]:
+            raise ErroHttp(404, "membro não encontrado")
+        return membro
+
+    def montar(self, partes, consulta):
+        # (Resposta, etiquetas) para o caminho já dividido
+        if not partes:
+            return Resposta(PAGINA, "text/html; charset=utf-8"), ()
+        if partes[0] != "api":
+            raise ErroHttp(404, "caminho desconhecido")
+        recurso = partes[1:]
+        if recurso == ["membros"]:
+            membros = sorted(self.dados["membros"], key=lambda m: normalizar(self.dados["membros"][m]))
+            return resposta_json([self._membro(m) for m in membros]), ("cadastro", "grupos")
+        if len(recurso) == 2 and recurso[0] == "membros":
+            return resposta_json(self._membro(self._id_membro(recurso[1]))), ("cadastro", "grupos")
+        if len(recurso) == 3 and recurso[0] == "membros" and recurso[2] == "turnos":
+            return self._turnos(self._id_membro(recurso[1]), consulta)
+        if recurso == ["grupos"]:
+            grupos = {grupo: [{"id": m, "nome": nome_membro(self.dados, m)} for m in membros_grupo]
+                      for grupo, membros_grupo in self.dados["grupos"].items()}
+            return resposta_json(grupos), ("cadastro", "grupos")
+        if recurso == ["sorteios"]:
+            return self._lista_sorteios(consulta)
+        if len(recurso) == 2 and recurso[0] == "sorteios":
+            return self._sorteio(recurso[1], consulta)
+        raise ErroHttp(404, "caminho desconhecido")
+
+    def _lista_sorteios(self, consulta):
+        sorteios = self.dados["sorteios"]
+        offset = inteiro(consulta, "offset", 0)
+        limite = inteiro(consulta, "limite", LIMITE_PADRAO, LIMITE_MAXIMO)
+        fim = max(0, len(sorteios) - offset)
+        itens = [{"id": self.base + posicao, "data": sorteios[posicao]["data"],
+                  "turnos": len(sorteios[posicao]["turnos"])}
+                 for posicao in range(fim - 1, max(0, fim - limite) - 1, -1)]
+        return resposta_json({"total": self.base + len(sorteios), "sorteios": itens}), ("sorteios",)
+
+    def _sorteio(self, texto, consulta):
+        posicao = self._posicao_sorteio(texto)
+        grupo = consulta.get("grupo")
+        if grupo is not None and grupo not in self.dados["grupos"]:
+            raise ErroHttp(404, "grupo não encontrado")
+        sorteio = self.dados["sorteios"][posicao]
+        nomes = {m: nome_membro(self.dados, m) for m in set(sorteio["turnos"]) if m is not None}
+        bloco = next(turnos_sorteios([sorteio], nomes, self.grupos_por_membro(), {grupo} if grupo else None))
+        turnos = [{"slot": slot, "horario": rotulo, "inicio": inicio.strftime("%d/%m/%Y %H:%M"),
+                   "fim": fim.strftime("%d/%m/%Y %H:%M"), "membro": membro, "nome": nome, "grupos": list(grupos)}
+                  for slot, rotulo, inicio, fim, membro, nome, grupos in bloco["turnos"]]
+        etiquetas = ("cadastro", "grupos", f"sorteio:{posicao}") + (("sorteios",) if texto == "ultimo" else ())
+        return resposta_json({"id": self.base + posicao, "data": sorteio["data"], "turnos": turnos}), etiquetas
+
+    def _turnos(self, membro, consulta):
+        limite = inteiro(consulta, "limite", LIMITE_PADRAO * 5, LIMITE_MAXIMO * 5)
+        sorteios = self.dados["sorteios"]
+        itens = []
+        for posicao, slot in reversed(self.turnos_membro.get(membro, ())[-limite:]):
+            sorteio = sorteios[posicao]
+            bloco = next(turnos_sorteios([sorteio], {}, {}))
+            _, rotulo, inicio, fim, _, _, _ = bloco["turnos"][slot]
+            itens.append({"sorteio": self.base + posicao, "data": sorteio["data"], "horario": rotulo,
+                          "inicio": inicio.strftime("%d/%m/%Y %H:%M"), "fim": fim.strftime("%d/%m/%Y %H:%M")})
+        corpo = dict(self._membro(membro), turnos=itens)
+        return resposta_json(corpo), ("cadastro", "grupos", f"turnos:{membro}")
+
+    def recurso(self, alvo):
+        url = urlsplit(alvo)
+        caminho = url.path.strip("/")
+        partes = [unquote(parte) for parte in caminho.split("/")] if caminho else []
+        consulta = {nome: valores[-1] for nome, valores in parse_qs(url.query).items()}
+        chave = (tuple(partes), tuple(sorted(consulta.items())))
+        resposta = self.cache.get(chave)
+        if resposta is not None:
+            self.cache.move_to_end(chave)
+            return resposta
+        resposta, etiquetas = self.montar(partes, consulta)
+        self.cache[chave] = resposta
+        for etiqueta in etiquetas:
+            self.por_etiqueta[etiqueta].add(chave)
+        if len(self.cache) > MAXIMO_CACHE:
+            self.cache.popitem(last=False)
+        return resposta
+
+    # === HTTP ===
+    @medido("servidor.requisicao")
+    def responder(self, metodo, alvo, campos, manter):
+        conexao = ("Connection", "keep-alive" if manter else "close")
+        if metodo not in ("GET", "HEAD"):
+            corpo = resposta_json({"erro": "só leitura"}, 405).corpo
+            return montar_http(405, [("Allow", "GET, HEAD"), ("Content-Type", "application/json; charset=utf-8"),
+                                     ("Content-Length", len(corpo)), conexao], corpo)
+        try:
+            resposta = self.recurso(alvo)
+        except ErroHttp as erro:
+            resposta = resposta_json({"erro": str(erro)}, erro.status)
+        cabecalhos = [("Content-Type", resposta.tipo), ("ETag", resposta.etag), ("Cache-Control", "no-cache"),
+                      ("Vary", "Accept-Encoding"), ("Access-Control-Allow-Origin", "*"), conexao]
+        if resposta.status == 200 and resposta.etag in campos.get("if-none-match", ""):
+            return montar_http(304, cabecalhos)
+        corpo = resposta.corpo
+        if resposta.comprimido is not None and "gzip" in campos.get("accept-encoding", ""):
+            corpo = resposta.comprimido
+            cabecalhos.append(("Content-Encoding", "gzip"))
+        cabecalhos.append(("Content-Length", len(corpo)))
+        return montar_http(resposta.status, cabecalhos, corpo if metodo == "GET" else b"")
+
+    async def atender(self, leitor, escritor):
+        try:
+            while True:
+                try:
+                    bruto = await asyncio.wait_for(leitor.readuntil(b"\r\n\r\n"), ESPERA_CONEXAO)
+                except asyncio.LimitOverrunError:
+                    escritor.write(montar_http(431, [("Content-Length", 0), ("Connection", "close")]))
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                linhas = bruto.decode("latin-1").split("\r\n")
+                pedido = linhas[0].split()
+                if len(pedido) != 3 or not pedido[2].startswith("HTTP/"):
+                    escritor.write(montar_http(400, [("Content-Length", 0), ("Connection", "close")]))
+                    break
+                metodo, alvo, versao = pedido
+                campos = {}
+                for linha in linhas[1:]:
+                    nome, _, valor = linha.partition(":")
+                    campos[nome.strip().lower()] = valor.strip()
+                conexao = campos.get("connection", "").lower()
+                manter = conexao != "close" if versao == "HTTP/1.1" else conexao == "keep-alive"
+                # Pedidos com corpo não são aceitos: a conexão fecha depois da resposta
+                if campos.get("content-length", "0") != "0" or "transfer-encoding" in campos:
+                    manter = False
+                escritor.write(self.responder(metodo, alvo, campos, manter))
+                await escritor.drain()
+                if not manter:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            escritor.close()
+
+    async def iniciar(self, host=HOST_PADRAO, porta=PORTA_PADRAO):
+        self.loop = asyncio.get_running_loop()
+        self.servidor = await asyncio.start_server(self.atender, host, porta, limit=TAMANHO_CABECALHO,
+                                                   backlog=1024)
+        return self.servidor.sockets[0].getsockname()[:2]
+
+# ==================================================
+# EXECUÇÃO
+# ==================================================
+def iniciar_em_thread(dados, base=0, host=HOST_PADRAO, porta=PORTA_PADRAO):
+    # Para a interface: `dados` passa a ser do servidor; as mutações chegam
+    # por publicar().
+    servidor = ServidorSorteios(dados, base)
+    pronto = threading.Event()
+    erro = []
+
+    def executar():
+        loop = asyncio.new_event_loop()
+        try:
+            servidor.endereco = loop.run_until_complete(servidor.iniciar(host, porta))
+        except OSError as falha:
+            erro.append(falha)
+            pronto.set()
+            return
+        pronto.set()
+        loop.run_forever()
+
+    threading.Thread(target=executar, name="servidor", daemon=True).start()
+    pronto.wait()
+    if erro:
+        raise erro[0]
+    return servidor
+
+def endereco_do_ambiente(valor):
+    # SORTEIO_SERVIDOR=8765 ou =0.0.0.0:8765
+    host, _, porta = valor.rpartition(":")
+    return host or HOST_PADRAO, int(porta)
+
+async def servir(armazenamento_dados, dados, base, host, porta):
+    servidor = ServidorSorteios(dados, base)
+    endereco = await servidor.iniciar(host, porta)
+    print(f"Servindo em http://{endereco[0]}:{endereco[1]}/", file=sys.stderr)
+    if armazenamento_dados is None:
+        await servidor.servidor.serve_forever()
+        return
+    # Armazenamento compartilhado: traz o que as outras instâncias gravam
+    while True:
+        await asyncio.sleep(INTERVALO_SINCRONIA)
+        for mudanca in armazenamento_dados.mudancas_externas():
+            if mudanca[0] == "mutacoes":
+                for mutacao in mudanca[1]:
+                    servidor.aplicar(mutacao)
+            else:
+                servidor.substituir(mudanca[1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor só de leitura dos sorteios")
+    parser.add_argument("--host", default=HOST_PADRAO, help="0.0.0.0 atende a rede local")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    args = parser.parse_args()
+
+    # Só leitura: a interface pode estar gravando nos mesmos arquivos
+    armazenamento_base = armazenamento.criar_armazenamento(somente_leitura=True)
+    dados = armazenamento_base.carregar()
+    armazenamento_dados = None
+    if getattr(armazenamento_base, "compartilhado", False):
+        from persistencia import PersistenciaAssincrona
+        armazenamento_dados = PersistenciaAssincrona(armazenamento_base, dados)
+    else:
+        print("Os dados não mudam enquanto o servidor roda; com SORTEIO_ARMAZENAMENTO=compartilhado "
+              "ele acompanha as alterações feitas na interface.", file=sys.stderr)
+    base = getattr(armazenamento_base, "arquivados", 0)
+    try:
+        asyncio.run(servir(armazenamento_dados, dados, base, args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if armazenamento_dados is not None:
+            armazenamento_dados.fechar(dados)
+
+# ==================================================
+# PÁGINA
+# ==================================================
+PAGINA = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Sorteio de Oração</title>
+<style>
+body { font-family: Arial, sans-serif; background: #1E2A44; color: #FFFFFF; margin: 0; padding: 1em; }
+h1 { color: #FFD700; font-size: 1.5em; }
+h2 { color: #FFD700; font-size: 1.1em; margin-top: 1.5em; }
+input, select { font-size: 1em; padding: .4em; margin: .2em 0; background: #2E4057; color: #FFFFFF; border: 0; }
+table { border-collapse: collapse; width: 100%; max-width: 40em; }
+td, th { text-align: left; padding: .3em .5em; border-bottom: 1px solid #2E4057; }
+tr.proximo td { color: #FFD700; font-weight: bold; }
+.vago { color: #8899AA; }
+</style>
+</head>
+<body>
+<h1>Sorteio de Oração</h1>
+<label>Quando é o meu turno?<br><input id="busca" list="nomes" placeholder="Digite seu nome" autocomplete="off"></label>
+<datalist id="nomes"></datalist>
+<div id="meus"></div>
+<h2 id="titulo_sorteio">Último sorteio</h2>
+<select id="sorteios"></select>
+<select id="grupo"><option value="">Todos os grupos</option></select>
+<table id="turnos"></table>
+<script>
+let membros = [];
+const $ = id => document.getElementById(id);
+const api = caminho => fetch(caminho).then(r => r.ok ? r.json() : Promise.reject(r.status));
+const texto = s => String(s).replace(/[&<>"]/g, c => ({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}[c]));
+const quando = s => { const [d, h] = s.split(" "); const [dia, mes, ano] = d.split("/"); return new Date(`${ano}-${mes}-${dia}T${h}`); };
+
+async function carregarMembros() {
+  membros = await api("/api/membros");
+  $("nomes").innerHTML = membros.map(m => `<option value="${texto(m.nome)}">`).join("");
+  const grupos = await api("/api/grupos");
+  $("grupo").innerHTML = '<option value="">Todos os grupos</option>' +
+    Object.keys(grupos).map(g => `<option>${texto(g)}</option>`).join("");
+}
+
+async function mostrarMeus() {
+  const nome = $("busca").value.trim().toLowerCase();
+  const membro = membros.find(m => m.nome.toLowerCase() === nome);
+  if (!membro) { $("meus").innerHTML = ""; return; }
+  const dados = await api(`/api/membros/${membro.id}/turnos`);
+  const agora = new Date();
+  const linhas = dados.turnos.map(t => `<tr class="${quando(t.fim) >= agora ? "proximo" : ""}">` +
+    `<td>${texto(t.inicio)}</td><td>${texto(t.horario)}</td><td>sorteio de ${texto(t.data)}</td></tr>`);
+  $("meus").innerHTML = linhas.length ? `<table>${linhas.join("")}</table>` : "<p>Nenhum turno encontrado.</p>";
+}
+
+async function carregarSorteios() {
+  const lista = await api("/api/sorteios?limite=50");
+  $("sorteios").innerHTML = lista.sorteios.map(s => `<option value="${s.id}">${texto(s.data)}</option>`).join("");
+  await mostrarSorteio();
+}
+
+async function mostrarSorteio() {
+  const id = $("sorteios").value;
+  if (!id) { $("turnos").innerHTML = "<tr><td>Nenhum sorteio.</td></tr>"; return; }
+  const grupo = $("grupo").value;
+  const sorteio = await api(`/api/sorteios/${id}` + (grupo ? `?grupo=${encodeURIComponent(grupo)}` : ""));
+  $("titulo_sorteio").textContent = `Sorteio de ${sorteio.data}`;
+  $("turnos").innerHTML = sorteio.turnos.map(t =>
+    `<tr><td>${texto(t.horario)}</td>` + (t.nome ? `<td>${texto(t.nome)}</td>` : '<td class="vago">-</td>') + "</tr>").join("");
+}
+
+$("busca").addEventListener("input", mostrarMeus);
+$("sorteios").addEventListener("change", mostrarSorteio);
+$("grupo").addEventListener("change", mostrarSorteio);
+carregarMembros().then(carregarSorteios);
+</script>
+</body>
+</html>
+""".encode("utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,36 @@
-import tkinter as tk
-from tkinter import messagebox, simpledialog, ttk
-import json
-import random
+import copy
 import os
-from datetime import datetime, timedelta
-import pyperclip
-from fpdf import FPDF
+import queue
+import sys
+import threading
+import time
+import traceback
+TEMPOS = [("inicio", time.perf_counter())]
 
-ARQUIVO_DADOS = "dados.json"
+import tkinter as tk
+from tkinter import filedialog, messagebox, simpledialog, ttk
+import csv
+from datetime import datetime
+import random
+import motor_sorteio
+import lote_sorteios
+import importacao
+import exportacao
+import exportacao_periodo
+import armazenamento
+import instrumentacao
+import otimizacao
+from armazenamento import aplicar_mutacao, nome_membro, tamanhos_dados
+from historico import PaginadorHistorico
+from persistencia import PersistenciaAssincrona
+from indices import IndiceBusca, IndiceGrupos
+from equidade import ContadoresServico, JANELA_PADRAO
+from calendario import obter_calendario
+from eventos import Eventos
+from motor_sorteio import calendario_do_sorteio, get_horarios_restricao, hora_do_horario
+from instrumentacao import medido
+
+TEMPOS.append(("imports", time.perf_counter()))
 
 # Paleta de cores
 PRIMARY_BG = "#1E2A44"
@@ -15,41 +38,169 @@ ACCENT_BG = "#2E4057"
 HIGHLIGHT = "#FFD700"
 TEXT_COLOR = "#FFFFFF"
 SELECT_COLOR = "#4A6FA5"
+RESTRITO_COLOR = "#C0392B"
+PREFERIDO_COLOR = "#27AE60"
 
-# ==================================================
-# FUNÇÕES AUXILIARES
-# ==================================================
-def get_horarios_restricao():
-    horarios = []
-    hora = datetime.strptime("00:00", "%H:%M")
-    for _ in range(24):
-        horarios.append(hora.strftime("%H:%M"))
-        hora += timedelta(hours=1)
-    return horarios
+# Grade de disponibilidade
+LARGURA_NOME = 200
+LARGURA_HORA = 28
+ALTURA_LINHA = 22
+ALTURA_CABECALHO = 24
 
-def get_horarios_sorteio():
-    horarios = []
-    hora = datetime.strptime("00:00", "%H:%M")
-    for _ in range(96):
-        horarios.append(hora.strftime("%H:%M"))
-        hora += timedelta(minutes=15)
-    return horarios
+INTERVALO_OUTRAS_MS = 500
 
 # ==================================================
 # ARMAZENAMENTO
 # ==================================================
-def carregar_dados():
-    if not os.path.exists(ARQUIVO_DADOS):
-        return {"membros": [], "grupos": {}, "sorteios": [], "restricoes_horarios": {}}
-    with open(ARQUIVO_DADOS, "r", encoding="utf-8") as f:
-        dados = json.load(f)
-        if "restricoes_horarios" not in dados:
-            dados["restricoes_horarios"] = {}
-        return dados
+@medido("interface.registrar", lambda mutacao: {"tipo": mutacao["tipo"]})
+def registrar(mutacao):
+    # Sem o histórico nada é gravado; uma gravação que falhou aparece antes
+    # de a memória mudar
+    aguardar_historico()
+    armazenamento_dados.verificar()
+    aplicar_mutacao(dados, mutacao, indice_grupos)
+    armazenamento_dados.registrar(dados, mutacao)
+    atualizar_indices(mutacao)
+    eventos.publicar(mutacao)
+    if servidor_api is not None:
+        servidor_api.publicar(mutacao)
+
+def nome_de(membro):
+    return nome_membro(dados, membro)
 
-def salvar_dados(dados):
-    with open(ARQUIVO_DADOS, "w", encoding="utf-8") as f:
-        json.dump(dados, f, indent=4, ensure_ascii=False)
+# ==================================================
+# HISTÓRICO EM SEGUNDO PLANO
+# ==================================================
+# O cadastro é lido na abertura; os sorteios são lidos numa thread depois
+# que a Home aparece. Quem precisa do histórico chama aguardar_historico().
+# Os botões que alteram dados ficam desabilitados até o histórico chegar e
+# continuam assim se a leitura falhar.
+def carregar_historico():
+    global sorteios_lidos, erro_historico
+    try:
+        sorteios_lidos = armazenamento_base.carregar_sorteios()
+    except Exception as erro:
+        erro_historico = erro
+
+def iniciar_carga_historico():
+    carga_historico.start()
+    verificar_carga_historico()
+
+def verificar_carga_historico():
+    if carga_historico.is_alive():
+        root.after(50, verificar_carga_historico)
+        return
+    try:
+        aguardar_historico()
+    except RuntimeError as erro:
+        messagebox.showerror("Erro", f"{erro}\nOs dados podem ser consultados, mas nenhuma alteração será gravada.")
+        return
+    for botao in botoes_edicao:
+        if botao.winfo_exists():
+            botao.config(state='normal')
+
+def botao_edicao(botao):
+    botoes_edicao.append(botao)
+    if not historico_carregado:
+        botao.config(state='disabled')
+    return botao
+
+def aguardar_historico():
+    global historico_carregado, contadores_servico
+    if historico_carregado:
+        return
+    carga_historico.join()
+    if erro_historico is not None:
+        # Sem o histórico nada é gravado, para não sobrescrever o arquivo
+        raise RuntimeError(f"Falha ao ler o histórico: {erro_historico}") from erro_historico
+    historico_carregado = True
+    dados["sorteios"][:0] = sorteios_lidos
+    armazenamento_dados.sorteios_carregados(sorteios_lidos)
+    contadores_servico = ContadoresServico(dados["sorteios"], contadores_servico.janela)
+    marcar_tempo("historico")
+    mostrar_tempos()
+    iniciar_servidor()
+
+def iniciar_servidor():
+    # SORTEIO_SERVIDOR=8765 (ou =0.0.0.0:8765) serve os dados por HTTP
+    # enquanto a janela está aberta; veja servidor.py
+    global servidor_api
+    valor = os.environ.get("SORTEIO_SERVIDOR")
+    if not valor:
+        return
+    # asyncio e o servidor só são importados quando ligados
+    import servidor
+    host, porta = servidor.endereco_do_ambiente(valor)
+    try:
+        servidor_api = servidor.iniciar_em_thread(copy.deepcopy(dados), getattr(armazenamento_base, "arquivados", 0),
+                                                  host, porta)
+    except OSError as erro:
+        messagebox.showerror("Erro", f"Não foi possível iniciar o servidor em {host}:{porta}: {erro}")
+
+def marcar_tempo(etapa):
+    TEMPOS.append((etapa, time.perf_counter()))
+    if instrumentacao.ativo:
+        instrumentacao.registrar(f"abertura.{etapa}", (TEMPOS[-1][1] - TEMPOS[-2][1]) * 1000)
+
+def mostrar_tempos():
+    # SORTEIO_TEMPOS=1 mostra quanto cada etapa da abertura levou
+    if not os.environ.get("SORTEIO_TEMPOS"):
+        return
+    anterior = TEMPOS[0][1]
+    for etapa, momento in TEMPOS[1:]:
+        print(f"{etapa:<12} {(momento - anterior) * 1000:8.1f} ms", file=sys.stderr)
+        anterior = momento
+    print(f"{'total':<12} {(TEMPOS[-1][1] - TEMPOS[0][1]) * 1000:8.1f} ms", file=sys.stderr)
+
+# ==================================================
+# ÍNDICES EM MEMÓRIA
+# ==================================================
+def atualizar_indices(mutacao):
+    global contadores_servico
+    if mutacao["tipo"] == "membro_adicionado":
+        indice_busca.adicionar(mutacao["membro"], mutacao["nome"])
+    elif mutacao["tipo"] == "membro_excluido":
+        indice_busca.remover(mutacao["membro"])
+    elif mutacao["tipo"] == "membro_renomeado":
+        indice_busca.renomear(mutacao["membro"], mutacao["nome"])
+    elif mutacao["tipo"] == "sorteio_registrado":
+        contadores_servico.registrar(mutacao["sorteio"])
+    elif mutacao["tipo"] == "sorteios_registrados":
+        for sorteio in mutacao["sorteios"]:
+            contadores_servico.registrar(sorteio)
+    elif mutacao["tipo"] == "sorteio_reparado":
+        # Raro e só a janela de equidade: recontar é mais simples que descontar
+        contadores_servico = ContadoresServico(dados["sorteios"], contadores_servico.janela)
+    elif mutacao["tipo"] == "lote":
+        for item in mutacao["mutacoes"]:
+            atualizar_indices(item)
+
+def contadores_da_janela():
+    global contadores_servico
+    try:
+        janela = max(0, int(janela_equidade.get()))
+    except (tk.TclError, ValueError):
+        janela = JANELA_PADRAO
+    if janela != contadores_servico.janela:
+        contadores_servico = ContadoresServico(dados["sorteios"], janela)
+    return contadores_servico
+
+def atualizar_listbox(listbox, atuais, novos, ordem, texto):
+    # As duas listas seguem a mesma ordem: só apaga e insere as linhas que
+    # mudaram. texto(item) é o que aparece na linha
+    pos = i = j = 0
+    while i < len(atuais) or j < len(novos):
+        if i < len(atuais) and j < len(novos) and atuais[i] == novos[j]:
+            pos += 1
+            i += 1
+            j += 1
+        elif j >= len(novos) or (i < len(atuais) and ordem.get(atuais[i], -1) < ordem[novos[j]]):
+            listbox.delete(pos)
+            i += 1
+        else:
+            listbox.insert(pos, texto(novos[j]))
+            pos += 1
+            j += 1
 
 # ==================================================
 # CADASTRO DE MEMBRO
@@ -58,65 +209,16 @@ def adicionar_membro():
     nome = simpledialog.askstring("Novo Membro", "Nome do membro:", parent=root)
     if not nome:
         return
-
-    window = tk.Toplevel(root)
-    window.title(f"Restrições de {nome}")
-    window.geometry("380x500")
-    window.configure(bg=PRIMARY_BG)
-    window.resizable(False, False)
-
-    main_container = tk.Frame(window, bg=PRIMARY_BG)
-    main_container.pack(fill='both', expand=True, padx=15, pady=15)
-
-    canvas_frame = tk.Frame(main_container, bg=PRIMARY_BG)
-    canvas_frame.pack(fill='both', expand=True)
-
-    canvas = tk.Canvas(canvas_frame, bg=PRIMARY_BG, highlightthickness=0)
-    scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview, style="Custom.Vertical.TScrollbar")
-    scrollable_frame = tk.Frame(canvas, bg=PRIMARY_BG)
-
-    scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-    canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-    canvas.configure(yscrollcommand=scrollbar.set)
-
-    scrollbar.pack(side="right", fill="y")
-    canvas.pack(side="left", fill="both", expand=True)
-
-    horarios = get_horarios_restricao()
-    check_vars = {}
-
-    for h in horarios:
-        var = tk.IntVar(value=0)
-        chk = tk.Checkbutton(scrollable_frame, text=h, variable=var, onvalue=1, offvalue=0,
-                             bg=PRIMARY_BG, fg=TEXT_COLOR, selectcolor=SELECT_COLOR,
-                             activebackground=ACCENT_BG, activeforeground=TEXT_COLOR,
-                             font=("Arial", 11, "bold"))
-        chk.pack(anchor='w', padx=10, pady=8)
-        check_vars[h] = var
-
-    button_frame = tk.Frame(main_container, bg=PRIMARY_BG)
-    button_frame.pack(fill='x', pady=(15, 0))
-
-    def salvar_membro_e_adicionar_grupo():
-        restricoes = [h for h, var in check_vars.items() if var.get() == 1]
-        dados["membros"].append(nome)
-        dados["restricoes_horarios"][nome] = restricoes
-        salvar_dados(dados)
-        window.destroy()
-        adicionar_a_grupo(nome)
-
-    tk.Button(button_frame, text="Salvar e Adicionar a Grupo", command=salvar_membro_e_adicionar_grupo,
-              bg=HIGHLIGHT, fg=PRIMARY_BG, font=("Arial", 12, "bold"), width=30, relief="flat").pack(pady=5)
+    # O novo membro entra como última linha da grade e só é gravado ao salvar
+    abrir_grade_restricoes(novo=nome, ao_salvar=adicionar_a_grupo)
 
 def adicionar_a_grupo(membro):
     if not dados["grupos"]:
         messagebox.showinfo("Informação", "Nenhum grupo cadastrado. Crie um grupo primeiro!", parent=root)
-        if current_tab == 'membros':
-            show_frame('membros')
         return
 
     grupo_window = tk.Toplevel(root)
-    grupo_window.title(f"Adicionar {membro} a um grupo")
+    grupo_window.title(f"Adicionar {nome_de(membro)} a um grupo")
     grupo_window.geometry("450x200")
     grupo_window.configure(bg=PRIMARY_BG)
 
@@ -133,16 +235,13 @@ def adicionar_a_grupo(membro):
         if not grupo:
             messagebox.showwarning("Aviso", "Selecione um grupo!", parent=root)
             return
-        if membro in dados["grupos"][grupo]:
+        if indice_grupos.contem(grupo, membro):
             messagebox.showinfo("Aviso", "Membro já está nesse grupo!", parent=root)
             grupo_window.destroy()
             return
-        dados["grupos"][grupo].append(membro)
-        salvar_dados(dados)
-        messagebox.showinfo("Sucesso", f"'{membro}' adicionado a '{grupo}'!", parent=root)
+        registrar({"tipo": "membro_grupo_adicionado", "grupo": grupo, "membro": membro})
+        messagebox.showinfo("Sucesso", f"'{nome_de(membro)}' adicionado a '{grupo}'!", parent=root)
         grupo_window.destroy()
-        if current_tab == 'membros':
-            show_frame('membros')
 
     tk.Button(grupo_window, text="Adicionar", command=salvar_selecao, bg=HIGHLIGHT, fg=PRIMARY_BG,
               font=("Arial", 12, "bold"), width=15, relief="flat").pack(pady=20)
@@ -154,19 +253,16 @@ def adicionar_grupo():
     if nome_grupo in dados["grupos"]:
         messagebox.showwarning("Aviso", "Grupo já existe!", parent=root)
         return
-    dados["grupos"][nome_grupo] = []
-    salvar_dados(dados)
+    registrar({"tipo": "grupo_criado", "grupo": nome_grupo})
     messagebox.showinfo("Sucesso", f"'{nome_grupo}' criado!", parent=root)
-    if current_tab == 'membros':
-        show_frame('membros')
 
 def adicionar_membro_ao_grupo_specific(membro):
-    if not membro or not dados["grupos"]:
+    if membro is None or not dados["grupos"]:
         messagebox.showwarning("Aviso", "Nenhum grupo cadastrado!" if not dados["grupos"] else "Selecione um membro!", parent=root)
         return
 
     window = tk.Toplevel(root)
-    window.title(f"Adicionar {membro} a um grupo")
+    window.title(f"Adicionar {nome_de(membro)} a um grupo")
     window.geometry("450x200")
     window.configure(bg=PRIMARY_BG)
 
@@ -183,138 +279,401 @@ def adicionar_membro_ao_grupo_specific(membro):
         if not grupo:
             messagebox.showwarning("Aviso", "Selecione um grupo!", parent=root)
             return
-        if membro in dados["grupos"][grupo]:
+        if indice_grupos.contem(grupo, membro):
             messagebox.showinfo("Aviso", "Membro já está nesse grupo!", parent=root)
             window.destroy()
             return
-        dados["grupos"][grupo].append(membro)
-        salvar_dados(dados)
-        messagebox.showinfo("Sucesso", f"'{membro}' adicionado a '{grupo}'!", parent=root)
+        registrar({"tipo": "membro_grupo_adicionado", "grupo": grupo, "membro": membro})
+        messagebox.showinfo("Sucesso", f"'{nome_de(membro)}' adicionado a '{grupo}'!", parent=root)
         window.destroy()
-        if current_tab == 'membros':
-            show_frame('membros')
 
     tk.Button(window, text="Adicionar", command=salvar_selecao, bg=HIGHLIGHT, fg=PRIMARY_BG,
               font=("Arial", 12, "bold"), width=15, relief="flat").pack(pady=20)
 
 def gerenciar_restricoes(membro):
-    if not membro:
+    if membro is None:
         return
-    window = tk.Toplevel(root)
-    window.title(f"Restrições de {membro}")
-    window.geometry("380x500")
-    window.configure(bg=PRIMARY_BG)
-    window.resizable(False, False)
+    abrir_grade_restricoes(foco=membro)
 
-    main_container = tk.Frame(window, bg=PRIMARY_BG)
-    main_container.pack(fill='both', expand=True, padx=15, pady=15)
+def gerenciar_preferencias(membro):
+    if membro is None:
+        return
+    abrir_grade_restricoes(foco=membro, preferencias=True)
 
-    canvas_frame = tk.Frame(main_container, bg=PRIMARY_BG)
-    canvas_frame.pack(fill='both', expand=True)
+# ==================================================
+# GRADE DE DISPONIBILIDADE
+# ==================================================
+# Membros x horas num único Canvas. Só as linhas visíveis têm itens
+# desenhados: ao rolar, os mesmos itens são reaproveitados e só mudam de
+# texto e cor. Clique e arraste marcam ou desmarcam restrições, e ao salvar
+# só os membros que mudaram viram mutações. Com preferencias=True a mesma
+# grade marca as horas preferidas, que o sorteio só tenta respeitar.
+def abrir_grade_restricoes(foco=None, novo=None, ao_salvar=None, preferencias=False):
+    horas = get_horarios_restricao()
+    bits = [1 << hora_do_horario(h) for h in horas]
+    if preferencias:
+        chave, tipo_mutacao, campo = "preferencias_horarios", "preferencias_alteradas", "preferencias"
+    else:
+        chave, tipo_mutacao, campo = "restricoes_horarios", "restricoes_alteradas", "restricoes"
+    tipos_cadastro = ("membro_adicionado", "membro_excluido", "membro_renomeado", tipo_mutacao)
 
-    canvas = tk.Canvas(canvas_frame, bg=PRIMARY_BG, highlightthickness=0)
-    scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview, style="Custom.Vertical.TScrollbar")
-    scrollable_frame = tk.Frame(canvas, bg=PRIMARY_BG)
+    window = tk.Toplevel(root)
+    window.title("Horários preferidos" if preferencias else "Restrições de horário")
+    window.geometry(f"{LARGURA_NOME + LARGURA_HORA * len(horas) + 40}x600")
+    window.configure(bg=PRIMARY_BG)
 
-    scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-    canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-    canvas.configure(yscrollcommand=scrollbar.set)
+    instrucao = ("Clique ou arraste para marcar os horários em que o membro prefere orar" if preferencias else
+                 "Clique ou arraste para marcar os horários em que o membro não pode orar")
+    tk.Label(window, text=instrucao, bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10)).pack(pady=(10, 5))
 
+    area = tk.Frame(window, bg=PRIMARY_BG)
+    area.pack(fill='both', expand=True, padx=10)
+    canvas = tk.Canvas(area, bg=PRIMARY_BG, highlightthickness=0)
+    scrollbar = ttk.Scrollbar(area, orient="vertical", style="Custom.Vertical.TScrollbar")
     scrollbar.pack(side="right", fill="y")
     canvas.pack(side="left", fill="both", expand=True)
 
-    horarios = get_horarios_restricao()
-    restricoes = set(dados["restricoes_horarios"].get(membro, []))
-
-    check_vars = {}
-    for h in horarios:
-        var = tk.IntVar(value=1 if h in restricoes else 0)
-        chk = tk.Checkbutton(scrollable_frame, text=h, variable=var, onvalue=1, offvalue=0,
-                             bg=PRIMARY_BG, fg=TEXT_COLOR, selectcolor=SELECT_COLOR,
-                             activebackground=ACCENT_BG, activeforeground=TEXT_COLOR,
-                             font=("Arial", 11, "bold"))
-        chk.pack(anchor='w', padx=10, pady=8)
-        check_vars[h] = var
-
-    button_frame = tk.Frame(main_container, bg=PRIMARY_BG)
-    button_frame.pack(fill='x', pady=(15, 0))
-
-    def salvar_restricoes():
-        novas_restricoes = [h for h, var in check_vars.items() if var.get() == 1]
-        dados["restricoes_horarios"][membro] = novas_restricoes
-        salvar_dados(dados)
-        messagebox.showinfo("Sucesso", "Restrições atualizadas!", parent=root)
+    button_frame = tk.Frame(window, bg=PRIMARY_BG)
+    button_frame.pack(fill='x', padx=10, pady=10)
+    status = tk.Label(button_frame, text="", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10))
+    status.pack(side='left')
+
+    # O membro novo ainda não tem id: a linha dele usa None
+    pendentes = {}   # id -> máscara já editada
+    if novo:
+        pendentes[None] = 0
+    itens = []       # por linha visível: (texto, [células])
+    exibido = {}     # item -> opções desenhadas por último
+    ids = None       # ids na ordem das linhas, refeito quando o cadastro muda
+    topo = 0
+    pintura = None   # True marca, False desmarca durante o arraste
+    ultima = None
+    focado = None if novo else foco
+    centralizar = bool(novo) or foco in dados["membros"]
+
+    def ids_linhas():
+        nonlocal ids
+        if ids is None:
+            ids = list(dados["membros"])
+        return ids
+
+    def total_linhas():
+        return len(dados["membros"]) + (1 if novo else 0)
+
+    def membro_da_linha(linha):
+        return ids_linhas()[linha] if linha < len(dados["membros"]) else None
+
+    def restricoes_de(membro):
+        if membro in pendentes:
+            return pendentes[membro]
+        return dados[chave].get(membro, 0)
+
+    def alterados():
+        return [m for m, restritas in pendentes.items() if m is None or restritas != dados[chave].get(m, 0)]
+
+    def configurar(item, **opcoes):
+        if exibido.get(item) != opcoes:
+            canvas.itemconfigure(item, **opcoes)
+            exibido[item] = opcoes
+
+    def cor(marcada):
+        if not marcada:
+            return ACCENT_BG
+        return PREFERIDO_COLOR if preferencias else RESTRITO_COLOR
+
+    def linhas_visiveis():
+        return max(1, (canvas.winfo_height() - ALTURA_CABECALHO) // ALTURA_LINHA)
+
+    def desenhar():
+        n = total_linhas()
+        for i, (texto, celulas) in enumerate(itens):
+            linha = topo + i
+            if linha < n:
+                membro = membro_da_linha(linha)
+                restritas = restricoes_de(membro)
+                configurar(texto, text=novo if membro is None else dados["membros"][membro],
+                           fill=HIGHLIGHT if membro == focado else TEXT_COLOR, state='normal')
+                for bit, celula in zip(bits, celulas):
+                    configurar(celula, fill=cor(restritas & bit), state='normal')
+            else:
+                configurar(texto, state='hidden')
+                for celula in celulas:
+                    configurar(celula, state='hidden')
+        if n:
+            scrollbar.set(topo / n, min(1.0, (topo + linhas_visiveis()) / n))
+        else:
+            scrollbar.set(0, 1)
+        status.config(text=f"{len(alterados())} membros alterados")
+
+    def montar(e=None):
+        nonlocal centralizar
+        # Recria o conjunto de itens só quando muda o número de linhas visíveis
+        visiveis = linhas_visiveis() + 1
+        if len(itens) != visiveis:
+            canvas.delete("all")
+            itens.clear()
+            exibido.clear()
+            for c, h in enumerate(horas):
+                canvas.create_text(LARGURA_NOME + c * LARGURA_HORA + LARGURA_HORA // 2, ALTURA_CABECALHO // 2,
+                                   text=h[:2], fill=TEXT_COLOR, font=("Arial", 9))
+            for i in range(visiveis):
+                y = ALTURA_CABECALHO + i * ALTURA_LINHA
+                texto = canvas.create_text(5, y + ALTURA_LINHA // 2, anchor='w', text="", fill=TEXT_COLOR,
+                                           font=("Arial", 10))
+                celulas = [canvas.create_rectangle(LARGURA_NOME + c * LARGURA_HORA + 1, y + 1,
+                                                   LARGURA_NOME + (c + 1) * LARGURA_HORA - 1, y + ALTURA_LINHA - 1,
+                                                   fill=ACCENT_BG, outline="")
+                           for c in range(len(horas))]
+                itens.append((texto, celulas))
+        if centralizar:
+            # Na primeira vez o membro focado fica no meio da grade
+            centralizar = False
+            linha = total_linhas() - 1 if novo else ids_linhas().index(foco)
+            rolar_para(linha - linhas_visiveis() // 2)
+        else:
+            rolar_para(topo)
+
+    def rolar_para(linha):
+        nonlocal topo
+        topo = max(0, min(linha, total_linhas() - linhas_visiveis()))
+        desenhar()
+
+    def rolar(*args):
+        if args[0] == "moveto":
+            rolar_para(int(float(args[1]) * total_linhas()))
+        else:
+            passo = linhas_visiveis() if args[2] == "pages" else 1
+            rolar_para(topo + int(args[1]) * passo)
+
+    def celula_em(x, y):
+        linha = topo + (y - ALTURA_CABECALHO) // ALTURA_LINHA
+        coluna = (x - LARGURA_NOME) // LARGURA_HORA
+        if y < ALTURA_CABECALHO or not 0 <= coluna < len(horas) or not 0 <= linha < total_linhas():
+            return None
+        return linha, coluna
+
+    def pintar(linha, coluna):
+        membro = membro_da_linha(linha)
+        if pintura:
+            pendentes[membro] = restricoes_de(membro) | bits[coluna]
+        else:
+            pendentes[membro] = restricoes_de(membro) & ~bits[coluna]
+        if topo <= linha < topo + len(itens):
+            configurar(itens[linha - topo][1][coluna], fill=cor(pintura), state='normal')
+
+    def ao_clicar(e):
+        nonlocal pintura, ultima
+        celula = celula_em(e.x, e.y)
+        if celula is None:
+            return
+        linha, coluna = celula
+        pintura = not restricoes_de(membro_da_linha(linha)) & bits[coluna]
+        pintar(linha, coluna)
+        ultima = celula
+
+    def ao_arrastar(e):
+        nonlocal ultima
+        celula = celula_em(e.x, e.y)
+        if pintura is None or celula is None or celula == ultima:
+            return
+        # Um arraste rápido pula células entre dois eventos: preenche o caminho
+        (l0, c0), (l1, c1) = ultima, celula
+        passos = max(abs(l1 - l0), abs(c1 - c0))
+        for k in range(1, passos + 1):
+            pintar(round(l0 + (l1 - l0) * k / passos), round(c0 + (c1 - c0) * k / passos))
+        ultima = celula
+
+    def ao_soltar(e):
+        nonlocal pintura, ultima
+        pintura = ultima = None
+        status.config(text=f"{len(alterados())} membros alterados")
+
+    def ao_rolar_mouse(e):
+        if e.num == 4 or e.delta > 0:
+            rolar_para(topo - 3)
+        else:
+            rolar_para(topo + 3)
+
+    def on_cadastro_alterado(mutacao):
+        nonlocal ids
+        if mutacao["tipo"] == "membro_excluido":
+            pendentes.pop(mutacao["membro"], None)
+        if mutacao["tipo"] in ("membro_adicionado", "membro_excluido"):
+            ids = None
+        rolar_para(topo)
+
+    def fechar():
+        eventos.cancelar(tipos_cadastro, on_cadastro_alterado)
         window.destroy()
 
-    tk.Button(button_frame, text="Salvar", command=salvar_restricoes,
-              bg=HIGHLIGHT, fg=PRIMARY_BG, font=("Arial", 12, "bold"), width=20, relief="flat").pack(pady=5)
+    def cancelar():
+        if alterados() and not messagebox.askyesno("Confirmar", "Descartar as alterações?", parent=window):
+            return
+        fechar()
+
+    def salvar():
+        mutacoes = []
+        id_novo = None
+        if novo:
+            id_novo = dados["proximo_id"]
+            mutacoes.append({"tipo": "membro_adicionado", "membro": id_novo, "nome": novo,
+                             "restricoes": pendentes[None]})
+        for membro in alterados():
+            if membro is not None and membro in dados["membros"]:
+                mutacoes.append({"tipo": tipo_mutacao, "membro": membro, campo: pendentes[membro]})
+        fechar()
+        if mutacoes:
+            # Tudo numa única gravação
+            registrar(mutacoes[0] if len(mutacoes) == 1 else {"tipo": "lote", "mutacoes": mutacoes})
+            if not novo:
+                messagebox.showinfo("Sucesso", "Preferências atualizadas!" if preferencias else
+                                    "Restrições atualizadas!", parent=root)
+        if ao_salvar:
+            ao_salvar(id_novo)
+
+    tk.Button(button_frame, text="Salvar", command=salvar, bg=HIGHLIGHT, fg=PRIMARY_BG,
+              font=("Arial", 12, "bold"), width=15, relief="flat").pack(side='right', padx=5)
+    tk.Button(button_frame, text="Cancelar", command=cancelar, bg=ACCENT_BG, fg=TEXT_COLOR,
+              font=("Arial", 10, "bold"), width=12, relief="flat").pack(side='right', padx=5)
+
+    scrollbar.config(command=rolar)
+    canvas.bind("<Configure>", montar)
+    canvas.bind("<Button-1>", ao_clicar)
+    canvas.bind("<B1-Motion>", ao_arrastar)
+    canvas.bind("<ButtonRelease-1>", ao_soltar)
+    canvas.bind("<MouseWheel>", ao_rolar_mouse)
+    canvas.bind("<Button-4>", ao_rolar_mouse)
+    canvas.bind("<Button-5>", ao_rolar_mouse)
+    window.protocol("WM_DELETE_WINDOW", cancelar)
+    eventos.assinar(tipos_cadastro, on_cadastro_alterado)
+
+# ==================================================
+# IMPORTAÇÃO EM MASSA
+# ==================================================
+def importar_membros():
+    caminho = filedialog.askopenfilename(parent=root, title="Importar membros",
+                                         filetypes=[("CSV ou JSON", "*.csv *.json *.jsonl"), ("Todos", "*.*")])
+    if not caminho:
+        return
+    try:
+        mutacao, relatorio = importacao.importar_membros(caminho, dados)
+    except (OSError, UnicodeDecodeError, csv.Error) as erro:
+        messagebox.showerror("Erro", f"Não foi possível ler o arquivo:\n{erro}", parent=root)
+        return
+    if mutacao["mutacoes"]:
+        registrar(mutacao)
+    messagebox.showinfo("Importação", relatorio.resumo(), parent=root)
 
 # ==================================================
 # EXCLUIR MEMBRO
 # ==================================================
-def excluir_membro(nome):
-    if not nome or not messagebox.askyesno("Confirmar", f"Excluir '{nome}'?", parent=root):
+def excluir_membro(membro):
+    if membro is None or not messagebox.askyesno("Confirmar", f"Excluir '{nome_de(membro)}'?", parent=root):
         return
-    if nome in dados["membros"]:
-        dados["membros"].remove(nome)
-    if nome in dados["restricoes_horarios"]:
-        del dados["restricoes_horarios"][nome]
-    for grupo in dados["grupos"]:
-        if nome in dados["grupos"][grupo]:
-            dados["grupos"][grupo].remove(nome)
-    salvar_dados(dados)
+    nome = nome_de(membro)
+    registrar({"tipo": "membro_excluido", "membro": membro})
     messagebox.showinfo("Sucesso", f"'{nome}' excluído!", parent=root)
-    show_frame(current_tab)
+
+# ==================================================
+# RENOMEAR MEMBRO
+# ==================================================
+def renomear_membro(membro):
+    if membro is None:
+        return
+    nome = simpledialog.askstring("Renomear", "Novo nome:", parent=root, initialvalue=nome_de(membro))
+    if not nome or not nome.strip() or nome.strip() == nome_de(membro):
+        return
+    # Grupos, restrições e sorteios apontam para o id: só o nome muda
+    registrar({"tipo": "membro_renomeado", "membro": membro, "nome": nome.strip()})
 
 # ==================================================
 # REMOVER MEMBRO DO GRUPO
 # ==================================================
 def remover_membro_do_grupo(grupo, membro):
-    if not messagebox.askyesno("Remover", f"Remover '{membro}' do grupo '{grupo}'?", parent=root):
+    if not messagebox.askyesno("Remover", f"Remover '{nome_de(membro)}' do grupo '{grupo}'?", parent=root):
         return
-    if membro in dados["grupos"][grupo]:
-        dados["grupos"][grupo].remove(membro)
-        salvar_dados(dados)
-        messagebox.showinfo("Sucesso", f"'{membro}' removido de '{grupo}'!", parent=root)
+    if indice_grupos.contem(grupo, membro):
+        registrar({"tipo": "membro_grupo_removido", "grupo": grupo, "membro": membro})
+        messagebox.showinfo("Sucesso", f"'{nome_de(membro)}' removido de '{grupo}'!", parent=root)
 
 # ==================================================
 # SORTEIO
 # ==================================================
+def calendario_atual():
+    try:
+        return obter_calendario(inicio_vigilia.get().strip(), fim_vigilia.get().strip(), int(minutos_turno.get()),
+                                int(dias_vigilia.get()), int(turnos_membro.get()))
+    except (ValueError, tk.TclError) as erro:
+        messagebox.showwarning("Aviso", f"Calendário inválido: {erro}", parent=root)
+        return None
+
 def gerar_sorteio():
+    aguardar_historico()
     if not dados["membros"]:
         messagebox.showwarning("Aviso", "Cadastre membros primeiro!", parent=root)
         return
     
-    horarios = get_horarios_sorteio()
-    restritos = set()
-    if dados["sorteios"]:
-        ultimo_sorteio = dados["sorteios"][-1]
-        for h, nome in ultimo_sorteio["resultados"].items():
-            if "00:00" <= h <= "06:00" and nome != "—":
-                restritos.add(nome)
-
-    resultados = {}
-    membros_sorteados = set()
-
-    for h in horarios:
-        hora_cheia = h.split(":")[0] + ":00"
-        candidatos = [m for m in dados["membros"] if m not in membros_sorteados and hora_cheia not in dados["restricoes_horarios"].get(m, [])]
-        if "00:00" <= h <= "06:00":
-            candidatos = [m for m in candidatos if m not in restritos]
-        if not candidatos:
-            resultados[h] = "—"
-        else:
-            escolhido = random.choice(candidatos)
-            resultados[h] = escolhido
-            membros_sorteados.add(escolhido)
+    calendario = calendario_atual()
+    if calendario is None:
+        return
+    modo = motor_sorteio.MODO_OTIMO if cobertura_maxima.get() else motor_sorteio.MODO_GULOSO
+    contadores = contadores_da_janela() if equilibrar_historico.get() else None
+    sorteio = motor_sorteio.gerar_sorteio(dados["membros"], dados["restricoes_horarios"], dados["sorteios"],
+                                          modo=modo, contadores=contadores, calendario=calendario)
+    global just_generated, ultima_otimizacao
+    if otimizar_metas.get():
+        root.config(cursor="watch")
+        root.update_idletasks()
+        try:
+            sorteio["turnos"], relatorio = otimizacao.otimizar_turnos(
+                sorteio["turnos"], list(dados["membros"]), dados["restricoes_horarios"], dados["grupos"],
+                dados["preferencias_horarios"], dados["sorteios"], calendario)
+        finally:
+            root.config(cursor="")
+        ultima_otimizacao = (sorteio["data"], sorteio["turnos"], relatorio)
+    registrar({"tipo": "sorteio_registrado", "sorteio": sorteio})
+    just_generated = True
+    show_frame('historico')
 
-    sorteio = {
-        "data": datetime.now().strftime("%d/%m/%Y %H:%M"),
-        "resultados": resultados
-    }
+def gerar_lote_sorteios():
+    aguardar_historico()
+    if not dados["membros"]:
+        messagebox.showwarning("Aviso", "Cadastre membros primeiro!", parent=root)
+        return
+    calendario = calendario_atual()
+    if calendario is None:
+        return
+    dias = simpledialog.askinteger("Gerar Lote", "Quantos dias seguidos?", parent=root, minvalue=1, maxvalue=366)
+    if not dias:
+        return
+    agora = datetime.now()
+    texto_data = simpledialog.askstring("Gerar Lote", "Data do primeiro sorteio (dd/mm/aaaa):", parent=root,
+                                        initialvalue=agora.strftime("%d/%m/%Y"))
+    if not texto_data:
+        return
+    try:
+        data_inicial = datetime.strptime(texto_data.strip(), "%d/%m/%Y").replace(hour=agora.hour, minute=agora.minute)
+    except ValueError:
+        messagebox.showwarning("Aviso", "Use datas no formato dd/mm/aaaa!", parent=root)
+        return
+    semente = simpledialog.askinteger("Gerar Lote", "Semente (a mesma semente repete o lote):", parent=root,
+                                      initialvalue=random.randrange(1000000))
+    if semente is None:
+        return
 
-    dados["sorteios"].append(sorteio)
-    salvar_dados(dados)
+    modo = motor_sorteio.MODO_OTIMO if cobertura_maxima.get() else motor_sorteio.MODO_GULOSO
+    contadores = contadores_da_janela() if equilibrar_historico.get() else None
+    root.config(cursor="watch")
+    root.update_idletasks()
+    try:
+        lote = lote_sorteios.gerar_lote(dados["membros"], dados["restricoes_horarios"], dados["sorteios"], dias,
+                                        data_inicial, semente, modo=modo, contadores=contadores,
+                                        calendario=calendario)
+    finally:
+        root.config(cursor="")
+    # Um único registro para o lote inteiro
+    registrar({"tipo": "sorteios_registrados", "sorteios": lote})
+    messagebox.showinfo("Sucesso", f"{dias} sorteios gerados (semente {semente})!", parent=root)
     global just_generated
     just_generated = True
     show_frame('historico')
@@ -323,49 +682,268 @@ def gerar_sorteio():
 # EXPORTAÇÃO
 # ==================================================
 def copiar_texto_sorteio(sorteio):
-    texto = f"Sorteio - {sorteio['data']}\n\nGeral:\n"
-    for h, nome in sorteio["resultados"].items():
-        texto += f"{h}: {nome}\n"
-    texto += "\n"
-    for grupo, membros_grupo in dados["grupos"].items():
-        texto += f"{grupo}:\n"
-        for h, nome in sorteio["resultados"].items():
-            if nome in membros_grupo:
-                texto += f"{h}: {nome}\n"
-        texto += "\n"
-    pyperclip.copy(texto)
+    import pyperclip
+
+    pyperclip.copy(exportacao.texto_sorteio(sorteio, indice_grupos, nome_de))
     messagebox.showinfo("Sucesso", "Texto copiado!", parent=root)
 
 def gerar_pdf_sorteio(sorteio):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"Sorteio - {sorteio['data']}", ln=1, align='C')
-    pdf.set_font("Arial", 'B', size=10)
-    pdf.cell(200, 10, txt="Geral:", ln=1)
-    pdf.set_font("Arial", size=10)
-    for h, nome in sorteio["resultados"].items():
-        nome_seguro = nome.replace("—", "-")
-        pdf.cell(200, 10, txt=f"{h}: {nome_seguro}", ln=1)
-    for grupo, membros_grupo in dados["grupos"].items():
-        pdf.set_font("Arial", 'B', size=10)
-        pdf.cell(200, 10, txt=f"{grupo}:", ln=1)
-        pdf.set_font("Arial", size=10)
-        for h, nome in sorteio["resultados"].items():
-            if nome in membros_grupo:
-                nome_seguro = nome.replace("—", "-")
-                pdf.cell(200, 10, txt=f"{h}: {nome_seguro}", ln=1)
-    file_path = f"sorteio_{sorteio['data'].replace('/', '-').replace(':', '-')}.pdf"
-    pdf.output(file_path)
+    file_path = exportacao.pdf_sorteio(sorteio, indice_grupos, nome_de)
     messagebox.showinfo("Sucesso", f"PDF gerado: {file_path}", parent=root)
 
+# ==================================================
+# EXPORTAÇÃO DE PERÍODO
+# ==================================================
+# Os arquivos são gerados numa thread (que reparte o trabalho entre
+# processos); a janela só acompanha o progresso por uma fila.
+def abrir_exportacao_periodo():
+    aguardar_historico()
+    window = tk.Toplevel(root)
+    window.title("Exportar período")
+    window.geometry("420x480")
+    window.configure(bg=PRIMARY_BG)
+
+    periodo_frame = tk.Frame(window, bg=PRIMARY_BG)
+    periodo_frame.pack(fill='x', padx=15, pady=(15, 5))
+    tk.Label(periodo_frame, text="De:", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10)).grid(row=0, column=0, sticky='w')
+    inicio_entry = tk.Entry(periodo_frame, bg=ACCENT_BG, fg=TEXT_COLOR, insertbackground=TEXT_COLOR,
+                            font=("Arial", 10), relief="flat", width=11)
+    inicio_entry.grid(row=0, column=1, padx=5)
+    tk.Label(periodo_frame, text="Até:", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10)).grid(row=0, column=2, sticky='w')
+    fim_entry = tk.Entry(periodo_frame, bg=ACCENT_BG, fg=TEXT_COLOR, insertbackground=TEXT_COLOR,
+                         font=("Arial", 10), relief="flat", width=11)
+    fim_entry.grid(row=0, column=3, padx=5)
+
+    tk.Label(window, text="Grupos (nenhum selecionado = todos os turnos):", bg=PRIMARY_BG, fg=TEXT_COLOR,
+             font=("Arial", 10)).pack(anchor='w', padx=15, pady=(10, 0))
+    grupos_list = tk.Listbox(window, bg=ACCENT_BG, fg=TEXT_COLOR, selectbackground=SELECT_COLOR, height=8,
+                             font=("Arial", 10), relief="flat", selectmode='multiple', exportselection=False)
+    grupos_list.pack(fill='x', padx=15, pady=5)
+    nomes_grupos = list(dados["grupos"])
+    for grupo in nomes_grupos:
+        grupos_list.insert(tk.END, grupo)
+
+    formatos_frame = tk.Frame(window, bg=PRIMARY_BG)
+    formatos_frame.pack(fill='x', padx=15, pady=5)
+    formatos = {}
+    for formato in exportacao_periodo.FORMATOS:
+        formatos[formato] = tk.BooleanVar(value=True)
+        tk.Checkbutton(formatos_frame, text=formato.upper(), variable=formatos[formato], bg=PRIMARY_BG,
+                       fg=TEXT_COLOR, selectcolor=ACCENT_BG, activebackground=PRIMARY_BG,
+                       activeforeground=TEXT_COLOR, font=("Arial", 10)).pack(side='left', padx=(0, 10))
+
+    barra = ttk.Progressbar(window, mode='determinate')
+    barra.pack(fill='x', padx=15, pady=(15, 5))
+    status = tk.Label(window, text="", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10))
+    status.pack(anchor='w', padx=15)
+
+    button_frame = tk.Frame(window, bg=PRIMARY_BG)
+    button_frame.pack(fill='x', padx=15, pady=15)
+
+    fila = queue.Queue()
+    cancelado = threading.Event()
+    tarefa = None
+
+    def exportar():
+        nonlocal tarefa
+        try:
+            inicio = ler_data_filtro(inicio_entry.get())
+            fim = ler_data_filtro(fim_entry.get(), fim_do_dia=True)
+        except ValueError:
+            messagebox.showwarning("Aviso", "Use datas no formato dd/mm/aaaa!", parent=window)
+            return
+        escolhidos = tuple(f for f in exportacao_periodo.FORMATOS if formatos[f].get())
+        if not escolhidos:
+            messagebox.showwarning("Aviso", "Escolha ao menos um formato!", parent=window)
+            return
+        total = armazenamento_dados.contar_sorteios(inicio, fim)
+        if not total:
+            messagebox.showwarning("Aviso", "Nenhum sorteio no período!", parent=window)
+            return
+        pasta = filedialog.askdirectory(title="Pasta de destino", parent=window)
+        if not pasta:
+            return
+
+        # Tudo o que a thread lê de `dados` é copiado aqui, na thread da interface
+        cabecalhos = armazenamento_dados.cabecalhos_sorteios(0, total, inicio, fim)
+        nomes = {**dados["excluidos"], **dados["membros"]}
+        grupos_por_membro = exportacao_periodo.mapa_grupos(dados["grupos"])
+        grupos = [nomes_grupos[i] for i in grupos_list.curselection()]
+        base = exportacao_periodo.nome_base(inicio, fim)
+
+        def trabalhar():
+            try:
+                caminhos = exportacao_periodo.exportar_periodo(
+                    armazenamento_dados, cabecalhos, nomes, grupos_por_membro, pasta, base, escolhidos, grupos,
+                    progresso=lambda feitas, total: fila.put(("progresso", (feitas, total))),
+                    cancelado=cancelado)
+                fila.put(("fim", caminhos))
+            except Exception as erro:
+                fila.put(("erro", erro))
+
+        cancelado.clear()
+        barra.config(value=0, maximum=1)
+        status.config(text=f"Exportando {total} sorteios...")
+        exportar_button.config(state='disabled')
+        tarefa = threading.Thread(target=trabalhar, name="exportacao", daemon=True)
+        tarefa.start()
+        acompanhar()
+
+    def acompanhar():
+        nonlocal tarefa
+        if not window.winfo_exists():
+            return
+        while True:
+            try:
+                tipo, valor = fila.get_nowait()
+            except queue.Empty:
+                break
+            if tipo == "progresso":
+                barra.config(value=valor[0], maximum=valor[1])
+                status.config(text=f"{valor[0]} de {valor[1]} partes prontas")
+                continue
+            tarefa = None
+            exportar_button.config(state='normal')
+            if tipo == "erro":
+                status.config(text="")
+                messagebox.showerror("Erro", f"Falha na exportação: {valor}", parent=window)
+            elif valor is None:
+                status.config(text="Exportação cancelada.")
+            else:
+                status.config(text="Exportação concluída.")
+                messagebox.showinfo("Sucesso", "Arquivos gerados:\n" + "\n".join(valor), parent=window)
+            return
+        window.after(100, acompanhar)
+
+    def cancelar():
+        if tarefa is not None:
+            cancelado.set()
+            status.config(text="Cancelando...")
+        else:
+            window.destroy()
+
+    def fechar():
+        # Fechar no meio cancela; a thread apaga o que ficou pela metade
+        cancelado.set()
+        window.destroy()
+
+    exportar_button = tk.Button(button_frame, text="Exportar", command=exportar, bg=HIGHLIGHT, fg=PRIMARY_BG,
+                                font=("Arial", 12, "bold"), width=12, relief="flat")
+    exportar_button.pack(side='right', padx=5)
+    tk.Button(button_frame, text="Cancelar", command=cancelar, bg=ACCENT_BG, fg=TEXT_COLOR,
+              font=("Arial", 10, "bold"), width=12, relief="flat").pack(side='right', padx=5)
+    window.protocol("WM_DELETE_WINDOW", fechar)
+
+# ==================================================
+# SUBSTITUIR MEMBRO NUM SORTEIO
+# ==================================================
+# Alguém desistiu depois do sorteio: só os turnos dessa pessoa são
+# preenchidos de novo (motor_sorteio.reparar_turnos) e o histórico guarda
+# apenas os turnos alterados.
+def posicao_do_sorteio(sorteio):
+    for posicao in range(len(dados["sorteios"]) - 1, -1, -1):
+        atual = dados["sorteios"][posicao]
+        if atual is sorteio or (atual["data"] == sorteio["data"] and atual["turnos"] == sorteio["turnos"]):
+            return posicao
+    return None
+
+def abrir_reparo_sorteio(sorteio):
+    aguardar_historico()
+    posicao = posicao_do_sorteio(sorteio)
+    if posicao is None:
+        messagebox.showwarning("Aviso", "Este sorteio está no arquivo e não pode mais ser alterado.", parent=root)
+        return
+    sorteio = dados["sorteios"][posicao]
+    escalados = {}
+    for membro in sorteio["turnos"]:
+        if membro is not None:
+            escalados[membro] = escalados.get(membro, 0) + 1
+    if not escalados:
+        messagebox.showwarning("Aviso", "Ninguém foi sorteado neste sorteio.", parent=root)
+        return
+    ordem = sorted(escalados, key=lambda m: nome_de(m).casefold())
+
+    window = tk.Toplevel(root)
+    window.title("Substituir membro")
+    window.geometry("380x460")
+    window.configure(bg=PRIMARY_BG)
+    tk.Label(window, text=f"Sorteio de {sorteio['data']}\nQuem não vai poder participar?", bg=PRIMARY_BG,
+             fg=TEXT_COLOR, font=("Arial", 11), justify='left').pack(anchor='w', padx=15, pady=(15, 5))
+    membros_list = tk.Listbox(window, bg=ACCENT_BG, fg=TEXT_COLOR, selectbackground=SELECT_COLOR, height=16,
+                              font=("Arial", 10), relief="flat", exportselection=False)
+    membros_list.pack(fill='both', expand=True, padx=15, pady=5)
+    for membro in ordem:
+        vezes = escalados[membro]
+        membros_list.insert(tk.END, f"{nome_de(membro)} ({vezes} turno{'s' if vezes > 1 else ''})")
+
+    def substituir():
+        sel = membros_list.curselection()
+        if not sel:
+            messagebox.showwarning("Aviso", "Selecione um membro!", parent=window)
+            return
+        membro = ordem[sel[0]]
+        contadores = contadores_da_janela() if equilibrar_historico.get() else None
+        alteracoes = motor_sorteio.reparar_turnos(dados["sorteios"], posicao, membro, list(dados["membros"]),
+                                                  dados["restricoes_horarios"], contadores=contadores)
+        saiu = [slot for slot, antes, _ in alteracoes if antes == membro]
+        vagos = sum(1 for slot, _, depois in alteracoes if depois is None)
+        movidos = {depois for slot, antes, depois in alteracoes if antes is not None and antes != membro}
+        resumo = [f"{nome_de(membro)} sai de {len(saiu)} turno(s)."]
+        if movidos:
+            resumo.append(f"{len(movidos)} membro(s) trocam de horário para abrir espaço.")
+        if vagos:
+            resumo.append(f"{vagos} turno(s) ficam vagos: ninguém disponível pode nesse horário.")
+        resumo.append("\n".join(f"{rotulo}: {nome_de(antes)} -> {nome_de(depois)}" for rotulo, antes, depois in
+                                 ((calendario_do_sorteio(sorteio).rotulos[slot], antes, depois)
+                                  for slot, antes, depois in alteracoes)))
+        if not messagebox.askyesno("Confirmar", "\n\n".join(resumo), parent=window):
+            return
+        registrar({"tipo": "sorteio_reparado", "data": sorteio["data"], "membro": membro,
+                   "alteracoes": [[slot, antes, depois] for slot, antes, depois in alteracoes]})
+        window.destroy()
+
+    button_frame = tk.Frame(window, bg=PRIMARY_BG)
+    button_frame.pack(fill='x', padx=15, pady=15)
+    tk.Button(button_frame, text="Substituir", command=substituir, bg=HIGHLIGHT, fg=PRIMARY_BG,
+              font=("Arial", 12, "bold"), width=12, relief="flat").pack(side='right', padx=5)
+    tk.Button(button_frame, text="Cancelar", command=window.destroy, bg=ACCENT_BG, fg=TEXT_COLOR,
+              font=("Arial", 10, "bold"), width=12, relief="flat").pack(side='right', padx=5)
+
 # ==================================================
 # EXIBIÇÃO DO SORTEIO
 # ==================================================
+NOMES_METAS = {"espalhamento": "Grupos concentrados", "vizinhos": "Mesmo grupo em seguida",
+               "preferencias": "Fora do horário preferido"}
+
+def mostrar_pontuacao(sorteio, frame):
+    # Penalidades das metas com os grupos e preferências de agora (menor é
+    # melhor); logo depois de otimizar, também como estavam antes
+    pontos = otimizacao.pontuar_turnos(sorteio["turnos"], calendario_do_sorteio(sorteio), dados["grupos"],
+                                       dados["preferencias_horarios"])
+    relatorio = None
+    if ultima_otimizacao and ultima_otimizacao[:2] == (sorteio["data"], sorteio["turnos"]):
+        relatorio = ultima_otimizacao[2]
+    painel = tk.Frame(frame, bg=ACCENT_BG)
+    painel.pack(side='right', fill='y', padx=(0, 10), pady=10)
+    tk.Label(painel, text="Metas (menor é melhor)", font=("Arial", 12, "bold"), bg=ACCENT_BG,
+             fg=HIGHLIGHT).pack(anchor='w', padx=10, pady=(10, 5))
+    for termo in (*otimizacao.TERMOS, "total"):
+        texto = f"{NOMES_METAS.get(termo, 'Total')}: {round(pontos[termo], 1):g}"
+        if relatorio:
+            texto += f" (antes {round(relatorio['antes'][termo], 1):g})"
+        fonte = ("Arial", 10, "bold") if termo == "total" else ("Arial", 10)
+        tk.Label(painel, text=texto, bg=ACCENT_BG, fg=TEXT_COLOR, font=fonte).pack(anchor='w', padx=10)
+    if relatorio:
+        tk.Label(painel, text=f"{relatorio['iteracoes']} tentativas em {relatorio['segundos']:.1f} s",
+                 bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 9)).pack(anchor='w', padx=10, pady=(5, 10))
+
+@medido("interface.mostrar_sorteio", lambda sorteio, frame: {"turnos": len(sorteio["turnos"])})
 def show_sorteio_in_frame(sorteio, frame):
     for w in frame.winfo_children():
         w.destroy()
 
+    mostrar_pontuacao(sorteio, frame)
+
     notebook = ttk.Notebook(frame, style="Custom.TNotebook")
     notebook.pack(fill="both", expand=True, padx=10, pady=10)
 
@@ -379,10 +957,11 @@ def show_sorteio_in_frame(sorteio, frame):
     tree_geral.column("Membro", width=280)
     tree_geral.pack(fill="both", expand=True, padx=10, pady=10)
 
-    for h, nome in sorteio["resultados"].items():
-        tree_geral.insert("", "end", values=(h, nome))
+    turnos_sorteio = list(motor_sorteio.turnos_rotulados(sorteio))
+    for h, membro in turnos_sorteio:
+        tree_geral.insert("", "end", values=(h, nome_de(membro)))
 
-    for grupo, membros_grupo in dados["grupos"].items():
+    for grupo, turnos in indice_grupos.rotear(turnos_sorteio).items():
         grupo_frame = tk.Frame(notebook, bg=PRIMARY_BG)
         notebook.add(grupo_frame, text=f"{grupo}")
 
@@ -393,9 +972,8 @@ def show_sorteio_in_frame(sorteio, frame):
         tree_grupo.column("Membro", width=280)
         tree_grupo.pack(fill="both", expand=True, padx=10, pady=10)
 
-        for h, nome in sorteio["resultados"].items():
-            if nome in membros_grupo:
-                tree_grupo.insert("", "end", values=(h, nome))
+        for h, membro in turnos:
+            tree_grupo.insert("", "end", values=(h, nome_de(membro)))
 
     buttons_frame = tk.Frame(frame, bg=PRIMARY_BG)
     buttons_frame.pack(fill='x', pady=15)
@@ -404,29 +982,34 @@ def show_sorteio_in_frame(sorteio, frame):
               fg=PRIMARY_BG, font=("Arial", 10, "bold"), width=12, relief="flat").pack(side='left', padx=5)
     tk.Button(buttons_frame, text="Baixar PDF", command=lambda: gerar_pdf_sorteio(sorteio), bg=HIGHLIGHT,
               fg=PRIMARY_BG, font=("Arial", 10, "bold"), width=12, relief="flat").pack(side='left', padx=5)
+    tk.Button(buttons_frame, text="Substituir membro", command=lambda: abrir_reparo_sorteio(sorteio), bg=ACCENT_BG,
+              fg=TEXT_COLOR, font=("Arial", 10, "bold"), width=16, relief="flat").pack(side='left', padx=5)
 
 # ==================================================
 # INTERFACE
 # ==================================================
+@medido("interface.show_frame", lambda tab: {"aba": tab})
 def show_frame(tab):
+    # Cada aba é montada uma vez e depois só trocada de lugar; as mudanças
+    # chegam às abas pelos eventos das mutações
     global current_tab
+    if tab not in abas:
+        frame = tk.Frame(main_frame, bg=PRIMARY_BG)
+        abas[tab] = (frame, CONTEUDOS[tab](frame))
+    if current_tab in abas and current_tab != tab:
+        abas[current_tab][0].pack_forget()
     current_tab = tab
-    for w in main_frame.winfo_children():
-        w.destroy()
+    frame, ao_mostrar = abas[tab]
+    frame.pack(fill='both', expand=True)
+    if ao_mostrar:
+        ao_mostrar()
 
-    if tab == 'home':
-        home_content()
-    elif tab == 'membros':
-        membros_content()
-    elif tab == 'historico':
-        historico_content()
-
-def home_content():
-    label = tk.Label(main_frame, text="Sorteio de Oração", font=("Arial", 24, "bold"), bg=PRIMARY_BG,
+def home_content(frame):
+    label = tk.Label(frame, text="Sorteio de Oração", font=("Arial", 24, "bold"), bg=PRIMARY_BG,
                      fg=HIGHLIGHT, pady=20)
     label.pack()
 
-    membros_frame = tk.Frame(main_frame, bg=PRIMARY_BG)
+    membros_frame = tk.Frame(frame, bg=PRIMARY_BG)
     membros_frame.pack(fill='x', padx=20, pady=10)
 
     tk.Label(membros_frame, text="Membros", font=("Arial", 16, "bold"), bg=PRIMARY_BG, fg=TEXT_COLOR).pack()
@@ -442,27 +1025,53 @@ def home_content():
                               width=50, height=20, font=("Arial", 10), relief="flat")
     membros_list.pack(fill='both', expand=True, padx=5, pady=5)
 
+    exibidos = []   # ids na ordem das linhas
+    atualizacao_agendada = False
+
     def update_membros_list(query=''):
-        membros_list.delete(0, tk.END)
+        nonlocal exibidos, atualizacao_agendada
+        atualizacao_agendada = False
         actual_query = query if query != "Buscar membros..." else ""
-        for m in dados["membros"]:
-            if actual_query.lower() in m.lower() or not actual_query:
-                membros_list.insert(tk.END, m)
+        novos = indice_busca.buscar(actual_query)
+        atualizar_listbox(membros_list, exibidos, novos, indice_busca.ordem, nome_de)
+        exibidos = novos
+
+    def on_membros_alterados(mutacao):
+        # Uma importação publica milhares de eventos: junta todos num único diff
+        nonlocal atualizacao_agendada
+        if not atualizacao_agendada:
+            atualizacao_agendada = True
+            root.after_idle(lambda: update_membros_list(search.get()))
+
+    def on_membro_renomeado(mutacao):
+        # A linha troca de texto no lugar; a busca atual pode deixar de achá-lo
+        if mutacao["membro"] in exibidos:
+            idx = exibidos.index(mutacao["membro"])
+            membros_list.delete(idx)
+            membros_list.insert(idx, mutacao["nome"])
+        on_membros_alterados(mutacao)
 
     update_membros_list(search.get())
     search.bind('<KeyRelease>', lambda e: update_membros_list(search.get()))
+    eventos.assinar(("membro_adicionado", "membro_excluido"), on_membros_alterados)
+    eventos.assinar(("membro_renomeado",), on_membro_renomeado)
 
     membros_menu = tk.Menu(root, tearoff=0, bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 10))
     membros_menu.add_command(label="Adicionar a Grupo", command=lambda: adicionar_membro_ao_grupo_specific(get_selected_member()))
     membros_menu.add_command(label="Gerenciar Restrições", command=lambda: gerenciar_restricoes(get_selected_member()))
+    membros_menu.add_command(label="Horários Preferidos",
+                             command=lambda: gerenciar_preferencias(get_selected_member()))
+    membros_menu.add_command(label="Renomear", command=lambda: renomear_membro(get_selected_member()))
     membros_menu.add_separator()
     membros_menu.add_command(label="Excluir", command=lambda: excluir_membro(get_selected_member()))
 
     def get_selected_member():
         sel = membros_list.curselection()
-        return membros_list.get(sel[0]) if sel else None
+        return exibidos[sel[0]] if sel else None
 
     def show_membros_menu(e):
+        if not historico_carregado:
+            return
         try:
             idx = membros_list.nearest(e.y)
             if idx >= 0:
@@ -476,15 +1085,44 @@ def home_content():
     membros_list.bind("<Button-3>", show_membros_menu)
     membros_list.bind("<Double-1>", show_membros_menu)
 
-    tk.Button(main_frame, text="Gerar Sorteio", command=gerar_sorteio, bg=HIGHLIGHT, fg=PRIMARY_BG,
-              font=("Arial", 12, "bold"), width=15, relief="flat").pack(pady=20)
+    botao_edicao(tk.Button(frame, text="Gerar Sorteio", command=gerar_sorteio, bg=HIGHLIGHT, fg=PRIMARY_BG,
+                           font=("Arial", 12, "bold"), width=15, relief="flat")).pack(pady=20)
+    tk.Checkbutton(frame, text="Cobertura máxima (preenche o maior número de horários)", variable=cobertura_maxima,
+                   bg=PRIMARY_BG, fg=TEXT_COLOR, selectcolor=SELECT_COLOR, activebackground=ACCENT_BG,
+                   activeforeground=TEXT_COLOR, font=("Arial", 10)).pack()
+    tk.Checkbutton(frame, text="Otimizar metas (grupos espalhados e horários preferidos)", variable=otimizar_metas,
+                   bg=PRIMARY_BG, fg=TEXT_COLOR, selectcolor=SELECT_COLOR, activebackground=ACCENT_BG,
+                   activeforeground=TEXT_COLOR, font=("Arial", 10)).pack()
+    botao_edicao(tk.Button(frame, text="Gerar Lote", command=gerar_lote_sorteios, bg=ACCENT_BG, fg=TEXT_COLOR,
+                           font=("Arial", 10, "bold"), width=15, relief="flat")).pack(pady=5)
+
+    equidade_frame = tk.Frame(frame, bg=PRIMARY_BG)
+    equidade_frame.pack(pady=5)
+    tk.Checkbutton(equidade_frame, text="Equilibrar pelo histórico dos últimos", variable=equilibrar_historico,
+                   bg=PRIMARY_BG, fg=TEXT_COLOR, selectcolor=SELECT_COLOR, activebackground=ACCENT_BG,
+                   activeforeground=TEXT_COLOR, font=("Arial", 10)).pack(side='left')
+    tk.Spinbox(equidade_frame, from_=1, to=365, textvariable=janela_equidade, width=5, bg=ACCENT_BG, fg=TEXT_COLOR,
+               insertbackground=TEXT_COLOR, relief="flat", font=("Arial", 10)).pack(side='left', padx=5)
+    tk.Label(equidade_frame, text="sorteios", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10)).pack(side='left')
+
+    # === CALENDÁRIO DA VIGÍLIA ===
+    calendario_frame = tk.Frame(frame, bg=PRIMARY_BG)
+    calendario_frame.pack(pady=5)
+    campos = [("Vigília das", inicio_vigilia, 6), ("às", fim_vigilia, 6), ("em turnos de", minutos_turno, 4),
+              ("min, por", dias_vigilia, 3), ("dias, até", turnos_membro, 3), ("turnos por membro", None, 0)]
+    for texto, variavel, largura in campos:
+        tk.Label(calendario_frame, text=texto, bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10)).pack(side='left')
+        if variavel is not None:
+            tk.Entry(calendario_frame, textvariable=variavel, width=largura, bg=ACCENT_BG, fg=TEXT_COLOR,
+                     insertbackground=TEXT_COLOR, relief="flat", font=("Arial", 10)).pack(side='left', padx=5)
+    return None
 
 # ==================================================
 # ABA MEMBROS - SELEÇÃO INDEPENDENTE COM GRUPO SALVO
 # ==================================================
-def membros_content():
+def membros_content(frame):
     global selected_group
-    left = tk.Frame(main_frame, bg=PRIMARY_BG)
+    left = tk.Frame(frame, bg=PRIMARY_BG)
     left.pack(side='left', fill='y', padx=20, pady=10)
 
     tk.Label(left, text="Membros", font=("Arial", 16, "bold"), bg=PRIMARY_BG, fg=TEXT_COLOR).pack()
@@ -493,18 +1131,24 @@ def membros_content():
                               width=30, height=20, font=("Arial", 10), relief="flat", selectmode='single')
     membros_list.pack(fill='y', expand=True)
 
-    def update_membros_list():
-        membros_list.delete(0, tk.END)
-        for m in dados["membros"]:
-            membros_list.insert(tk.END, m)
-
-    update_membros_list()
-
-    tk.Button(left, text="Adicionar", command=adicionar_membro, bg=HIGHLIGHT, fg=PRIMARY_BG,
-              font=("Arial", 12, "bold"), width=15, relief="flat").pack(pady=5)
+    # ids na ordem das linhas de cada lista
+    linhas_membros = list(dados["membros"])
+    linhas_grupo = []
+    for nome in dados["membros"].values():
+        membros_list.insert(tk.END, nome)
+
+    botao_edicao(tk.Button(left, text="Adicionar", command=adicionar_membro, bg=HIGHLIGHT, fg=PRIMARY_BG,
+                           font=("Arial", 12, "bold"), width=15, relief="flat")).pack(pady=5)
+    botao_edicao(tk.Button(left, text="Importar", command=importar_membros, bg=ACCENT_BG, fg=TEXT_COLOR,
+                           font=("Arial", 10, "bold"), width=15, relief="flat")).pack(pady=5)
+    botao_edicao(tk.Button(left, text="Disponibilidade", command=abrir_grade_restricoes, bg=ACCENT_BG,
+                           fg=TEXT_COLOR, font=("Arial", 10, "bold"), width=15, relief="flat")).pack(pady=5)
+    botao_edicao(tk.Button(left, text="Preferências", command=lambda: abrir_grade_restricoes(preferencias=True),
+                           bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 10, "bold"), width=15,
+                           relief="flat")).pack(pady=5)
 
     # === DIREITA ===
-    right = tk.Frame(main_frame, bg=PRIMARY_BG)
+    right = tk.Frame(frame, bg=PRIMARY_BG)
     right.pack(side='left', fill='both', expand=True, padx=20, pady=10)
 
     tk.Label(right, text="Grupos", font=("Arial", 16, "bold"), bg=PRIMARY_BG, fg=TEXT_COLOR).pack(anchor='w')
@@ -524,18 +1168,40 @@ def membros_content():
 
     # === VARIÁVEL GLOBAL PARA GRUPO SELECIONADO ===
     selected_group = None
+    # Mesma ordem das linhas de grupos_list
+    ordem_grupos = list(dados["grupos"])
+
+    def texto_grupo(g):
+        return f"{g} ({len(dados['grupos'][g])} membros)"
 
     # === FUNÇÕES DE ATUALIZAÇÃO ===
-    def update_grupos_list():
-        grupos_list.delete(0, tk.END)
-        for g, membros in dados["grupos"].items():
-            grupos_list.insert(tk.END, f"{g} ({len(membros)} membros)")
+    def atualizar_linha_grupo(idx):
+        texto = texto_grupo(ordem_grupos[idx])
+        if grupos_list.get(idx) != texto:
+            selecionado = idx in grupos_list.curselection()
+            grupos_list.delete(idx)
+            grupos_list.insert(idx, texto)
+            if selecionado:
+                grupos_list.selection_set(idx)
 
     def update_membros_grupo_list():
         membros_grupo_list.delete(0, tk.END)
+        linhas_grupo.clear()
         if selected_group and selected_group in dados["grupos"]:
             for m in dados["grupos"][selected_group]:
-                membros_grupo_list.insert(tk.END, m)
+                linhas_grupo.append(m)
+                membros_grupo_list.insert(tk.END, nome_de(m))
+
+    def trocar_linha(listbox, linhas, membro, texto=None):
+        # Apaga a linha do membro ou, com texto, reescreve no mesmo lugar
+        if membro not in linhas:
+            return
+        idx = linhas.index(membro)
+        listbox.delete(idx)
+        if texto is None:
+            del linhas[idx]
+        else:
+            listbox.insert(idx, texto)
 
     def on_grupo_select(e=None):
         global selected_group
@@ -543,12 +1209,50 @@ def membros_content():
         if sel:
             idx = sel[0]
             grupos_list.selection_set(idx)  # Mantém grupo selecionado
-            selected_group = list(dados["grupos"].keys())[idx]
+            selected_group = ordem_grupos[idx]
             update_membros_grupo_list()
             membros_grupo_list.selection_clear(0, tk.END)  # Limpa seleção de membro ao mudar grupo
 
     grupos_list.bind('<<ListboxSelect>>', on_grupo_select)
-    update_grupos_list()
+    for g in ordem_grupos:
+        grupos_list.insert(tk.END, texto_grupo(g))
+
+    # === EVENTOS: SÓ AS LINHAS AFETADAS ===
+    def on_membro_adicionado(mutacao):
+        linhas_membros.append(mutacao["membro"])
+        membros_list.insert(tk.END, mutacao["nome"])
+
+    def on_membro_excluido(mutacao):
+        trocar_linha(membros_list, linhas_membros, mutacao["membro"])
+        # O membro saiu de todos os grupos: só mudam as contagens diferentes
+        for idx in range(len(ordem_grupos)):
+            atualizar_linha_grupo(idx)
+        trocar_linha(membros_grupo_list, linhas_grupo, mutacao["membro"])
+
+    def on_membro_renomeado(mutacao):
+        trocar_linha(membros_list, linhas_membros, mutacao["membro"], mutacao["nome"])
+        trocar_linha(membros_grupo_list, linhas_grupo, mutacao["membro"], mutacao["nome"])
+
+    def on_grupo_criado(mutacao):
+        ordem_grupos.append(mutacao["grupo"])
+        grupos_list.insert(tk.END, texto_grupo(mutacao["grupo"]))
+
+    def on_membro_grupo_alterado(mutacao):
+        grupo, membro = mutacao["grupo"], mutacao["membro"]
+        atualizar_linha_grupo(ordem_grupos.index(grupo))
+        if grupo != selected_group:
+            return
+        if mutacao["tipo"] == "membro_grupo_adicionado":
+            linhas_grupo.append(membro)
+            membros_grupo_list.insert(tk.END, nome_de(membro))
+        else:
+            trocar_linha(membros_grupo_list, linhas_grupo, membro)
+
+    eventos.assinar(("membro_adicionado",), on_membro_adicionado)
+    eventos.assinar(("membro_excluido",), on_membro_excluido)
+    eventos.assinar(("membro_renomeado",), on_membro_renomeado)
+    eventos.assinar(("grupo_criado",), on_grupo_criado)
+    eventos.assinar(("membro_grupo_adicionado", "membro_grupo_removido"), on_membro_grupo_alterado)
 
     # === SELEÇÃO DE MEMBRO SEM DESSELECIONAR GRUPO ===
     def on_membro_click(e):
@@ -563,8 +1267,8 @@ def membros_content():
     membros_grupo_list.bind('<Button-1>', on_membro_click)
 
     # === CRIAR GRUPO ===
-    tk.Button(right, text="Criar Grupo", command=lambda: [adicionar_grupo(), update_grupos_list()],
-              bg=HIGHLIGHT, fg=PRIMARY_BG, font=("Arial", 12, "bold"), width=15, relief="flat").pack(pady=5, anchor='w')
+    botao_edicao(tk.Button(right, text="Criar Grupo", command=adicionar_grupo, bg=HIGHLIGHT, fg=PRIMARY_BG,
+                           font=("Arial", 12, "bold"), width=15, relief="flat")).pack(pady=5, anchor='w')
 
     # === REMOVER DO GRUPO (USANDO selected_group) ===
     def remover_do_grupo():
@@ -577,33 +1281,88 @@ def membros_content():
             messagebox.showwarning("Aviso", "Selecione um membro do grupo!", parent=root)
             return
 
-        membro = membros_grupo_list.get(sel_membro[0])
-        remover_membro_do_grupo(selected_group, membro)
-        update_membros_grupo_list()
-        update_grupos_list()
+        remover_membro_do_grupo(selected_group, linhas_grupo[sel_membro[0]])
 
-    tk.Button(right, text="Remover do Grupo", command=remover_do_grupo,
-              bg="#C0392B", fg=TEXT_COLOR, font=("Arial", 10, "bold"), width=18, relief="flat").pack(pady=5, anchor='w')
+    botao_edicao(tk.Button(right, text="Remover do Grupo", command=remover_do_grupo, bg="#C0392B", fg=TEXT_COLOR,
+                           font=("Arial", 10, "bold"), width=18, relief="flat")).pack(pady=5, anchor='w')
+    return None
 
-def historico_content():
-    if not dados["sorteios"]:
-        label = tk.Label(main_frame, text="Nenhum sorteio encontrado.", font=("Arial", 14), bg=PRIMARY_BG, fg=TEXT_COLOR)
-        label.pack(pady=50)
-        return
+def ler_data_filtro(texto, fim_do_dia=False):
+    texto = texto.strip()
+    if not texto:
+        return None
+    data = datetime.strptime(texto, "%d/%m/%Y")
+    return data.replace(hour=23, minute=59) if fim_do_dia else data
 
-    left = tk.Frame(main_frame, bg=PRIMARY_BG)
+def historico_content(frame):
+    aguardar_historico()
+    vazio_label = tk.Label(frame, text="Nenhum sorteio encontrado.", font=("Arial", 14), bg=PRIMARY_BG, fg=TEXT_COLOR)
+    conteudo = tk.Frame(frame, bg=PRIMARY_BG)
+
+    left = tk.Frame(conteudo, bg=PRIMARY_BG)
     left.pack(side='left', fill='y', padx=20, pady=10)
 
     tk.Label(left, text="Sorteios", font=("Arial", 16, "bold"), bg=PRIMARY_BG, fg=TEXT_COLOR).pack()
 
+    # === FILTRO POR PERÍODO ===
+    filtro_frame = tk.Frame(left, bg=PRIMARY_BG)
+    filtro_frame.pack(fill='x', pady=5)
+
+    tk.Label(filtro_frame, text="De:", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10)).grid(row=0, column=0, sticky='w')
+    inicio_entry = tk.Entry(filtro_frame, bg=ACCENT_BG, fg=TEXT_COLOR, insertbackground=TEXT_COLOR,
+                            font=("Arial", 10), relief="flat", width=11)
+    inicio_entry.grid(row=0, column=1, padx=5)
+    tk.Label(filtro_frame, text="Até:", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10)).grid(row=1, column=0, sticky='w')
+    fim_entry = tk.Entry(filtro_frame, bg=ACCENT_BG, fg=TEXT_COLOR, insertbackground=TEXT_COLOR,
+                         font=("Arial", 10), relief="flat", width=11)
+    fim_entry.grid(row=1, column=1, padx=5, pady=(5, 0))
+
     hist_list = tk.Listbox(left, bg=ACCENT_BG, fg=TEXT_COLOR, selectbackground=SELECT_COLOR,
                            width=30, height=20, font=("Arial", 10), relief="flat")
     hist_list.pack(fill='y', expand=True)
 
-    for s in dados["sorteios"]:
-        hist_list.insert(tk.END, s["data"])
+    paginador = None
+    filtro = (None, None)
+
+    def mostrar_conteudo():
+        # Sem nenhum sorteio gravado fica só o aviso
+        if dados["sorteios"]:
+            vazio_label.pack_forget()
+            conteudo.pack(fill='both', expand=True)
+        else:
+            conteudo.pack_forget()
+            vazio_label.pack(pady=50)
+
+    def carregar_mais():
+        for cabecalho in paginador.proxima_pagina():
+            hist_list.insert(tk.END, cabecalho["data"])
+        mais_button.config(state='normal' if paginador.tem_mais() else 'disabled')
+
+    def recarregar():
+        nonlocal paginador
+        paginador = PaginadorHistorico(armazenamento_dados, *filtro)
+        hist_list.delete(0, tk.END)
+        carregar_mais()
+
+    def aplicar_filtro():
+        nonlocal filtro
+        try:
+            filtro = (ler_data_filtro(inicio_entry.get()), ler_data_filtro(fim_entry.get(), fim_do_dia=True))
+        except ValueError:
+            messagebox.showwarning("Aviso", "Use datas no formato dd/mm/aaaa!", parent=root)
+            return
+        recarregar()
+
+    tk.Button(filtro_frame, text="Filtrar", command=aplicar_filtro, bg=HIGHLIGHT, fg=PRIMARY_BG,
+              font=("Arial", 10, "bold"), relief="flat").grid(row=0, column=2, rowspan=2, padx=5, sticky='ns')
+
+    mais_button = tk.Button(left, text="Carregar mais", command=lambda: carregar_mais(), bg=ACCENT_BG, fg=TEXT_COLOR,
+                            font=("Arial", 10), relief="flat")
+    mais_button.pack(fill='x', pady=5)
+    tk.Button(left, text="Exportar período", command=abrir_exportacao_periodo, bg=HIGHLIGHT, fg=PRIMARY_BG,
+              font=("Arial", 10, "bold"), relief="flat").pack(fill='x')
 
-    right = tk.Frame(main_frame, bg=PRIMARY_BG)
+    right = tk.Frame(conteudo, bg=PRIMARY_BG)
     right.pack(side='left', fill='both', expand=True, padx=20, pady=10)
 
     tk.Label(right, text="Detalhes", font=("Arial", 16, "bold"), bg=PRIMARY_BG, fg=TEXT_COLOR).pack()
@@ -614,52 +1373,262 @@ def historico_content():
     def on_select(e=None):
         sel = hist_list.curselection()
         if sel:
-            idx = sel[0]
-            sorteio = dados["sorteios"][idx]
+            cabecalho = paginador.carregados[sel[0]]
+            sorteio = cabecalho.get("sorteio") or armazenamento_dados.carregar_sorteio(cabecalho["id"])
             show_sorteio_in_frame(sorteio, tree_frame)
 
     hist_list.bind('<<ListboxSelect>>', on_select)
 
-    global just_generated
-    if just_generated:
-        hist_list.select_set(len(dados["sorteios"]) - 1)
+    def on_sorteios_registrados(mutacao):
+        novos = [mutacao["sorteio"]] if mutacao["tipo"] == "sorteio_registrado" else mutacao["sorteios"]
+        for sorteio in novos:
+            if not paginador.no_periodo(sorteio["data"]):
+                continue
+            if not paginador.sorteio_adicionado(sorteio):
+                # Fora de ordem: relê a primeira página
+                recarregar()
+                return
+            hist_list.insert(0, sorteio["data"])
+
+    eventos.assinar(("sorteio_registrado", "sorteios_registrados"), on_sorteios_registrados)
+
+    def on_sorteio_reparado(mutacao):
+        # Os detalhes abertos são refeitos com o sorteio reparado
+        paginador.sorteio_reparado(mutacao)
         on_select()
-        just_generated = False
+
+    eventos.assinar(("sorteio_reparado",), on_sorteio_reparado)
+    recarregar()
+
+    def ao_mostrar():
+        global just_generated
+        nonlocal filtro
+        mostrar_conteudo()
+        if just_generated:
+            if filtro != (None, None):
+                inicio_entry.delete(0, tk.END)
+                fim_entry.delete(0, tk.END)
+                filtro = (None, None)
+                recarregar()
+            # O mais recente é o primeiro da lista
+            hist_list.selection_clear(0, tk.END)
+            hist_list.select_set(0)
+            hist_list.see(0)
+            on_select()
+            just_generated = False
+
+    return ao_mostrar
 
 # ==================================================
-# INÍCIO
+# DIAGNÓSTICO
 # ==================================================
-dados = carregar_dados()
-
-root = tk.Tk()
-root.title("Sorteio de Oração")
-root.geometry("1000x700")
-root.configure(bg=PRIMARY_BG)
-
-style = ttk.Style()
-style.theme_use('clam')
-style.configure("Custom.TNotebook", background=PRIMARY_BG, foreground=TEXT_COLOR, borderwidth=0)
-style.configure("Custom.Treeview", background=ACCENT_BG, foreground=TEXT_COLOR, fieldbackground=ACCENT_BG)
-style.map("Custom.Treeview", background=[('selected', SELECT_COLOR)], foreground=[('selected', TEXT_COLOR)])
-style.configure("Custom.TCombobox", fieldbackground=ACCENT_BG, background=ACCENT_BG, foreground=TEXT_COLOR)
-style.configure("Custom.Vertical.TScrollbar", background=ACCENT_BG, troughcolor=PRIMARY_BG, arrowcolor=TEXT_COLOR)
-
-top_frame = tk.Frame(root, bg=PRIMARY_BG, height=60)
-top_frame.pack(fill='x')
+# Painel escondido (Ctrl+Shift+D) com os tempos de instrumentacao. Se a
+# medição não foi ligada por SORTEIO_DIAGNOSTICO, o painel oferece ligá-la
+# até o programa fechar.
+def abrir_diagnostico(e=None):
+    if not instrumentacao.ativo:
+        if not messagebox.askyesno("Diagnóstico", "Medir o desempenho até fechar o programa?", parent=root):
+            return
+        instrumentacao.ativar()
+        instrumentacao.vigiar_laco(root)
 
-tk.Button(top_frame, text="Home", bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 12), borderwidth=0,
-          command=lambda: show_frame('home')).pack(side='left', padx=10, pady=10)
-tk.Button(top_frame, text="Membros", bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 12), borderwidth=0,
-          command=lambda: show_frame('membros')).pack(side='left', padx=10, pady=10)
-tk.Button(top_frame, text="Histórico", bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 12), borderwidth=0,
-          command=lambda: show_frame('historico')).pack(side='left', padx=10, pady=10)
-tk.Label(top_frame, text="Igreja", bg=PRIMARY_BG, fg=HIGHLIGHT, font=("Arial", 16, "bold")).pack(side='right', padx=20, pady=10)
+    window = tk.Toplevel(root)
+    window.title("Diagnóstico")
+    window.geometry("760x560")
+    window.configure(bg=PRIMARY_BG)
 
-main_frame = tk.Frame(root, bg=PRIMARY_BG)
-main_frame.pack(fill='both', expand=True)
+    tamanhos_label = tk.Label(window, text="", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 10), justify='left')
+    tamanhos_label.pack(anchor='w', padx=10, pady=(10, 5))
+
+    tk.Label(window, text="Operações", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Arial", 11, "bold")).pack(anchor='w', padx=10)
+    colunas_resumo = ("operacao", "contagem", "media", "p95", "max")
+    tree_resumo = ttk.Treeview(window, columns=colunas_resumo, show="headings", height=8, style="Custom.Treeview")
+    for coluna, titulo, largura in zip(colunas_resumo, ("Operação", "Vezes", "Média (ms)", "p95 (ms)", "Máx (ms)"),
+                                       (260, 80, 110, 110, 110)):
+        tree_resumo.heading(coluna, text=titulo)
+        tree_resumo.column(coluna, width=largura, anchor='w' if coluna == "operacao" else 'e')
+    tree_resumo.pack(fill='x', padx=10, pady=5)
+
+    tk.Label(window, text="Últimas operações", bg=PRIMARY_BG, fg=TEXT_COLOR,
+             font=("Arial", 11, "bold")).pack(anchor='w', padx=10)
+    colunas_ultimas = ("hora", "operacao", "ms", "tamanhos")
+    tree_ultimas = ttk.Treeview(window, columns=colunas_ultimas, show="headings", style="Custom.Treeview")
+    for coluna, titulo, largura in zip(colunas_ultimas, ("Hora", "Operação", "ms", "Dados"), (80, 220, 90, 330)):
+        tree_ultimas.heading(coluna, text=titulo)
+        tree_ultimas.column(coluna, width=largura, anchor='e' if coluna == "ms" else 'w')
+    tree_ultimas.pack(fill='both', expand=True, padx=10, pady=5)
+
+    def tamanhos_arquivos():
+        partes = []
+        for atributo in ("caminho", "caminho_journal"):
+            caminho = getattr(armazenamento_base, atributo, None)
+            if caminho and os.path.exists(caminho):
+                partes.append(f"{os.path.basename(caminho)} {os.path.getsize(caminho) / 1024:.0f} KB")
+        return ", ".join(partes)
+
+    def atualizar():
+        if not window.winfo_exists():
+            return
+        tamanhos = ", ".join(f"{chave}: {valor}" for chave, valor in tamanhos_dados(dados).items())
+        tamanhos_label.config(text=f"{tamanhos}\n{tamanhos_arquivos()}")
+        tree_resumo.delete(*tree_resumo.get_children())
+        for operacao, est in instrumentacao.resumo().items():
+            tree_resumo.insert("", "end", values=(operacao, est["contagem"], f"{est['media_ms']:.1f}",
+                                                  f"{est['p95_ms']:.1f}", f"{est['max_ms']:.1f}"))
+        tree_ultimas.delete(*tree_ultimas.get_children())
+        for item in reversed(instrumentacao.ultimas(50)):
+            tree_ultimas.insert("", "end", values=(
+                datetime.fromtimestamp(item["momento"]).strftime("%H:%M:%S"), item["operacao"], f"{item['ms']:.1f}",
+                ", ".join(f"{chave}={valor}" for chave, valor in item["tamanhos"].items())))
+        window.after(1000, atualizar)
+
+    def salvar_relatorio():
+        caminho = instrumentacao.despejar()
+        messagebox.showinfo("Diagnóstico", f"Relatório gravado: {caminho}", parent=window)
+
+    button_frame = tk.Frame(window, bg=PRIMARY_BG)
+    button_frame.pack(fill='x', padx=10, pady=10)
+    tk.Button(button_frame, text="Fechar", command=window.destroy, bg=ACCENT_BG, fg=TEXT_COLOR,
+              font=("Arial", 10, "bold"), width=12, relief="flat").pack(side='right', padx=5)
+    tk.Button(button_frame, text="Salvar relatório", command=salvar_relatorio, bg=HIGHLIGHT, fg=PRIMARY_BG,
+              font=("Arial", 10, "bold"), width=15, relief="flat").pack(side='right', padx=5)
+    atualizar()
+
+CONTEUDOS = {'home': home_content, 'membros': membros_content, 'historico': historico_content}
 
-current_tab = 'home'
-just_generated = False
+# ==================================================
+# OUTRAS INSTÂNCIAS E FALHAS DE GRAVAÇÃO
+# ==================================================
+# Com SORTEIO_ARMAZENAMENTO=compartilhado, várias janelas (ou computadores
+# numa pasta de rede) usam os mesmos dados. O que as outras gravaram chega
+# como mutações e passa pelo mesmo caminho das locais. Num conflito ou numa
+# gravação que falhou, tudo é recarregado do disco e as abas são remontadas.
+def verificar_outras_instancias():
+    global erro_gravacao_mostrado
+    root.after(INTERVALO_OUTRAS_MS, verificar_outras_instancias)
+    try:
+        armazenamento_dados.verificar()
+    except RuntimeError as erro:
+        if not erro_gravacao_mostrado:
+            erro_gravacao_mostrado = True
+            messagebox.showerror("Erro", f"{erro}\nNenhuma alteração será gravada até o programa ser aberto de novo.")
+    for mudanca in armazenamento_dados.mudancas_externas():
+        if mudanca[0] == "mutacoes":
+            for mutacao in mudanca[1]:
+                aplicar_mutacao(dados, mutacao, indice_grupos)
+                atualizar_indices(mutacao)
+                eventos.publicar(mutacao)
+                if servidor_api is not None:
+                    servidor_api.publicar(mutacao)
+        else:
+            recarregar_dados(mudanca[1])
+            messagebox.showwarning("Dados recarregados",
+                                   f"Os dados foram recarregados do disco ({mudanca[2]}).\n"
+                                   "A última alteração feita aqui foi descartada.")
+
+def mostrar_erro(tipo, erro, rastro):
+    # Erro num callback do Tk (uma gravação recusada, por exemplo) vira uma caixa de diálogo
+    traceback.print_exception(tipo, erro, rastro)
+    messagebox.showerror("Erro", str(erro), parent=root)
+
+def recarregar_dados(novos):
+    global indice_busca, indice_grupos, contadores_servico, eventos
+    for janela in root.winfo_children():
+        if isinstance(janela, tk.Toplevel):
+            janela.destroy()
+    dados.clear()
+    dados.update(novos)
+    indice_busca = IndiceBusca(dados["membros"])
+    indice_grupos = IndiceGrupos(dados["grupos"])
+    contadores_servico = ContadoresServico(dados["sorteios"], contadores_servico.janela)
+    eventos = Eventos()
+    for frame, _ in abas.values():
+        frame.destroy()
+    abas.clear()
+    show_frame(current_tab)
+    if servidor_api is not None:
+        servidor_api.publicar_dados(dados)
 
-show_frame('home')
-root.mainloop()
\ No newline at end of file
+# ==================================================
+# INÍCIO
+# ==================================================
+def ao_fechar():
+    try:
+        if erro_historico is None:
+            aguardar_historico()
+        armazenamento_dados.fechar(dados)
+    finally:
+        root.destroy()
+
+if __name__ == "__main__":
+    instrumentacao.ativar_pelo_ambiente()
+    armazenamento_base = armazenamento.criar_armazenamento()
+    dados = armazenamento_base.carregar(incluir_sorteios=False)
+    marcar_tempo("cadastro")
+    # Gravações saem da thread da interface
+    armazenamento_dados = PersistenciaAssincrona(armazenamento_base, dados, historico_carregado=False)
+    indice_busca = IndiceBusca(dados["membros"])
+    indice_grupos = IndiceGrupos(dados["grupos"])
+    contadores_servico = ContadoresServico(dados["sorteios"], JANELA_PADRAO)
+    eventos = Eventos()
+    historico_carregado = False
+    botoes_edicao = []
+    sorteios_lidos = []
+    erro_historico = None
+    servidor_api = None
+    erro_gravacao_mostrado = False
+    carga_historico = threading.Thread(target=carregar_historico, name="historico", daemon=True)
+
+    root = tk.Tk()
+    root.title("Sorteio de Oração")
+    root.geometry("1000x700")
+    root.configure(bg=PRIMARY_BG)
+    root.protocol("WM_DELETE_WINDOW", ao_fechar)
+    root.report_callback_exception = mostrar_erro
+    # Atalho escondido para o painel de diagnóstico
+    root.bind_all("<Control-Shift-D>", abrir_diagnostico)
+    if instrumentacao.ativo:
+        instrumentacao.vigiar_laco(root)
+
+    style = ttk.Style()
+    style.theme_use('clam')
+    style.configure("Custom.TNotebook", background=PRIMARY_BG, foreground=TEXT_COLOR, borderwidth=0)
+    style.configure("Custom.Treeview", background=ACCENT_BG, foreground=TEXT_COLOR, fieldbackground=ACCENT_BG)
+    style.map("Custom.Treeview", background=[('selected', SELECT_COLOR)], foreground=[('selected', TEXT_COLOR)])
+    style.configure("Custom.TCombobox", fieldbackground=ACCENT_BG, background=ACCENT_BG, foreground=TEXT_COLOR)
+    style.configure("Custom.Vertical.TScrollbar", background=ACCENT_BG, troughcolor=PRIMARY_BG, arrowcolor=TEXT_COLOR)
+
+    top_frame = tk.Frame(root, bg=PRIMARY_BG, height=60)
+    top_frame.pack(fill='x')
+
+    tk.Button(top_frame, text="Home", bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 12), borderwidth=0,
+              command=lambda: show_frame('home')).pack(side='left', padx=10, pady=10)
+    tk.Button(top_frame, text="Membros", bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 12), borderwidth=0,
+              command=lambda: show_frame('membros')).pack(side='left', padx=10, pady=10)
+    tk.Button(top_frame, text="Histórico", bg=ACCENT_BG, fg=TEXT_COLOR, font=("Arial", 12), borderwidth=0,
+              command=lambda: show_frame('historico')).pack(side='left', padx=10, pady=10)
+    tk.Label(top_frame, text="Igreja", bg=PRIMARY_BG, fg=HIGHLIGHT, font=("Arial", 16, "bold")).pack(side='right', padx=20, pady=10)
+
+    main_frame = tk.Frame(root, bg=PRIMARY_BG)
+    main_frame.pack(fill='both', expand=True)
+
+    current_tab = 'home'
+    abas = {}
+    just_generated = False
+    cobertura_maxima = tk.BooleanVar(value=False)
+    otimizar_metas = tk.BooleanVar(value=False)
+    ultima_otimizacao = None   # (data, turnos, relatório) do último sorteio otimizado
+    equilibrar_historico = tk.BooleanVar(value=False)
+    janela_equidade = tk.StringVar(value=str(JANELA_PADRAO))
+    inicio_vigilia = tk.StringVar(value="00:00")
+    fim_vigilia = tk.StringVar(value="24:00")
+    minutos_turno = tk.StringVar(value="15")
+    dias_vigilia = tk.StringVar(value="1")
+    turnos_membro = tk.StringVar(value="1")
+
+    show_frame('home')
+    root.update_idletasks()
+    marcar_tempo("tela")
+    root.after_idle(iniciar_carga_historico)
+    root.after(INTERVALO_OUTRAS_MS, verificar_outras_instancias)
+    root.mainloop()
@@ -0,0 +1,275 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import armazenamento_sqlite
+from armazenamento import (ArmazenamentoJournal, ArmazenamentoJson, aplicar_mutacao, criar_armazenamento,
+                           dados_vazios, separar_mutacao)
+from arquivo_frio import ENTRADA, ArquivoFrio, codificar_sorteio, decodificar_sorteio
+from armazenamento_sqlite import VERSAO_ESQUEMA, ArmazenamentoSqlite
+from calendario import CALENDARIO_PADRAO, obter_calendario
+from motor_sorteio import montar_sorteio
+
+def sorteio(dia, turnos=None, calendario=None):
+    turnos = turnos if turnos is not None else [dia % 3 + 1] + [None] * 95
+    return montar_sorteio(f"{dia:02d}/01/2024 20:00", turnos, calendario)
+
+MUTACOES = [
+    {"tipo": "membro_adicionado", "membro": 1, "nome": "Ana", "restricoes": ["03:00"]},
+    {"tipo": "membro_adicionado", "membro": 2, "nome": "Bia"},
+    {"tipo": "membro_adicionado", "membro": 3, "nome": "Caio"},
+    {"tipo": "grupo_criado", "grupo": "Jovens"},
+    {"tipo": "lote", "mutacoes": [{"tipo": "membro_grupo_adicionado", "grupo": "Jovens", "membro": 1},
+                                  {"tipo": "membro_grupo_adicionado", "grupo": "Jovens", "membro": 2}]},
+    {"tipo": "sorteio_registrado", "sorteio": sorteio(1, [1, 2] + [None] * 94)},
+    {"tipo": "membro_renomeado", "membro": 2, "nome": "Beatriz"},
+    {"tipo": "restricoes_alteradas", "membro": 2, "restricoes": 1 << 5},
+    {"tipo": "sorteio_reparado", "data": "01/01/2024 20:00", "membro": 2, "alteracoes": [[1, 2, 3]]},
+    {"tipo": "membro_excluido", "membro": 1},
+]
+
+def esperado():
+    dados = dados_vazios()
+    for mutacao in MUTACOES:
+        aplicar_mutacao(dados, mutacao)
+    return dados
+
+def gravar(armazenamento):
+    dados = armazenamento.carregar()
+    for mutacao in MUTACOES:
+        aplicar_mutacao(dados, mutacao)
+        armazenamento.registrar(dados, mutacao)
+    return dados
+
+# ==================================================
+# MUTAÇÕES
+# ==================================================
+def test_aplicar_mutacoes():
+    dados = esperado()
+    assert dados["membros"] == {2: "Beatriz", 3: "Caio"}
+    assert dados["excluidos"] == {1: "Ana"}
+    assert dados["grupos"] == {"Jovens": {2: None}}
+    assert dados["restricoes_horarios"] == {2: 1 << 5, 3: 0}
+    assert dados["sorteios"][0]["turnos"][:2] == [1, 3]
+    assert dados["proximo_id"] == 4
+
+def test_reparo_troca_o_dict_do_sorteio():
+    dados = dados_vazios()
+    original = sorteio(1, [1, 2] + [None] * 94)
+    aplicar_mutacao(dados, {"tipo": "sorteio_registrado", "sorteio": original})
+    aplicar_mutacao(dados, {"tipo": "sorteio_reparado", "data": original["data"], "membro": 2,
+                            "alteracoes": [[1, 2, 5]]})
+    assert original["turnos"][1] == 2
+    assert dados["sorteios"][0]["turnos"][1] == 5
+
+def test_separar_mutacao():
+    cadastro, historico = separar_mutacao({"tipo": "lote", "mutacoes": MUTACOES})
+    assert len(cadastro["mutacoes"]) + len(historico["mutacoes"]) == len(MUTACOES)
+    assert {m["tipo"] for m in historico["mutacoes"]} == {"sorteio_registrado", "sorteio_reparado"}
+
+# ==================================================
+# JSON E JOURNAL
+# ==================================================
+@pytest.mark.parametrize("classe", [ArmazenamentoJson, ArmazenamentoJournal])
+def test_gravar_e_recarregar(tmp_path, classe):
+    caminho, journal = str(tmp_path / "dados.json"), str(tmp_path / "dados.journal")
+    gravar(classe(caminho, journal, dias_arquivo=0))
+    assert classe(caminho, journal, dias_arquivo=0).carregar() == esperado()
+
+def test_modo_padrao_e_o_json(monkeypatch):
+    monkeypatch.delenv("SORTEIO_ARMAZENAMENTO", raising=False)
+    assert type(criar_armazenamento()) is ArmazenamentoJson
+    monkeypatch.setenv("SORTEIO_ARMAZENAMENTO", "journal")
+    assert type(criar_armazenamento()) is ArmazenamentoJournal
+    with pytest.raises(ValueError):
+        criar_armazenamento("xml")
+
+def test_replay_do_journal_sem_compactar(tmp_path):
+    caminho, journal = str(tmp_path / "dados.json"), str(tmp_path / "dados.journal")
+    gravar(ArmazenamentoJournal(caminho, journal, dias_arquivo=0))
+    assert not os.path.exists(caminho)
+    with open(journal, encoding="utf-8") as f:
+        assert [json.loads(linha)["versao"] for linha in f] == list(range(1, len(MUTACOES) + 1))
+    # Só o cadastro, com o histórico lido depois
+    armazenamento = ArmazenamentoJournal(caminho, journal, dias_arquivo=0)
+    dados = armazenamento.carregar(incluir_sorteios=False)
+    assert dados["sorteios"] == [] and dados["membros"] == esperado()["membros"]
+    assert armazenamento.carregar_sorteios() == esperado()["sorteios"]
+
+def test_journal_com_linha_truncada(tmp_path):
+    caminho, journal = str(tmp_path / "dados.json"), str(tmp_path / "dados.journal")
+    gravar(ArmazenamentoJournal(caminho, journal, dias_arquivo=0))
+    tamanho = os.path.getsize(journal)
+    with open(journal, "ab") as f:
+        f.write(b'{"versao": 99, "mutacao": {"tipo": "membro_adic')
+    assert ArmazenamentoJournal(caminho, journal, dias_arquivo=0).carregar() == esperado()
+    assert os.path.getsize(journal) == tamanho
+
+def test_compactacao_ignora_entradas_ja_no_snapshot(tmp_path):
+    caminho, journal = str(tmp_path / "dados.json"), str(tmp_path / "dados.journal")
+    armazenamento = ArmazenamentoJournal(caminho, journal, limite=4, dias_arquivo=0)
+    gravar(armazenamento)
+    assert os.path.exists(caminho)
+    # Queda depois de gravar o snapshot e antes de apagar o journal
+    with open(journal, "w", encoding="utf-8") as f:
+        for versao, mutacao in enumerate(MUTACOES, 1):
+            f.write(json.dumps({"versao": versao, "mutacao": mutacao}) + "\n")
+    assert ArmazenamentoJournal(caminho, journal, dias_arquivo=0).carregar() == esperado()
+
+def test_arquivo_sem_preferencias_e_formato_por_nome(tmp_path):
+    caminho = str(tmp_path / "dados.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({"membros": ["Ana", "Bia"], "grupos": {"G": ["Bia"]},
+                   "restricoes_horarios": {"Ana": ["01:00"]},
+                   "sorteios": [{"data": "01/01/2024 20:00",
+                                 "resultados": dict.fromkeys(CALENDARIO_PADRAO.rotulos, "—") | {"00:00": "Caio"}}]},
+                  f)
+    dados = ArmazenamentoJson(caminho, str(tmp_path / "j"), dias_arquivo=0).carregar()
+    assert dados["membros"] == {1: "Ana", 2: "Bia"}
+    assert dados["excluidos"] == {3: "Caio"}
+    assert dados["grupos"] == {"G": {2: None}}
+    assert dados["restricoes_horarios"][1] == 1 << 1
+    assert dados["preferencias_horarios"] == {}
+    assert dados["sorteios"][0]["turnos"][:2] == [3, None]
+
+# ==================================================
+# ARQUIVO FRIO
+# ==================================================
+def test_codificacao_do_sorteio():
+    calendario = obter_calendario("20:00", "22:00", 30)
+    for original in (sorteio(1, [70000, None, 2, 3], calendario), sorteio(2)):
+        assert decodificar_sorteio(original["data"], codificar_sorteio(original)) == original
+
+def test_indice_do_arquivo_frio(tmp_path):
+    pasta = str(tmp_path / "frio")
+    arquivo = ArquivoFrio(pasta)
+    sorteios = [sorteio(dia) for dia in range(1, 11)]
+    arquivo.anexar(sorteios[:6])
+    arquivo.anexar(sorteios[6:])
+    arquivo.fechar()
+    reaberto = ArquivoFrio(pasta)
+    assert len(reaberto) == 10
+    assert reaberto.data(7) == sorteios[7]["data"]
+    assert reaberto.ler(3) == sorteios[3]
+    assert reaberto.ler_todos() == sorteios
+    reaberto.fechar()
+
+def test_arquivo_frio_descarta_escrita_interrompida(tmp_path):
+    pasta = str(tmp_path / "frio")
+    arquivo = ArquivoFrio(pasta)
+    arquivo.anexar([sorteio(1), sorteio(2)])
+    arquivo.fechar()
+    segmento = os.path.join(pasta, "segmento_00001")
+    tamanho_dat = os.path.getsize(segmento + ".dat")
+    # Registro sem entrada no índice e entrada pela metade
+    with open(segmento + ".dat", "ab") as f:
+        f.write(codificar_sorteio(sorteio(3)))
+    with open(segmento + ".idx", "ab") as f:
+        f.write(ENTRADA.pack(b"03/01/2024 20:00", tamanho_dat, 10)[:7])
+    reaberto = ArquivoFrio(pasta)
+    assert len(reaberto) == 2
+    assert os.path.getsize(segmento + ".dat") == tamanho_dat
+    assert os.path.getsize(segmento + ".idx") == 2 * ENTRADA.size
+    reaberto.fechar()
+
+def test_arquivamento_pelo_armazenamento(tmp_path, monkeypatch):
+    monkeypatch.setattr("arquivo_frio.MANTER_RECENTES", 2)
+    caminho, journal = str(tmp_path / "dados.json"), str(tmp_path / "dados.journal")
+    dados = dados_vazios()
+    dados["sorteios"] = [sorteio(dia) for dia in range(1, 8)]
+    ArmazenamentoJson(caminho, journal, dias_arquivo=0).salvar(dados)
+    armazenamento = ArmazenamentoJson(caminho, journal, dias_arquivo=1)
+    carregados = armazenamento.carregar()
+    assert [s["data"] for s in carregados["sorteios"]] == [s["data"] for s in dados["sorteios"][-2:]]
+    assert armazenamento.arquivados == 5
+    assert armazenamento.carregar_sorteio(0) == dados["sorteios"][0]
+    assert armazenamento.carregar_sorteio(6) == dados["sorteios"][6]
+    armazenamento.fechar(carregados)
+    assert ArmazenamentoJson(caminho, journal, dias_arquivo=1).carregar()["sorteios"] == dados["sorteios"][-2:]
+
+# ==================================================
+# SQLITE
+# ==================================================
+def test_sqlite_grava_e_recarrega(tmp_path):
+    caminho = str(tmp_path / "dados.db")
+    armazenamento = ArmazenamentoSqlite(caminho, caminho_json=None)
+    dados = gravar(armazenamento)
+    armazenamento.fechar(dados)
+    assert ArmazenamentoSqlite(caminho, caminho_json=None).carregar() == esperado()
+
+def test_sqlite_migra_do_json(tmp_path):
+    caminho_json = str(tmp_path / "dados.json")
+    gravar(ArmazenamentoJson(caminho_json, str(tmp_path / "j"), dias_arquivo=0))
+    armazenamento = ArmazenamentoSqlite(str(tmp_path / "dados.db"), caminho_json=caminho_json)
+    assert armazenamento.carregar() == esperado()
+
+def test_sqlite_migracao_nao_mexe_na_origem(tmp_path, monkeypatch):
+    pasta = tmp_path / "dados"
+    pasta.mkdir()
+    caminho_json = str(pasta / "dados.json")
+    with open(caminho_json, "w", encoding="utf-8") as f:
+        json.dump({"membros": ["Ana", "Bia"], "grupos": {}, "restricoes_horarios": {}, "sorteios": []}, f)
+    with open(pasta / "dados.journal", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"versao": 1, "mutacao": {"tipo": "grupo_criado", "grupo": "G"}}) + "\n")
+    # Um journal de outra pasta de dados no diretório atual não entra
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "dados.journal").write_text(
+        json.dumps({"versao": 1, "mutacao": {"tipo": "grupo_criado", "grupo": "Outro"}}) + "\n")
+    antes = {nome: (pasta / nome).read_bytes() for nome in os.listdir(pasta)}
+    dados = ArmazenamentoSqlite(str(tmp_path / "dados.db"), caminho_json).carregar()
+    assert dados["membros"] == {1: "Ana", 2: "Bia"} and dados["grupos"] == {"G": {}}
+    assert {nome: (pasta / nome).read_bytes() for nome in os.listdir(pasta)} == antes
+    assert (tmp_path / "dados.journal").exists()
+
+ESQUEMA_V0 = """
+CREATE TABLE membros (id INTEGER PRIMARY KEY, nome TEXT NOT NULL UNIQUE, ativo INTEGER NOT NULL DEFAULT 1);
+CREATE TABLE grupos (id INTEGER PRIMARY KEY, nome TEXT NOT NULL UNIQUE);
+CREATE TABLE grupo_membros (grupo_id INTEGER NOT NULL, membro_id INTEGER NOT NULL,
+                            PRIMARY KEY (grupo_id, membro_id));
+CREATE TABLE restricoes (membro_id INTEGER NOT NULL, hora TEXT NOT NULL, PRIMARY KEY (membro_id, hora));
+CREATE TABLE sorteios (id INTEGER PRIMARY KEY, data TEXT NOT NULL, data_iso TEXT NOT NULL);
+CREATE TABLE sorteio_slots (sorteio_id INTEGER NOT NULL, horario TEXT NOT NULL, membro_id INTEGER,
+                            PRIMARY KEY (sorteio_id, horario));
+"""
+
+def test_sqlite_migracao_v1(tmp_path):
+    caminho = str(tmp_path / "dados.db")
+    con = sqlite3.connect(caminho)
+    con.executescript(ESQUEMA_V0)
+    con.executemany("INSERT INTO membros (id, nome, ativo) VALUES (?, ?, ?)", [(1, "Ana", 1), (2, "Bia", 0)])
+    con.execute("INSERT INTO restricoes VALUES (1, '03:00')")
+    con.execute("INSERT INTO sorteios VALUES (1, '01/01/2024 20:00', '2024-01-01 20:00')")
+    con.executemany("INSERT INTO sorteio_slots VALUES (1, ?, ?)",
+                    [(h, 2 if i == 0 else None) for i, h in enumerate(CALENDARIO_PADRAO.rotulos)])
+    con.execute("INSERT INTO sorteios VALUES (2, '02/01/2024 20:00', '2024-01-02 20:00')")
+    con.executemany("INSERT INTO sorteio_slots VALUES (2, ?, ?)", [("20:00", 1), ("20:30", None)])
+    con.commit()
+    con.close()
+
+    dados = ArmazenamentoSqlite(caminho, caminho_json=None).carregar()
+    assert dados["membros"] == {1: "Ana"} and dados["excluidos"] == {2: "Bia"}
+    assert dados["restricoes_horarios"] == {1: 1 << 3}
+    assert dados["sorteios"][0] == {"data": "01/01/2024 20:00", "turnos": [2] + [None] * 95}
+    assert dados["sorteios"][1] == {"data": "02/01/2024 20:00", "turnos": [1, None], "horarios": ["20:00", "20:30"]}
+    con = sqlite3.connect(caminho)
+    assert con.execute("PRAGMA user_version").fetchone()[0] == VERSAO_ESQUEMA
+    # Nomes podem se repetir depois da migração
+    con.execute("INSERT INTO membros (id, nome) VALUES (3, 'Ana')")
+    con.close()
+
+def test_sqlite_consultas_do_historico(tmp_path):
+    armazenamento = ArmazenamentoSqlite(str(tmp_path / "dados.db"), caminho_json=None)
+    dados = armazenamento.carregar()
+    lote = [sorteio(dia) for dia in (3, 1, 2)]
+    aplicar_mutacao(dados, {"tipo": "sorteios_registrados", "sorteios": lote})
+    armazenamento.registrar(dados, {"tipo": "sorteios_registrados", "sorteios": lote})
+    assert armazenamento.contar_sorteios() == 3
+    cabecalhos = armazenamento.cabecalhos_sorteios()
+    assert [c["data"][:2] for c in cabecalhos] == ["01", "02", "03"]
+    assert armazenamento.carregar_sorteio(cabecalhos[0]["id"]) == lote[1]
+    for desconhecido in (None, max(c["id"] for c in cabecalhos) + 1):
+        with pytest.raises(KeyError):
+            armazenamento.carregar_sorteio(desconhecido)
+    assert armazenamento_sqlite.data_iso("05/02/2024 07:30") == "2024-02-05 07:30"
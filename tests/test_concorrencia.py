@@ -0,0 +1,73 @@
+import multiprocessing
+
+import pytest
+
+from armazenamento import aplicar_mutacao
+from concorrencia import ArmazenamentoCompartilhado, ConflitoConcorrente, RecargaNecessaria
+
+ANA = {"tipo": "membro_adicionado", "membro": 1, "nome": "Ana"}
+BIA = {"tipo": "membro_adicionado", "membro": 2, "nome": "Bia"}
+CAIO = {"tipo": "membro_adicionado", "membro": 3, "nome": "Caio"}
+
+def abrir(pasta, reter=200):
+    return ArmazenamentoCompartilhado(str(pasta / "dados.json"), str(pasta / "dados.journal"),
+                                      dias_arquivo=0, reter=reter)
+
+def _instancia(pasta, mutacoes, compactar, reter):
+    armazenamento = abrir(pasta, reter)
+    dados = armazenamento.carregar()
+    for mutacao in mutacoes:
+        aplicar_mutacao(dados, mutacao)
+        armazenamento.registrar(dados, mutacao)
+    if compactar:
+        armazenamento.compactar(dados)
+
+def outra_instancia(pasta, *mutacoes, compactar=False, reter=200):
+    # Outro processo grava na mesma pasta de dados
+    processo = multiprocessing.get_context("spawn").Process(target=_instancia,
+                                                            args=(pasta, mutacoes, compactar, reter))
+    processo.start()
+    processo.join(30)
+    assert processo.exitcode == 0
+
+def iniciar(pasta, *mutacoes):
+    armazenamento = abrir(pasta)
+    dados = armazenamento.carregar()
+    for mutacao in mutacoes:
+        aplicar_mutacao(dados, mutacao)
+        armazenamento.registrar(dados, mutacao)
+    return armazenamento, dados
+
+def test_mutacoes_sem_conflito_se_juntam(tmp_path):
+    armazenamento, dados = iniciar(tmp_path, ANA)
+    outra_instancia(tmp_path, BIA)
+    aplicar_mutacao(dados, CAIO)
+    assert armazenamento.registrar_varios(dados, [CAIO]) == [BIA]
+    assert dados["membros"] == {1: "Ana", 2: "Bia", 3: "Caio"}
+    assert abrir(tmp_path).carregar()["membros"] == dados["membros"]
+
+def test_compactar_devolve_as_alheias(tmp_path):
+    armazenamento, dados = iniciar(tmp_path, ANA)
+    outra_instancia(tmp_path, BIA)
+    assert armazenamento.compactar(dados) == [BIA]
+    assert dados["membros"] == {1: "Ana", 2: "Bia"}
+    assert armazenamento.sincronizar(dados) == []
+    assert abrir(tmp_path).carregar()["membros"] == dados["membros"]
+
+def test_mesmo_membro_conflita(tmp_path):
+    armazenamento, dados = iniciar(tmp_path, ANA)
+    outra_instancia(tmp_path, {"tipo": "membro_renomeado", "membro": 1, "nome": "Ana Maria"})
+    nossa = {"tipo": "membro_renomeado", "membro": 1, "nome": "Ana Paula"}
+    aplicar_mutacao(dados, nossa)
+    with pytest.raises(ConflitoConcorrente) as erro:
+        armazenamento.registrar_varios(dados, [nossa])
+    assert erro.value.nossa == nossa
+    assert abrir(tmp_path).carregar()["membros"] == {1: "Ana Maria"}
+
+def test_compactacao_alheia_exige_recarga(tmp_path):
+    armazenamento, dados = iniciar(tmp_path, ANA)
+    # A outra instância compacta mantendo só a última entrada: a de Bia se perde do journal
+    outra_instancia(tmp_path, BIA, CAIO, compactar=True, reter=1)
+    with pytest.raises(RecargaNecessaria):
+        armazenamento.sincronizar(dados)
+    assert armazenamento.carregar()["membros"] == {1: "Ana", 2: "Bia", 3: "Caio"}
@@ -0,0 +1,39 @@
+import math
+import random
+
+from equidade import PESO_HORA, PESO_MINIMO, PESO_TOTAL, ContadoresServico
+from motor_sorteio import MODO_GULOSO, MODO_OTIMO, montar_sorteio, sortear_turnos
+
+def sorteio(dia, turnos):
+    return montar_sorteio(f"{dia:02d}/03/2024 20:00", turnos + [None] * (96 - len(turnos)))
+
+def test_janela_desliza_e_limpa_os_contadores():
+    contadores = ContadoresServico([sorteio(1, [1, 1, 2]), sorteio(2, [None] * 4 + [1])], janela=2)
+    assert contadores.vezes(1) == 3 and contadores.vezes(1, 0) == 2 and contadores.vezes(1, 1) == 1
+    contadores.registrar(sorteio(3, [3]))
+    assert contadores.vezes(1) == 1 and contadores.vezes(1, 0) == 0 and contadores.vezes(2) == 0
+    contadores.registrar(sorteio(4, []))
+    assert contadores.por_hora == {3: {0: 1}} and contadores.total == {3: 1}
+
+def test_janela_zero_nao_conta():
+    contadores = ContadoresServico([sorteio(1, [1])], janela=0)
+    contadores.registrar(sorteio(2, [1]))
+    assert contadores.vezes(1) == 0 and contadores.peso(1, 0) == 1.0
+
+def test_peso_pela_hora_e_pelo_total():
+    contadores = ContadoresServico([sorteio(1, [1, 1, None, None, 2, 2])])
+    assert contadores.peso(1, 0) == math.exp(-(2 * PESO_HORA + 2 * PESO_TOTAL))
+    assert contadores.peso(2, 0) == math.exp(-2 * PESO_TOTAL)
+    assert contadores.peso(1, 0) < contadores.peso(2, 0) < contadores.peso(3, 0) == 1.0
+    muitos = ContadoresServico([sorteio(dia, [1] * 96) for dia in range(1, 31)])
+    assert muitos.peso(1, 0) == PESO_MINIMO
+
+def test_quem_serviu_na_hora_fica_fora_dela():
+    membros = list(range(1, 101))
+    contadores = ContadoresServico([sorteio(dia, [1] * 4) for dia in range(1, 6)])
+    for modo in (MODO_GULOSO, MODO_OTIMO):
+        com = [sortear_turnos(membros, {}, rng=random.Random(semente), modo=modo, contadores=contadores)
+               for semente in range(200)]
+        sem = [sortear_turnos(membros, {}, rng=random.Random(semente), modo=modo) for semente in range(200)]
+        assert not any(1 in turnos[:4] for turnos in com)
+        assert any(1 in turnos[:4] for turnos in sem)
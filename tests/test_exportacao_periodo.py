@@ -0,0 +1,96 @@
+import csv
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import exportacao_periodo
+from calendario import obter_calendario
+from exportacao_periodo import CABECALHO_CSV, dobrar_linha_ics, escapar_ics, exportar_periodo, mapa_grupos
+from historico import IndiceHistorico
+from motor_sorteio import montar_sorteio
+
+CALENDARIO = obter_calendario("22:00", "02:00", 60)
+NOMES = {1: "Ana", 2: "Bia", 3: "Caio, o \"Velho\""}
+GRUPOS = {"Jovens": {1: None, 3: None}, "Coral": {3: None}}
+
+def historico(quantidade):
+    sorteios = [montar_sorteio((datetime(2024, 3, 1, 20) + timedelta(days=dia)).strftime("%d/%m/%Y %H:%M"),
+                               [1, None, 2, 3], CALENDARIO) for dia in range(quantidade)]
+    indice = IndiceHistorico(sorteios)
+    return indice, indice.cabecalhos_sorteios(0, quantidade)
+
+def exportar(tmp_path, quantidade=2, **kwargs):
+    indice, cabecalhos = historico(quantidade)
+    kwargs.setdefault("processos", 1)
+    return exportar_periodo(indice, cabecalhos, NOMES, mapa_grupos(GRUPOS), str(tmp_path), "periodo", **kwargs)
+
+def ler_csv(caminho):
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        return list(csv.reader(f))
+
+def test_csv_um_turno_por_linha(tmp_path):
+    [caminho] = exportar(tmp_path, formatos=("csv",))
+    linhas = ler_csv(caminho)
+    assert tuple(linhas[0]) == CABECALHO_CSV
+    assert linhas[1:5] == [
+        ["01/03/2024 20:00", "22:00", "01/03/2024 22:00", "01/03/2024 23:00", "Ana", "Jovens"],
+        ["01/03/2024 20:00", "23:00", "01/03/2024 23:00", "02/03/2024 00:00", "", ""],
+        ["01/03/2024 20:00", "00:00", "02/03/2024 00:00", "02/03/2024 01:00", "Bia", ""],
+        ["01/03/2024 20:00", "01:00", "02/03/2024 01:00", "02/03/2024 02:00", NOMES[3], "Jovens;Coral"],
+    ]
+    assert len(linhas) == 1 + 2 * 4
+
+def test_csv_so_dos_grupos_pedidos(tmp_path):
+    [caminho] = exportar(tmp_path, formatos=("csv",), grupos=["Coral"])
+    assert [linha[4] for linha in ler_csv(caminho)[1:]] == [NOMES[3], NOMES[3]]
+
+def test_ics_um_evento_por_turno_preenchido(tmp_path):
+    [caminho] = exportar(tmp_path, formatos=("ics",), titulo="Vigília; março")
+    with open(caminho, "rb") as f:
+        texto = f.read().decode("utf-8")
+    linhas = texto.split("\r\n")
+    assert linhas[0] == "BEGIN:VCALENDAR" and texto.endswith("END:VCALENDAR\r\n")
+    assert "X-WR-CALNAME:Vigília\\; março" in linhas
+    assert linhas.count("BEGIN:VEVENT") == linhas.count("END:VEVENT") == 2 * 3
+    assert "UID:20240301T2000-3-3@sorteio-igreja" in linhas
+    assert "DTSTART:20240302T010000" in linhas and "DTEND:20240302T020000" in linhas
+    assert "SUMMARY:Oração - Caio\\, o \"Velho\"" in linhas
+    assert "DESCRIPTION:Jovens\\, Coral" in linhas
+    assert all(len(linha.encode("utf-8")) <= 75 for linha in linhas)
+
+def test_linhas_longas_do_ics_sao_dobradas():
+    linha = "SUMMARY:" + escapar_ics("ção, " * 40)
+    dobrada = dobrar_linha_ics(linha)
+    partes = dobrada[:-2].split("\r\n")
+    assert all(len(parte.encode("utf-8")) <= 75 for parte in partes)
+    assert all(parte.startswith(" ") for parte in partes[1:])
+    assert partes[0] + "".join(parte[1:] for parte in partes[1:]) == linha
+
+def test_processos_e_blocos_nao_mudam_os_arquivos(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacao_periodo, "SORTEIOS_POR_BLOCO", 3)
+    um, varios = tmp_path / "um", tmp_path / "varios"
+    um.mkdir()
+    varios.mkdir()
+    progresso = []
+    caminhos = exportar(um, 10, formatos=("csv", "ics"),
+                        progresso=lambda feitas, total: progresso.append((feitas, total)))
+    assert progresso == [(i, 8) for i in range(1, 9)]
+    outros = exportar(varios, 10, formatos=("csv", "ics"), processos=2)
+    for caminho, outro in zip(caminhos, outros):
+        with open(caminho, "rb") as a, open(outro, "rb") as b:
+            # Só o DTSTAMP muda de uma exportação para outra
+            assert ([linha for linha in a if not linha.startswith(b"DTSTAMP")] ==
+                    [linha for linha in b if not linha.startswith(b"DTSTAMP")])
+
+def test_pdf(tmp_path):
+    pytest.importorskip("fpdf")
+    [caminho] = exportar(tmp_path, 120, formatos=("pdf",), grupos=["Jovens"])
+    with open(caminho, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+
+def test_cancelada_nao_deixa_arquivos(tmp_path):
+    cancelado = threading.Event()
+    cancelado.set()
+    assert exportar(tmp_path, formatos=("csv", "ics"), cancelado=cancelado) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,83 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from armazenamento import aplicar_mutacao, dados_vazios
+from equidade import ContadoresServico
+from historico import IndiceHistorico, PaginadorHistorico
+from motor_sorteio import gerar_sorteio, montar_sorteio, reparar_turnos
+
+def sorteios(quantidade):
+    return [montar_sorteio(f"{dia:02d}/03/2024 20:00", [dia % 4 + 1] + [None] * 95) for dia in range(1, quantidade + 1)]
+
+def test_indice_consulta_por_periodo():
+    lista = sorteios(20)
+    indice = IndiceHistorico(lista)
+    assert indice.contar_sorteios() == 20
+    inicio, fim = datetime(2024, 3, 5), datetime(2024, 3, 9, 23, 59)
+    assert indice.contar_sorteios(inicio, fim) == 5
+    assert [c["id"] for c in indice.cabecalhos_sorteios(1, 2, inicio, fim)] == [5, 6]
+    lista.append(montar_sorteio("07/03/2024 21:00", [None] * 96))
+    indice.sorteio_adicionado()
+    assert indice.contar_sorteios(inicio, fim) == 6
+    assert indice.carregar_sorteio(20) is lista[20]
+    for desconhecido in (None, -1, 21):
+        with pytest.raises(KeyError):
+            indice.carregar_sorteio(desconhecido)
+
+def test_paginador_do_mais_recente_para_o_mais_antigo():
+    paginador = PaginadorHistorico(IndiceHistorico(sorteios(7)), tamanho_pagina=3)
+    assert [c["id"] for c in paginador.proxima_pagina()] == [6, 5, 4]
+    assert [c["id"] for c in paginador.proxima_pagina()] == [3, 2, 1]
+    assert paginador.tem_mais()
+    assert [c["id"] for c in paginador.proxima_pagina()] == [0]
+    assert not paginador.tem_mais() and paginador.proxima_pagina() == []
+
+def test_sorteio_novo_entra_no_topo():
+    paginador = PaginadorHistorico(IndiceHistorico(sorteios(3)))
+    paginador.proxima_pagina()
+    novo = montar_sorteio("10/03/2024 20:00", [None] * 96)
+    assert paginador.sorteio_adicionado(novo)
+    assert paginador.carregados[0] == {"id": None, "data": novo["data"], "sorteio": novo}
+    assert not paginador.sorteio_adicionado(montar_sorteio("01/01/2024 20:00", [None] * 96))
+
+def test_gerar_reparar_e_selecionar():
+    # O fluxo da aba de histórico: um sorteio gerado entra no topo sem id,
+    # é reparado e depois selecionado
+    dados = dados_vazios()
+    for membro in range(1, 31):
+        aplicar_mutacao(dados, {"tipo": "membro_adicionado", "membro": membro, "nome": f"M{membro}"})
+    for sorteio in sorteios(3):
+        aplicar_mutacao(dados, {"tipo": "sorteio_registrado", "sorteio": sorteio})
+    indice = IndiceHistorico(dados["sorteios"])
+    paginador = PaginadorHistorico(indice)
+    paginador.proxima_pagina()
+
+    rng = random.Random(3)
+    gerado = gerar_sorteio(list(dados["membros"]), {}, dados["sorteios"], rng, datetime(2024, 3, 10, 20))
+    aplicar_mutacao(dados, {"tipo": "sorteio_registrado", "sorteio": gerado})
+    indice.sorteio_adicionado()
+    assert paginador.sorteio_adicionado(gerado)
+
+    sai = gerado["turnos"][0]
+    alteracoes = reparar_turnos(dados["sorteios"], len(dados["sorteios"]) - 1, sai, list(dados["membros"]), {}, rng)
+    mutacao = {"tipo": "sorteio_reparado", "data": gerado["data"], "membro": sai,
+               "alteracoes": [list(alteracao) for alteracao in alteracoes]}
+    aplicar_mutacao(dados, mutacao)
+    paginador.sorteio_reparado(mutacao)
+
+    for cabecalho in paginador.carregados:
+        sorteio = cabecalho.get("sorteio") or indice.carregar_sorteio(cabecalho["id"])
+        assert sorteio == dados["sorteios"][cabecalho["id"] if cabecalho["id"] is not None else -1]
+    assert sai not in paginador.carregados[0]["sorteio"]["turnos"]
+    assert sai in gerado["turnos"]
+
+def test_contadores_de_servico_na_janela():
+    contadores = ContadoresServico(sorteios(8), janela=4)
+    # Dias 5 a 8: membros 2, 3, 4 e 1, todos à meia-noite
+    assert [contadores.vezes(m) for m in (1, 2, 3, 4)] == [1, 1, 1, 1]
+    contadores.registrar(montar_sorteio("09/03/2024 20:00", [1, 1] + [None] * 94))
+    assert contadores.vezes(1) == 3 and contadores.vezes(2) == 0
+    assert contadores.vezes(1, 0) == 3
+    assert contadores.peso(1, 0) < contadores.peso(3, 0) < contadores.peso(2, 0)
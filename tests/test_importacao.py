@@ -0,0 +1,68 @@
+import pytest
+
+import importacao
+from armazenamento import aplicar_mutacao, dados_vazios
+from importacao import importar_membros, ler_registros
+
+def cadastro():
+    dados = dados_vazios()
+    for mutacao in ({"tipo": "membro_adicionado", "membro": 1, "nome": "Ana Júlia"},
+                    {"tipo": "grupo_criado", "grupo": "Jovens"}):
+        aplicar_mutacao(dados, mutacao)
+    return dados
+
+def importar(tmp_path, nome, conteudo, encoding="utf-8"):
+    caminho = tmp_path / nome
+    caminho.write_text(conteudo, encoding=encoding)
+    dados = cadastro()
+    lote, relatorio = importar_membros(str(caminho), dados)
+    aplicar_mutacao(dados, lote)
+    return dados, relatorio
+
+def test_csv_valido(tmp_path):
+    dados, relatorio = importar(tmp_path, "membros.csv",
+                                "Nome,Grupos,Restricoes\nBia,jovens|Coral,7;08:00\nCaio,,\n", "utf-8-sig")
+    assert relatorio.membros == 2 and relatorio.erros == [] and relatorio.grupos_criados == ["Coral"]
+    assert dados["membros"] == {1: "Ana Júlia", 2: "Bia", 3: "Caio"}
+    assert dados["grupos"] == {"Jovens": {2: None}, "Coral": {2: None}}
+    assert dados["restricoes_horarios"][2] == 1 << 7 | 1 << 8
+    assert dados["proximo_id"] == 4
+
+def test_csv_linhas_com_erro(tmp_path):
+    dados, relatorio = importar(tmp_path, "membros.csv",
+                                "nome,restricoes\nana julia,\n,\nBia,25\nCaio,7:30\nDuda,\n")
+    assert relatorio.duplicados == ["ana julia"]
+    assert relatorio.erros == [(3, "nome vazio"), (4, "hora inválida '25'"), (5, "hora inválida '7:30'")]
+    assert list(dados["membros"].values()) == ["Ana Júlia", "Duda"]
+    assert "3 linhas com erro" in relatorio.resumo()
+
+def test_lista_json_com_item_malformado(tmp_path, monkeypatch):
+    monkeypatch.setattr(importacao, "TAMANHO_BLOCO", 5)
+    dados, relatorio = importar(tmp_path, "membros.json", """[
+        {"nome": "Bia", "grupos": ["Jovens"], "restricoes": ["01:00"]},
+        {"nome": "Caio", "grupos": [1,},
+        "Duda",
+        {"nome": "Eva", "grupos": "Coral; Jovens"}
+    ]""")
+    assert [linha for linha, _ in relatorio.erros] == [2, 3]
+    assert relatorio.erros[1] == (3, "registro deve ser um objeto")
+    assert list(dados["membros"].values()) == ["Ana Júlia", "Bia", "Eva"]
+    assert dados["grupos"] == {"Jovens": {2: None, 3: None}, "Coral": {3: None}}
+
+def test_um_objeto_json_por_linha(tmp_path):
+    dados, relatorio = importar(tmp_path, "membros.jsonl", '{"nome": "Bia"}\n\n{"nome": \n{"nome": "Caio"}\n')
+    assert [linha for linha, _ in relatorio.erros] == [3]
+    assert list(dados["membros"].values()) == ["Ana Júlia", "Bia", "Caio"]
+
+@pytest.mark.parametrize("nome, conteudo, esperado", [
+    ("a.csv", "nome\nBia\n", [(2, {"nome": "Bia"})]),
+    ("a.CSV", "nome\nBia\n", [(2, {"nome": "Bia"})]),
+    ("a.txt", "nome\nBia\n", [(2, {"nome": "Bia"})]),
+    ("a.json", '  [{"nome": "Bia"}]', [(1, {"nome": "Bia"})]),
+    ("a.json", '{"nome": "Bia"}\n', [(1, {"nome": "Bia"})]),
+    ("a.JSONL", '{"nome": "Bia"}\n', [(1, {"nome": "Bia"})]),
+])
+def test_formato_pela_extensao_e_pelo_conteudo(tmp_path, nome, conteudo, esperado):
+    caminho = tmp_path / nome
+    caminho.write_text(conteudo, encoding="utf-8")
+    assert list(ler_registros(str(caminho))) == esperado
@@ -0,0 +1,55 @@
+from indices import IndiceBusca, IndiceGrupos, normalizar
+
+MEMBROS = {1: "João Paulo", 2: "Ana Júlia", 3: "Joana", 4: "Mário"}
+
+def test_normalizar_ignora_acentos_e_maiusculas():
+    assert normalizar("JOÃO") == "joao" and normalizar("Ínês") == "ines"
+
+def test_busca_sem_acento_na_ordem_de_cadastro():
+    indice = IndiceBusca(MEMBROS)
+    assert indice.buscar("") == indice.buscar("   ") == [1, 2, 3, 4]
+    assert indice.buscar("JOA") == [1, 3]
+    assert indice.buscar("julia") == [2]
+    assert indice.buscar("a") == [1, 2, 3, 4]
+    assert indice.buscar("xyz") == []
+
+def test_busca_incremental_igual_a_completa():
+    indice = IndiceBusca(MEMBROS)
+    for consulta in ("j", "jo", "joa", "joao", "joao p", "joao pa", "joao x", "o", "ar"):
+        assert indice.buscar(consulta) == IndiceBusca(MEMBROS).buscar(consulta)
+
+def test_adicionar_remover_e_renomear():
+    indice = IndiceBusca(MEMBROS)
+    assert indice.buscar("jo") == [1, 3]
+    indice.adicionar(5, "Jonas")
+    indice.adicionar(5, "Outro")
+    assert indice.buscar("jo") == [1, 3, 5]
+    indice.remover(1)
+    indice.remover(99)
+    assert indice.buscar("jo") == [3, 5]
+    indice.renomear(3, "Beatriz")
+    indice.renomear(99, "Ninguém")
+    assert indice.buscar("joa") == []
+    assert indice.buscar("triz") == [3]
+    # A posição na ordem de cadastro não muda com o novo nome
+    assert indice.todos() == [2, 3, 4, 5]
+    assert not any(1 in membros for membros in indice.ngramas.values())
+
+def test_indice_de_grupos():
+    indice = IndiceGrupos({"Coral": {1: None, 2: None}, "Jovens": {2: None}, "Vazio": {}})
+    assert indice.grupos_de(2) == {"Coral", "Jovens"} and indice.grupos_de(9) == set()
+    assert indice.contem("Coral", 1) and not indice.contem("Jovens", 1)
+    indice.remover("Coral", 1)
+    assert 1 not in indice.grupos_por_membro
+    indice.adicionar("Novo", 1)
+    assert indice.remover_membro(2) == {"Coral", "Jovens"}
+    assert indice.membros_por_grupo == {"Coral": set(), "Jovens": set(), "Vazio": set(), "Novo": {1}}
+
+def test_rotear_turnos_pelos_grupos():
+    indice = IndiceGrupos({"Coral": {1: None, 2: None}, "Jovens": {2: None}, "Vazio": {}})
+    turnos = [("00:00", 2), ("00:30", 3), ("01:00", 1), ("01:30", 2)]
+    assert indice.rotear(turnos) == {
+        "Coral": [("00:00", 2), ("01:00", 1), ("01:30", 2)],
+        "Jovens": [("00:00", 2), ("01:30", 2)],
+        "Vazio": [],
+    }
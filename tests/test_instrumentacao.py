@@ -0,0 +1,71 @@
+import atexit
+import json
+from collections import deque
+
+import pytest
+
+import instrumentacao
+from instrumentacao import Estatistica, medido, medir
+
+@pytest.fixture
+def diagnostico(monkeypatch):
+    # Estado do módulo limpo a cada teste, e nada gravado na saída do pytest
+    monkeypatch.setattr(instrumentacao, "ativo", False)
+    monkeypatch.setattr(instrumentacao, "inicio", None)
+    monkeypatch.setattr(instrumentacao, "estatisticas", {})
+    monkeypatch.setattr(instrumentacao, "recentes", deque(maxlen=instrumentacao.RECENTES))
+    monkeypatch.delenv(instrumentacao.VARIAVEL, raising=False)
+    yield monkeypatch
+    atexit.unregister(instrumentacao.despejar)
+
+def criar_somar(chamadas):
+    @medido("teste.somar", lambda a, b: chamadas.append((a, b)) or {"a": a})
+    def somar(a, b):
+        if b is None:
+            raise ValueError("sem b")
+        return a + b
+    return somar
+
+@pytest.mark.parametrize("valor", [None, "", "0"])
+def test_desligado_sem_a_variavel(diagnostico, valor):
+    if valor is not None:
+        diagnostico.setenv(instrumentacao.VARIAVEL, valor)
+    assert instrumentacao.ativar_pelo_ambiente() is False
+    chamadas = []
+    somar = criar_somar(chamadas)
+    assert somar(1, 2) == 3 and somar.__name__ == "somar"
+    with medir("teste.trecho", n=1):
+        pass
+    assert chamadas == [] and instrumentacao.resumo() == {} and instrumentacao.ultimas() == []
+    assert instrumentacao.despejar() is None
+
+def test_ligado_pela_variavel(diagnostico, tmp_path):
+    diagnostico.setenv(instrumentacao.VARIAVEL, "1")
+    assert instrumentacao.ativar_pelo_ambiente() is True
+    chamadas = []
+    somar = criar_somar(chamadas)
+    assert somar(1, 2) == 3
+    with pytest.raises(ValueError):
+        somar(5, None)
+    with medir("teste.trecho", n=10):
+        pass
+    assert chamadas == [(1, 2), (5, None)]
+    resumo = instrumentacao.resumo()
+    assert list(resumo) == ["teste.somar", "teste.trecho"]
+    assert resumo["teste.somar"]["contagem"] == 2 and resumo["teste.trecho"]["contagem"] == 1
+    assert [(u["operacao"], u["tamanhos"]) for u in instrumentacao.ultimas(2)] == \
+        [("teste.somar", {"a": 5}), ("teste.trecho", {"n": 10})]
+
+    caminho = instrumentacao.despejar(str(tmp_path / "diagnostico.json"))
+    with open(caminho, encoding="utf-8") as f:
+        relatorio = json.load(f)
+    assert relatorio["operacoes"]["teste.somar"]["contagem"] == 2 and len(relatorio["recentes"]) == 3
+
+def test_percentis_pelos_baldes():
+    estatistica = Estatistica()
+    for ms in [1.0] * 90 + [100.0] * 10:
+        estatistica.adicionar(ms)
+    resumo = estatistica.resumo()
+    assert resumo["contagem"] == 100 and resumo["min_ms"] == 1.0 and resumo["max_ms"] == 100.0
+    assert 0.5 <= resumo["p50_ms"] <= 1.0 and 65.5 <= resumo["p95_ms"] <= 100.0
+    assert sum(resumo["baldes_us"].values()) == 100
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from calendario import obter_calendario
+from equidade import ContadoresServico
+from lote_sorteios import gerar_lote
+from motor_sorteio import calendario_do_sorteio, membros_restritos
+
+MEMBROS = list(range(1, 61))
+RESTRICOES = {membro: (1 << membro % 24) | (1 << (membro * 7) % 24) for membro in MEMBROS}
+INICIO = datetime(2024, 3, 1, 20, 0)
+
+def lote(semente, **kwargs):
+    return gerar_lote(MEMBROS, RESTRICOES, [], 4, INICIO, semente, processos=1, **kwargs)
+
+def test_mesma_semente_mesmo_lote():
+    assert lote(7) == lote(7)
+    assert lote(7) != lote(8)
+
+def test_processos_nao_mudam_o_resultado():
+    assert gerar_lote(MEMBROS, RESTRICOES, [], 3, INICIO, 11, processos=2) == lote(11)[:3]
+
+def test_dias_consecutivos_encadeados_pela_madrugada():
+    sorteios = lote(3)
+    assert [s["data"] for s in sorteios] == [f"0{dia}/03/2024 20:00" for dia in range(1, 5)]
+    for anterior, sorteio in zip(sorteios, sorteios[1:]):
+        restritos = membros_restritos([anterior])
+        noturnos = calendario_do_sorteio(sorteio).noturnos
+        assert not any(noturno and membro in restritos for noturno, membro in zip(noturnos, sorteio["turnos"]))
+
+def test_vigilia_de_varios_dias():
+    calendario = obter_calendario("20:00", "08:00", 60, 2)
+    sorteios = lote(5, calendario=calendario)
+    assert [s["data"][:5] for s in sorteios] == ["01/03", "03/03", "05/03", "07/03"]
+    assert all(calendario_do_sorteio(s).rotulos == calendario.rotulos for s in sorteios)
+
+def test_contadores_de_quem_chama_nao_mudam():
+    contadores = ContadoresServico([], 10)
+    assert lote(9, contadores=contadores) == lote(9, contadores=ContadoresServico([], 10))
+    assert all(contadores.vezes(membro) == 0 for membro in MEMBROS)
@@ -0,0 +1,144 @@
+import random
+from collections import Counter
+from itertools import permutations
+
+import pytest
+
+import motor_sorteio
+from calendario import CALENDARIO_PADRAO, obter_calendario, obter_turnos_avulsos
+from motor_sorteio import (TODAS_HORAS, emparelhamento_maximo, mascara_restricoes, membros_restritos,
+                           montar_sorteio, reparar_turnos, sortear_turnos)
+
+def cadastro(quantidade, rng, densidade=0.3):
+    membros = {m: f"Membro {m}" for m in range(1, quantidade + 1)}
+    restricoes = {m: sum(1 << h for h in range(24) if rng.random() < densidade) for m in membros}
+    return membros, restricoes
+
+def conferir_turnos(turnos, calendario, restricoes, restritos=()):
+    uso = Counter(m for m in turnos if m is not None)
+    assert len(turnos) == len(calendario)
+    assert max(uso.values(), default=0) <= calendario.turnos_por_membro
+    for s, membro in enumerate(turnos):
+        if membro is None:
+            continue
+        hora, noturno = calendario.chaves[s]
+        assert not restricoes.get(membro, 0) >> hora & 1
+        assert not (noturno and membro in restritos)
+
+# ==================================================
+# MÁSCARAS E CALENDÁRIOS
+# ==================================================
+def test_mascara_aceita_lista_antiga_e_corta_em_24_bits():
+    assert mascara_restricoes(["00:00", "13:00", "23:00"]) == 1 | 1 << 13 | 1 << 23
+    assert mascara_restricoes(1 << 30 | 5) == 5
+    assert mascara_restricoes(-1) == TODAS_HORAS
+    assert motor_sorteio.horas_da_mascara(1 << 8 | 1 << 9) == ["08:00", "09:00"]
+
+def test_calendario_padrao():
+    assert len(CALENDARIO_PADRAO) == 96
+    assert CALENDARIO_PADRAO.rotulos[:2] == ("00:00", "00:15")
+    assert CALENDARIO_PADRAO.horas[4] == 1
+    assert CALENDARIO_PADRAO.noturnos[0] and not CALENDARIO_PADRAO.noturnos[-1]
+
+def test_calendario_atravessa_meia_noite_e_varios_dias():
+    calendario = obter_calendario("22:00", "02:00", 60, dias=2)
+    assert calendario.rotulos == ("Dia 1 22:00", "Dia 1 23:00", "Dia 1 00:00", "Dia 1 01:00",
+                                  "Dia 2 22:00", "Dia 2 23:00", "Dia 2 00:00", "Dia 2 01:00")
+    assert calendario.horas == (22, 23, 0, 1) * 2
+    assert calendario.inicios[2] - calendario.inicios[1] == 60
+    assert obter_calendario("22:00", "02:00", 60, dias=2) is calendario
+
+def test_calendario_invalido():
+    with pytest.raises(ValueError):
+        obter_calendario("00:00", "01:00", 25)
+    with pytest.raises(ValueError):
+        obter_calendario(dias=0)
+
+def test_turnos_avulsos_e_sorteio_gravado():
+    avulsos = obter_turnos_avulsos(("23:00", "23:30", "00:30"))
+    assert avulsos.inicios == (23 * 60, 23 * 60 + 30, 24 * 60 + 30)
+    assert avulsos.duracao == 30
+    calendario = obter_calendario("20:00", "22:00", 30)
+    sorteio = montar_sorteio("01/02/2024 20:00", [1, None, 2, 3], calendario)
+    assert motor_sorteio.calendario_do_sorteio(sorteio).rotulos == calendario.rotulos
+    assert list(motor_sorteio.turnos_rotulados(sorteio))[1] == ("20:30", None)
+    assert "calendario" not in montar_sorteio("01/02/2024 20:00", [None] * 96, CALENDARIO_PADRAO)
+
+# ==================================================
+# EMPARELHAMENTO
+# ==================================================
+def maximo_forca_bruta(adjacencias):
+    membros = sorted({m for lista in adjacencias for m in lista})
+    melhor = 0
+    for ordem in permutations(membros + [None] * len(adjacencias), len(adjacencias)):
+        if all(m is None or m in adjacencias[s] for s, m in enumerate(ordem)):
+            melhor = max(melhor, sum(m is not None for m in ordem))
+    return melhor
+
+@pytest.mark.parametrize("semente", range(20))
+def test_emparelhamento_e_maximo(semente):
+    rng = random.Random(semente)
+    adjacencias = [[m for m in range(5) if rng.random() < 0.35] for _ in range(5)]
+    resultado = emparelhamento_maximo(adjacencias, rng)
+    escolhidos = [m for m in resultado if m is not None]
+    assert len(escolhidos) == len(set(escolhidos))
+    assert all(m is None or m in adjacencias[s] for s, m in enumerate(resultado))
+    assert len(escolhidos) == maximo_forca_bruta(adjacencias)
+
+def test_emparelhamento_acha_caminho_de_aumento():
+    # A escolha gulosa 0->"a" bloquearia o turno 1
+    resultado = emparelhamento_maximo([["a", "b"], ["a"]], random.Random(0), embaralhar=False)
+    assert resultado == ["b", "a"]
+
+# ==================================================
+# SORTEIO
+# ==================================================
+@pytest.mark.parametrize("modo", [motor_sorteio.MODO_GULOSO, motor_sorteio.MODO_OTIMO])
+def test_sorteio_respeita_restricoes_e_madrugada(modo):
+    rng = random.Random(3)
+    membros, restricoes = cadastro(150, rng)
+    anterior = montar_sorteio("01/01/2024 20:00", list(range(1, 97)))
+    restritos = membros_restritos([anterior])
+    assert restritos == set(range(1, 26))
+    turnos = sortear_turnos(membros, restricoes, [anterior], rng, modo=modo)
+    conferir_turnos(turnos, CALENDARIO_PADRAO, restricoes, restritos)
+
+def test_modo_otimo_preenche_pelo_menos_o_guloso():
+    rng = random.Random(4)
+    membros, restricoes = cadastro(60, rng, densidade=0.6)
+    calendario = obter_calendario(minutos=30, turnos_por_membro=2)
+    guloso = sortear_turnos(membros, restricoes, (), random.Random(1), calendario)
+    otimo = sortear_turnos(membros, restricoes, (), random.Random(1), calendario, modo=motor_sorteio.MODO_OTIMO)
+    conferir_turnos(otimo, calendario, restricoes)
+    assert sum(m is not None for m in otimo) >= sum(m is not None for m in guloso)
+
+# ==================================================
+# REPARO
+# ==================================================
+def test_reparo_troca_so_os_turnos_do_membro():
+    rng = random.Random(5)
+    membros, restricoes = cadastro(200, rng)
+    sorteios = [montar_sorteio("01/01/2024 20:00", sortear_turnos(membros, restricoes, (), rng))]
+    sai = sorteios[0]["turnos"][10]
+    alteracoes = reparar_turnos(sorteios, 0, sai, list(membros), restricoes, rng)
+    turnos = list(sorteios[0]["turnos"])
+    for slot, antes, depois in alteracoes:
+        assert turnos[slot] == antes
+        turnos[slot] = depois
+    assert sai not in turnos
+    assert [s for s, antes, _ in alteracoes if antes == sai] == [10]
+    conferir_turnos(turnos, CALENDARIO_PADRAO, restricoes)
+
+def test_reparo_move_outro_membro_quando_ninguem_livre_pode():
+    # "x" sai das 01:00. O livre "c" só pode à meia-noite: "b" passa para as
+    # 01:00 e "c" fica com o turno dele
+    calendario = obter_calendario("00:00", "02:00", 60)
+    restricoes = {"b": 0, "c": TODAS_HORAS & ~1, "x": 0}
+    sorteios = [montar_sorteio("01/01/2024 00:00", ["b", "x"], calendario)]
+    alteracoes = reparar_turnos(sorteios, 0, "x", ["b", "c", "x"], restricoes, random.Random(0))
+    assert sorted(alteracoes) == [(0, "b", "c"), (1, "x", "b")]
+
+def test_reparo_deixa_vago_sem_candidato():
+    calendario = obter_calendario("00:00", "01:00", 60)
+    sorteios = [montar_sorteio("01/01/2024 00:00", [1], calendario)]
+    assert reparar_turnos(sorteios, 0, 1, [1, 2], {2: TODAS_HORAS}) == [(0, 1, None)]
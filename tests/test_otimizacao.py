@@ -0,0 +1,89 @@
+import random
+from collections import Counter
+
+import pytest
+
+from calendario import CALENDARIO_PADRAO, obter_calendario
+from motor_sorteio import membros_restritos, montar_sorteio, sortear_turnos
+from otimizacao import TERMOS, PontuacaoMetas, otimizar_turnos, pontuar_turnos
+
+def cenario(semente, quantidade=150, grupos=6, calendario=CALENDARIO_PADRAO):
+    rng = random.Random(semente)
+    membros = list(range(1, quantidade + 1))
+    restricoes = {m: sum(1 << h for h in range(24) if rng.random() < 0.3) for m in membros}
+    nomes = [f"G{g}" for g in range(grupos)]
+    dados_grupos = {nome: {} for nome in nomes}
+    for m in membros:
+        for nome in rng.sample(nomes, rng.randint(1, 2)):
+            dados_grupos[nome][m] = None
+    preferencias = {m: rng.getrandbits(24) & rng.getrandbits(24) for m in rng.sample(membros, quantidade // 3)}
+    # Quem fez a madrugada do sorteio anterior não volta a ela
+    anterior = [montar_sorteio("01/01/2024 20:00", rng.sample(membros, 24) + [None] * 72)]
+    turnos = sortear_turnos(membros, restricoes, anterior, rng, calendario)
+    return membros, restricoes, dados_grupos, preferencias, anterior, turnos
+
+CALENDARIOS = [CALENDARIO_PADRAO, obter_calendario("20:00", "02:00", 30),
+               obter_calendario(minutos=60, dias=2, turnos_por_membro=2)]
+
+@pytest.mark.parametrize("calendario", CALENDARIOS)
+def test_variacao_incremental_igual_ao_recalculo(calendario):
+    membros, _, grupos, preferencias, _, turnos = cenario(1, calendario=calendario)
+    rng = random.Random(2)
+    metas = PontuacaoMetas(turnos, calendario, grupos, preferencias)
+    for _ in range(500):
+        a, b = rng.randrange(len(turnos)), rng.randrange(len(turnos))
+        if rng.random() < 0.5:
+            alteracoes = ((a, metas.turnos[b]), (b, metas.turnos[a]))
+        else:
+            alteracoes = ((a, rng.choice(membros + [None])),)
+        antes = metas.pontuacao()
+        variacao = metas.mudar(alteracoes)
+        depois = pontuar_turnos(metas.turnos, calendario, grupos, preferencias)
+        for termo, delta in zip(TERMOS, variacao):
+            assert depois[termo] - antes[termo] == pytest.approx(delta, abs=1e-6)
+
+def test_pontuacao_de_casos_conhecidos():
+    calendario = obter_calendario("00:00", "06:00", 60)
+    grupos = {"A": {1: None, 2: None}, "B": {3: None}}
+    # Dois do grupo A seguidos, no mesmo bloco de 3 h
+    pontos = pontuar_turnos([1, 2, 3, None, None, None], calendario, grupos, {3: 1 << 5})
+    assert pontos["vizinhos"] == 1
+    assert pontos["preferencias"] == 1
+    # A: 2 no bloco 0, 0 no bloco 1, ideal 1 e 1; B: 1 e 0, ideal 0,5 e 0,5
+    assert pontos["espalhamento"] == pytest.approx(2 + 0.5)
+    espalhado = pontuar_turnos([1, 3, None, 2, None, None], calendario, grupos, {3: 1 << 1})
+    assert (espalhado["vizinhos"], espalhado["preferencias"]) == (0, 0)
+    assert espalhado["espalhamento"] == pytest.approx(0.5)
+
+@pytest.mark.parametrize("calendario", CALENDARIOS)
+def test_otimizacao_mantem_regras_e_melhora(calendario):
+    membros, restricoes, grupos, preferencias, anterior, turnos = cenario(3, calendario=calendario)
+    final, relatorio = otimizar_turnos(turnos, membros, restricoes, grupos, preferencias, anterior, calendario,
+                                       orcamento=None, iteracoes=5000, rng=random.Random(4))
+    restritos = membros_restritos(anterior)
+    uso = Counter(m for m in final if m is not None)
+    assert sum(m is not None for m in final) == sum(m is not None for m in turnos)
+    assert max(uso.values()) <= calendario.turnos_por_membro
+    for s, membro in enumerate(final):
+        if membro is not None:
+            hora, noturno = calendario.chaves[s]
+            assert not restricoes[membro] >> hora & 1
+            assert not (noturno and membro in restritos)
+    assert relatorio["iteracoes"] == 5000
+    assert relatorio["depois"] == pontuar_turnos(final, calendario, grupos, preferencias)
+    assert relatorio["depois"]["total"] < relatorio["antes"]["total"]
+
+def test_otimizacao_deterministica_e_orcamento():
+    membros, restricoes, grupos, preferencias, anterior, turnos = cenario(5)
+    argumentos = (turnos, membros, restricoes, grupos, preferencias, anterior)
+    primeiro = otimizar_turnos(*argumentos, orcamento=None, iteracoes=2000, rng=random.Random(1))
+    segundo = otimizar_turnos(*argumentos, orcamento=None, iteracoes=2000, rng=random.Random(1))
+    assert primeiro[0] == segundo[0]
+    _, relatorio = otimizar_turnos(*argumentos, orcamento=0.05, rng=random.Random(1))
+    assert relatorio["segundos"] < 0.5
+    assert relatorio["iteracoes"] > 0
+
+def test_sem_grupos_nem_preferencias_nao_mexe():
+    membros, restricoes, _, _, anterior, turnos = cenario(6)
+    final, relatorio = otimizar_turnos(turnos, membros, restricoes, {}, {}, anterior, orcamento=1.0)
+    assert final == turnos and relatorio["iteracoes"] == 0
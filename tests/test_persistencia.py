@@ -0,0 +1,114 @@
+import copy
+import time
+
+import pytest
+
+from armazenamento import aplicar_mutacao, dados_vazios
+from persistencia import PersistenciaAssincrona
+
+def membro(id_membro):
+    return {"tipo": "membro_adicionado", "membro": id_membro, "nome": f"M{id_membro}"}
+
+class ArmazenamentoMemoria:
+    # Guarda os lotes gravados; as primeiras `falhas` gravações dão erro
+    compartilhado = False
+
+    def __init__(self, falhas=0, leitura_falha=False):
+        self.falhas = falhas
+        self.leitura_falha = leitura_falha
+        self.lotes = []
+        self.disco = dados_vazios()
+        self.fechado = None
+
+    def carregar(self, incluir_sorteios=True):
+        if self.leitura_falha:
+            raise OSError("disco ilegível")
+        return copy.deepcopy(self.disco)
+
+    def registrar_varios(self, dados, mutacoes):
+        if self.falhas:
+            self.falhas -= 1
+            raise OSError("disco cheio")
+        self.lotes.append(list(mutacoes))
+        self.disco = copy.deepcopy(dados)
+
+    def indexar_historico(self, sorteios):
+        pass
+
+    def fechar(self, dados):
+        self.fechado = copy.deepcopy(dados)
+
+def iniciar(armazenamento, debounce=0.05, historico_carregado=True):
+    return PersistenciaAssincrona(armazenamento, dados_vazios(), debounce, historico_carregado)
+
+def test_debounce_junta_as_mutacoes_num_lote():
+    armazenamento = ArmazenamentoMemoria()
+    persistencia = iniciar(armazenamento, debounce=0.5)
+    for id_membro in (1, 2, 3):
+        persistencia.registrar(None, membro(id_membro))
+    persistencia.descarregar()
+    persistencia.registrar(None, membro(4))
+    persistencia.fechar(None)
+    assert armazenamento.lotes == [[membro(1), membro(2), membro(3)], [membro(4)]]
+    assert armazenamento.fechado["membros"] == {1: "M1", 2: "M2", 3: "M3", 4: "M4"}
+
+def test_janela_de_debounce_encerra_o_lote():
+    armazenamento = ArmazenamentoMemoria()
+    persistencia = iniciar(armazenamento, debounce=0.05)
+    persistencia.registrar(None, membro(1))
+    time.sleep(0.3)
+    assert armazenamento.lotes == [[membro(1)]]
+    persistencia.registrar(None, membro(2))
+    persistencia.fechar(None)
+    assert armazenamento.lotes == [[membro(1)], [membro(2)]]
+
+def test_falha_de_gravacao_relê_do_disco():
+    armazenamento = ArmazenamentoMemoria(falhas=1)
+    persistencia = iniciar(armazenamento)
+    persistencia.registrar(None, membro(1))
+    persistencia.descarregar()
+    # Feita antes de a interface receber os dados relidos: descartada
+    persistencia.registrar(None, membro(2))
+    persistencia.descarregar()
+    assert armazenamento.lotes == []
+    [(tipo, dados, motivo)] = persistencia.mudancas_externas()
+    assert tipo == "recarregar" and dados == dados_vazios() and "disco cheio" in motivo
+    persistencia.registrar(None, membro(3))
+    persistencia.fechar(None)
+    assert armazenamento.lotes == [[membro(3)]]
+    assert armazenamento.fechado["membros"] == {3: "M3"}
+
+def test_falha_sem_releitura_bloqueia_as_gravacoes():
+    armazenamento = ArmazenamentoMemoria(falhas=1, leitura_falha=True)
+    persistencia = iniciar(armazenamento)
+    persistencia.registrar(None, membro(1))
+    with pytest.raises(RuntimeError, match="disco ilegível"):
+        persistencia.descarregar()
+    # O erro continua valendo até o programa ser reaberto
+    with pytest.raises(RuntimeError):
+        persistencia.verificar()
+    with pytest.raises(RuntimeError):
+        persistencia.registrar(None, membro(2))
+    with pytest.raises(RuntimeError):
+        persistencia.fechar(None)
+    assert armazenamento.fechado is None
+
+def test_sem_historico_nada_e_gravado_nem_perdido_em_silencio():
+    armazenamento = ArmazenamentoMemoria()
+    persistencia = iniciar(armazenamento, historico_carregado=False)
+    persistencia.registrar(None, membro(1))
+    with pytest.raises(RuntimeError, match="1 alteração"):
+        persistencia.fechar(None)
+    assert armazenamento.lotes == [] and armazenamento.fechado is None
+
+def test_historico_chega_e_as_pendentes_sao_gravadas():
+    armazenamento = ArmazenamentoMemoria()
+    persistencia = iniciar(armazenamento, historico_carregado=False)
+    persistencia.registrar(None, membro(1))
+    sorteio = {"data": "01/01/2024 20:00", "turnos": [1]}
+    persistencia.sorteios_carregados([sorteio])
+    persistencia.fechar(None)
+    dados = dados_vazios()
+    aplicar_mutacao(dados, membro(1))
+    dados["sorteios"] = [sorteio]
+    assert armazenamento.fechado == dados
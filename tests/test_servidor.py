@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+import servidor
+from armazenamento import ArmazenamentoJournal, ArmazenamentoJson, aplicar_mutacao, dados_vazios
+from armazenamento_sqlite import ArmazenamentoSqlite
+from concorrencia import ArmazenamentoCompartilhado
+from motor_sorteio import montar_sorteio
+
+def iniciar_servidor(monkeypatch, durante):
+    # Roda o main() do servidor até `durante` terminar, sem abrir porta
+    async def servir(armazenamento_dados, dados, base, host, porta):
+        durante(dados)
+    monkeypatch.setattr(servidor, "servir", servir)
+    monkeypatch.setattr(sys, "argv", ["servidor.py"])
+    servidor.main()
+
+@pytest.mark.parametrize("modo", ["json", "journal", "compartilhado"])
+def test_servidor_nao_sobrescreve_a_interface(tmp_path, monkeypatch, modo):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SORTEIO_ARMAZENAMENTO", modo)
+    monkeypatch.setenv("SORTEIO_ARQUIVO_DIAS", "30")
+    monkeypatch.setattr("arquivo_frio.MANTER_RECENTES", 0)
+    # No modo compartilhado a compactação mantém as entradas no journal, que
+    # o servidor lê ao abrir
+    interface = ArmazenamentoCompartilhado(limite=1000) if modo == "compartilhado" else ArmazenamentoJournal(limite=1000)
+    dados = interface.carregar()
+    antigo = montar_sorteio("01/01/2020 20:00", [1] + [None] * 95)
+    for mutacao in ({"tipo": "membro_adicionado", "membro": 1, "nome": "Ana"},
+                    {"tipo": "sorteio_registrado", "sorteio": antigo}):
+        aplicar_mutacao(dados, mutacao)
+        interface.registrar(dados, mutacao)
+    interface.compactar(dados)
+    snapshot = open("dados.json", "rb").read()
+
+    def durante(servidos):
+        assert servidos["membros"] == {1: "Ana"} and servidos["sorteios"] == [antigo]
+        # A interface grava enquanto o servidor está no ar
+        mutacao = {"tipo": "membro_adicionado", "membro": 2, "nome": "Bia"}
+        aplicar_mutacao(dados, mutacao)
+        interface.registrar(dados, mutacao)
+    iniciar_servidor(monkeypatch, durante)
+
+    # Nada foi migrado, arquivado nem compactado pelo servidor
+    trava = ["dados.json.trava"] if modo == "compartilhado" else []
+    assert sorted(os.listdir()) == ["dados.journal", "dados.json", *trava]
+    assert open("dados.json", "rb").read() == snapshot
+    assert ArmazenamentoJournal().carregar()["membros"] == {1: "Ana", 2: "Bia"}
+
+@pytest.mark.parametrize("classe", [ArmazenamentoJson, ArmazenamentoJournal, ArmazenamentoCompartilhado])
+def test_leitura_recusa_gravar(tmp_path, classe):
+    caminho, journal = str(tmp_path / "dados.json"), str(tmp_path / "dados.journal")
+    leitor = classe(caminho, journal, somente_leitura=True)
+    dados = leitor.carregar()
+    assert dados == dados_vazios()
+    with pytest.raises(PermissionError):
+        leitor.registrar(dados, {"tipo": "grupo_criado", "grupo": "G"})
+    leitor.fechar(dados)
+    assert [nome for nome in os.listdir(tmp_path) if not nome.endswith(".trava")] == []
+
+def test_leitura_do_sqlite(tmp_path):
+    caminho = str(tmp_path / "dados.db")
+    with pytest.raises(FileNotFoundError):
+        ArmazenamentoSqlite(caminho, str(tmp_path / "dados.json"), somente_leitura=True).carregar()
+    assert not os.path.exists(caminho)
+    gravador = ArmazenamentoSqlite(caminho, str(tmp_path / "dados.json"))
+    dados = gravador.carregar()
+    mutacao = {"tipo": "membro_adicionado", "membro": 1, "nome": "Ana"}
+    aplicar_mutacao(dados, mutacao)
+    gravador.registrar(dados, mutacao)
+    leitor = ArmazenamentoSqlite(caminho, somente_leitura=True)
+    assert leitor.carregar()["membros"] == {1: "Ana"}
+    with pytest.raises(sqlite3.OperationalError):
+        leitor.registrar(dados, {"tipo": "grupo_criado", "grupo": "G"})
+    gravador.fechar(dados)